@@ -1,8 +1,341 @@
-from collections import OrderedDict
+from collections import OrderedDict, deque
+from array import array
+from multiprocessing import shared_memory
+import contextlib
+import functools
+import bisect
+import itertools
+import codecs
+import mmap
+import multiprocessing
+import os
+import struct
+import shlex
+import json
+import sys
+import time
+import tracemalloc
 import copy
 import re
 import regex as reg
 
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+class AutomatonStats:
+	# Counters kept for every phase, besides the number of calls,
+	# the wall time (seconds) and the peak memory (bytes)
+	COUNTERS = ("states_created", "subsets_explored", "closures",
+		"transitions")
+
+	# Collector currently in use, if any. Only one collector can be
+	# active at a time.
+	active = None
+
+	def __init__(self, memory=True):
+		"""
+			Opt-in statistics collector for the Automaton operations.
+			While active (in a "with" block, or between start() and
+			stop()), every instrumented operation records, for each
+			of its internal phases (nfae_to_nfa, nfa_to_dfa, sink sta-
+			te insertion, equivalence finding, trimming, ...):
+
+				calls			: number of times the phase ran
+				seconds			: wall time spent in the phase
+				peak_memory		: peak of memory allocated during
+							the phase, in bytes (only if "memory")
+				states_created		: states of the resultant automaton
+				subsets_explored	: subsets (or pairs of states, in
+							product()) processed
+				closures		: null closures computed
+				transitions		: transitions read or written
+
+			Phases are keyed by their nesting path, so the phases
+			of minimize() called with a NFA show up as "minimize",
+			"minimize/nfae_to_nfa", "minimize/nfa_to_dfa" and so on.
+			Times and memory of a phase include its inner phases.
+
+			memory		: trace memory allocations (with tracemalloc),
+					which slows every operation down considerably.
+
+			Example:
+
+				with AutomatonStats() as stats:
+					aut.minimize()
+				stats.print()
+		"""
+		self.memory = memory
+		self.phases = OrderedDict()
+		self.__stack = []
+		self.__started_tracing = False
+
+	def start(self):
+		if AutomatonStats.active is not None:
+			raise RuntimeError("Another AutomatonStats is already active")
+
+		if self.memory and not tracemalloc.is_tracing():
+			tracemalloc.start()
+			self.__started_tracing = True
+
+		AutomatonStats.active = self
+		return self
+
+	def stop(self):
+		if AutomatonStats.active is self:
+			AutomatonStats.active = None
+
+		if self.__started_tracing:
+			tracemalloc.stop()
+			self.__started_tracing = False
+
+		return self
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *exc_info):
+		self.stop()
+
+	@staticmethod
+	def phase(name):
+		"""
+			Context manager wrapping a phase of an operation. Does
+			nothing if no collector is active.
+		"""
+		stats = AutomatonStats.active
+		if stats is None:
+			return contextlib.nullcontext()
+		return stats.__phase__(name)
+
+	@staticmethod
+	def instrument(name):
+		"""
+			Decorator running the whole method as the phase "name".
+		"""
+		def decorator(method):
+			@functools.wraps(method)
+			def wrapper(*args, **kwargs):
+				if AutomatonStats.active is None:
+					return method(*args, **kwargs)
+				with AutomatonStats.active.__phase__(name):
+					return method(*args, **kwargs)
+			return wrapper
+		return decorator
+
+	@staticmethod
+	def count(**counters):
+		"""
+			Add the given counters to the innermost running phase of
+			the active collector, if any.
+		"""
+		stats = AutomatonStats.active
+		if stats is None or not stats.__stack:
+			return
+
+		record = stats.phases[stats.__stack[-1][0]]
+		for counter, value in counters.items():
+			record[counter] += value
+
+	@contextlib.contextmanager
+	def __phase__(self, name):
+		path = self.__stack[-1][0] + "/" + name if self.__stack else name
+
+		record = self.phases.get(path)
+		if record is None:
+			record = self.phases[path] = dict.fromkeys(
+				("calls", "seconds", "peak_memory") + AutomatonStats.COUNTERS, 0)
+
+		tracing = self.memory and tracemalloc.is_tracing()
+		if tracing:
+			# Peaks are relative to the memory in use when the phase
+			# started. The peak of the enclosing phase is saved before
+			# being reset, and updated again when this phase ends.
+			current, peak = tracemalloc.get_traced_memory()
+			if self.__stack:
+				parent = self.__stack[-1]
+				parent[2] = max(parent[2], peak - parent[1])
+			tracemalloc.reset_peak()
+
+		# Each stack entry is [path, memory at start, peak so far]
+		entry = [path, current if tracing else 0, 0]
+		self.__stack.append(entry)
+		start = time.perf_counter()
+
+		try:
+			yield record
+		finally:
+			record["calls"] += 1
+			record["seconds"] += time.perf_counter() - start
+			self.__stack.pop()
+
+			if tracing:
+				_, peak = tracemalloc.get_traced_memory()
+				phase_peak = max(entry[2], peak - entry[1])
+				record["peak_memory"] = max(record["peak_memory"], phase_peak)
+
+				if self.__stack:
+					parent = self.__stack[-1]
+					parent[2] = max(parent[2], phase_peak + entry[1] - parent[1])
+
+	def as_dict(self):
+		return {path : dict(record) for path, record in self.phases.items()}
+
+	def print(self, file=sys.stdout):
+		columns = ("calls", "seconds", "peak_memory") + AutomatonStats.COUNTERS
+		width = max([len("phase")] + [len(path) for path in self.phases])
+
+		print("{:<{fill}}".format("phase", fill=width),
+			*("{:>16}".format(column) for column in columns), file=file)
+
+		for path, record in self.phases.items():
+			print("{:<{fill}}".format(path, fill=width),
+				"{:>16}".format(record["calls"]),
+				"{:>16.6f}".format(record["seconds"]),
+				*("{:>16}".format(record[column]) for column in columns[2:]),
+				file=file)
+
+class SymbolIntervals:
+	def __init__(self, starts, labels):
+		"""
+			Mapping of single character symbols to the label of their
+			class, kept as a partition of all code points in intervals:
+			interval i has the code points from starts[i] up to (but
+			not including) starts[i + 1], all of them in the class la-
+			bels[i] (None if they are in no class), and starts[0] is 0.
+			get() finds the interval of a symbol by binary search, so
+			a class may span any range of Unicode at no extra cost.
+
+			As in Automaton.compress_alphabet(), every class is label-
+			ed by its first symbol, and may have many intervals. Adja-
+			cent intervals in the same class are merged.
+		"""
+		self.starts = []
+		self.labels = []
+
+		for start, label in zip(starts, labels):
+			if self.labels and self.labels[-1] == label:
+				continue
+			self.starts.append(start)
+			self.labels.append(label)
+
+	@staticmethod
+	def partition(charsets):
+		"""
+			Split the code points in the coarsest classes no set of
+			the given ones splits, i.e. code points are in the same
+			class if they are in the same sets (code points in no set
+			are in no class). Each set is a sequence of (first, last)
+			code point ranges. Returns the SymbolIntervals and, for
+			each set, the labels of the classes it is made of.
+		"""
+		points = {0}
+		for ranges in charsets:
+			for first, last in ranges:
+				points.add(first)
+				if last < sys.maxunicode:
+					points.add(last + 1)
+		points = sorted(points)
+
+		# Sets with each interval between two consecutive points
+		members = [[] for _ in points]
+		for i, ranges in enumerate(charsets):
+			for first, last in ranges:
+				for j in range(bisect.bisect_left(points, first),
+					bisect.bisect_right(points, last)):
+					members[j].append(i)
+
+		signatures = {}
+		labels = []
+		for point, sets in zip(points, members):
+			labels.append(signatures.setdefault(tuple(sets), chr(point)) \
+				if sets else None)
+
+		set_labels = [[] for _ in charsets]
+		for sets, label in signatures.items():
+			for i in sets:
+				set_labels[i].append(label)
+
+		return SymbolIntervals(points, labels), set_labels
+
+	@staticmethod
+	def singletons(symbols):
+		"""
+			SymbolIntervals with a class of its own for every single
+			character symbol given (other symbols are left out).
+		"""
+		return SymbolIntervals.partition([[(ord(symbol), ord(symbol))] \
+			for symbol in symbols if isinstance(symbol, str) and \
+				len(symbol) == 1])[0]
+
+	def __labelat__(self, code):
+		return self.labels[bisect.bisect_right(self.starts, code) - 1]
+
+	def get(self, symbol, default=None):
+		"""
+			Label of the class of the given symbol, or "default" if
+			it is in no class.
+		"""
+		if not isinstance(symbol, str) or len(symbol) != 1:
+			return default
+
+		label = self.__labelat__(ord(symbol))
+		return default if label is None else label
+
+	def intervals(self):
+		"""
+			Iterate over the (first code point, last code point, la-
+			bel) of every interval in some class.
+		"""
+		for i, label in enumerate(self.labels):
+			if label is not None:
+				last = self.starts[i + 1] - 1 if i + 1 < len(self.starts) \
+					else sys.maxunicode
+				yield self.starts[i], last, label
+
+	def class_labels(self):
+		"""
+			Labels of all classes, in the order of their first code
+			points.
+		"""
+		return list(dict.fromkeys(label for label in self.labels \
+			if label is not None))
+
+	def relabel(self, labels):
+		"""
+			Same intervals, with the classes renamed (or merged) as
+			given by the dictionary "labels". Classes left out keep
+			their labels.
+		"""
+		return SymbolIntervals(self.starts, [label if label is None \
+			else labels.get(label, label) for label in self.labels])
+
+	def refine(self, intervals):
+		"""
+			Coarsest SymbolIntervals whose classes split both the
+			classes of this one and the ones of "intervals".
+		"""
+		points = sorted(set(self.starts).union(intervals.starts))
+
+		pairs = {}
+		labels = []
+		for point in points:
+			pair = (self.__labelat__(point), intervals.__labelat__(point))
+			labels.append(pairs.setdefault(pair, chr(point)) \
+				if pair != (None, None) else None)
+
+		return SymbolIntervals(points, labels)
+
+	def __eq__(self, other):
+		return isinstance(other, SymbolIntervals) and \
+			self.starts == other.starts and self.labels == other.labels
+
+	def __repr__(self):
+		return "{" + ", ".join((repr(chr(first)) if first == last else \
+			repr(chr(first)) + "-" + repr(chr(last))) + ": " + repr(label) \
+				for first, last, label in self.intervals()) + "}"
+
 class Automaton:
 	def __init__(self,
 		filepath=None,
@@ -13,7 +346,9 @@ class Automaton:
 		regex=None,
 		grammar=None,
 		sep=",",
-		null_symbol="e"):
+		null_symbol="e",
+		regex_engine="thompson",
+		frozen=False):
 
 		"""
 			Attributes description:
@@ -102,27 +437,82 @@ class Automaton:
 
 			null_symbol	: Symbol used as null_transition/empty string. Must be
 					given when both loading a regex or a grammar.
+
+			regex_engine	: How "regex" is converted to a automaton: "thompson"
+					(NFAe, by Thompson's construction) or "derivatives"
+					(DFA, by Brzozowski's derivatives). See load_regex().
+
+			frozen		: If True, the rows of "transit_matrix" are shared with
+					the given structure instead of deep-copied, and a row
+					is copied only the first time this automaton modifies
+					it (copy-on-write). Automatons derived from a frozen
+					one (copy(), complement(), minimize(), ...) are frozen
+					too and share its unchanged rows. The caller must not
+					modify shared rows in place afterwards. See freeze().
 		"""
 
+		self.frozen = frozen
+
+		# States whose rows may be shared with other automatons,
+		# and therefore must be copied before any modification
+		# (see __writablerow__). Always empty if not frozen.
+		self.shared_rows = set()
+
 		# "transit_matrix" is already a formal representation
 		# of both the set of automaton possible states and
 		# the transition function.
-		self.transit_matrix = copy.deepcopy(transit_matrix) \
-			if transit_matrix is not None and transit_matrix else OrderedDict()
+		if frozen:
+			self.transit_matrix = OrderedDict(transit_matrix) \
+				if transit_matrix is not None and transit_matrix else OrderedDict()
+			self.shared_rows.update(self.transit_matrix)
+
+			self.alphabet = list(alphabet) \
+				if alphabet is not None and alphabet else []
+
+			self.final_states = set(final_states) \
+				if final_states is not None and final_states else set()
+
+		else:
+			self.transit_matrix = copy.deepcopy(transit_matrix) \
+				if transit_matrix is not None and transit_matrix else OrderedDict()
+
+			self.alphabet = copy.deepcopy(alphabet) \
+				if alphabet is not None and alphabet else []
 
-		self.alphabet = copy.deepcopy(alphabet) \
-			if alphabet is not None and alphabet else []
+			self.final_states = copy.deepcopy(final_states) \
+				if final_states is not None and final_states else set()
 
 		self.initial_state = initial_state
 
-		self.final_states = copy.deepcopy(final_states) \
-			if final_states is not None and final_states else set()
+		# Literals every string accepted must contain, known only for
+		# automatons built by load_regex() (see __regexliterals__)
+		self.literals = None
+
+		# Structural properties already known ("deterministic",
+		# "complete", "trim", "minimal"), see is_deterministic()
+		self.properties = {}
+
+		# Identifier of an implicit accepting sink state: if set, every
+		# undefined transition (by a symbol of the alphabet) leads to
+		# a final state, not stored in "transit_matrix", that loops on
+		# every symbol. Otherwise (None), every undefined transition
+		# leads to the implicit dead state, i.e. rejects. complement()
+		# sets it, so no sink row needs to be stored.
+		self.accepting_sink = None
+
+		# Class label of every symbol of the original alphabet, if the
+		# alphabet is compressed into symbol equivalence classes (see
+		# compress_alphabet()). None if not compressed.
+		self.symbol_classes = None
 
 		if filepath is not None:
-			self.__readautomaton__(filepath=filepath, sep=sep)
+			if CompactAutomaton.is_binary(filepath):
+				self.__readbinary__(filepath=filepath)
+			else:
+				self.__readautomaton__(filepath=filepath, sep=sep)
 
 		elif regex is not None:
-			self.load_regex(regex, null_symbol=null_symbol)
+			self.load_regex(regex, null_symbol=null_symbol, engine=regex_engine)
 
 		elif grammar is not None:
 			self.load_grammar(grammar, null_symbol=null_symbol)
@@ -166,6 +556,19 @@ class Automaton:
 
 				self.transit_matrix[new_state] = entries
 
+	def __readbinary__(self, filepath):
+		# Binary files (see CompactAutomaton.save) are mapped and
+		# then converted to the dictionary form
+		compact = CompactAutomaton.load(filepath)
+		aut = compact.to_automaton()
+		compact.close()
+
+		self.alphabet = aut.alphabet
+		self.initial_state = aut.initial_state
+		self.transit_matrix = aut.transit_matrix
+		self.final_states = aut.final_states
+		self.symbol_classes = aut.symbol_classes
+
 	def __setequal__(self, a, b):
 		# Verify if both sets are equal
 		return len(a - b)==0 and len(b - a)==0
@@ -176,6 +579,7 @@ class Automaton:
 				return state
 		return None
 
+	@AutomatonStats.instrument("insert_sink_state")
 	def __insertsinkstate__(self, state_id="SINK", dfa=True):
 		keep_sink_state = False
 
@@ -190,51 +594,207 @@ class Automaton:
 			for symbol in self.alphabet:
 				# Every undefined transition must now point
 				# to the sink state
-				if not self.transit_matrix[state][symbol]:
+				if not self.transit_matrix[state].get(symbol):
 					keep_sink_state = True
-					self.transit_matrix[state][symbol] = sink_transit
+					self.__writablerow__(state)[symbol] = sink_transit
+
+		AutomatonStats.count(
+			states_created=int(keep_sink_state),
+			transitions=len(self.transit_matrix) * len(self.alphabet))
 
 		# If no need for sink state
 		if not keep_sink_state:
 			self.transit_matrix.pop(state_id)
 
+		self.properties["complete"] = True
+		if keep_sink_state:
+			self.properties.pop("trim", None)
+			self.properties.pop("minimal", None)
+
+	@AutomatonStats.instrument("null_closures")
 	def __getnulltransitions__(self, target=None, null_symbol="e"):
-		null_transitions = {}
+		"""
+			Null transitions set T_e(p) of the state "target" or, if
+			not given, a dictionary with the sets of all states. In
+			the latter case, states in the same strongly connected
+			component of the null transitions graph share the very
+			same set object, so those sets must not be modified.
+		"""
+		if target is None:
+			return self.__allnulltransitions__(null_symbol=null_symbol)
 
-		state_list = self.transit_matrix.keys() \
-			if target is None else [target]
-		
-		for state in state_list:
-			# Promote a blind search starting in every possible
-			# state of the transition matrix. DFS was choosen 
-			# because it uses less memory than the BFS.
+		# Promote a blind search starting in the target state. DFS
+		# was choosen because it uses less memory than the BFS.
+		null_transitions = {target}
+		active_vertexes = [target]
+
+		while active_vertexes:
+			cur_vertex = active_vertexes.pop()
+
+			# By definition, a undefined null transition is
+			# the current vertex itself, which is already in
+			# the null transitions set
+			null_t_vertexes = self.transit_matrix[cur_vertex].get(null_symbol)
+			if not null_t_vertexes:
+				continue
 
-			null_transitions[state] = {state}
-			active_vertexes = [state]
-			predecessor_track = {state : None}
+			if not isinstance(null_t_vertexes, set):
+				null_t_vertexes = {null_t_vertexes}
 
-			while active_vertexes:
-				cur_vertex = active_vertexes.pop()
+			for null_t_vertex in null_t_vertexes:
+				if null_t_vertex not in null_transitions:
+					# Each reached state is a null_transition for
+					# the target state.
+					null_transitions.add(null_t_vertex)
+					active_vertexes.append(null_t_vertex)
 
-				if null_symbol not in self.transit_matrix[cur_vertex]:
-					# By definition, a undefined null transition is
-					# the current vertex itself
-					self.transit_matrix[cur_vertex][null_symbol] = {cur_vertex}
+		AutomatonStats.count(closures=1)
 
-				for null_t_vertex in self.transit_matrix[cur_vertex][null_symbol]:
-					if null_t_vertex not in predecessor_track:
-						predecessor_track[null_t_vertex] = cur_vertex
-						active_vertexes.append(null_t_vertex)
+		return null_transitions
+
+	def __targetids__(self, states, state_index, symbol):
+		# Tuple of the ids of the targets of every state for the
+		# given symbol
+		targets = []
+		for state in states:
+			transit = self.transit_matrix[state].get(symbol)
+			if not transit:
+				targets.append(())
+			elif isinstance(transit, set):
+				targets.append(tuple(state_index[target] for target in transit))
+			else:
+				targets.append((state_index[transit],))
+
+		return targets
 
-						# Each reached state is a null_transition for
-						# the current state.
-						null_transitions[state].update({null_t_vertex})
+	def __allnulltransitions__(self, null_symbol="e"):
+		states = list(self.transit_matrix.keys())
+		state_index = {state : i for i, state in enumerate(states)}
 
-		if target is not None:
-			return null_transitions[target]
+		_, components, closures = Automaton.__nullclosures__(\
+			self.__targetids__(states, state_index, null_symbol))
+
+		null_transitions = {}
+		for members, closure in zip(components, closures):
+			closure = {states[i] for i in Automaton.__bitsetids__(closure)}
+			for i in members:
+				null_transitions[states[i]] = closure
 
 		return null_transitions
 
+	@staticmethod
+	def __nullclosures__(successors):
+		"""
+			Null transitions sets of all states of a graph given by
+			"successors" (the tuple of null transition target ids of
+			each state id), computed once per strongly connected com-
+			ponent instead of once per state.
+
+			The components are found by Tarjan's algorithm (iterative,
+			so long null transition chains can't overflow the stack),
+			which finishes every component only after all components
+			reachable from it. So the closure of a component, kept as
+			a bitset (an int with bit i set for state i), is just its
+			own states plus the closures of its successor components,
+			already built by then. This costs O(n + m) bitset unions,
+			instead of a blind search from every state.
+
+			Returns the component id of each state, the list of member
+			state ids of each component and the list of closures (as
+			bitsets) of each component. Components are listed in the
+			order they were finished, so every component comes after
+			all components reachable from it.
+		"""
+		num_states = len(successors)
+
+		index = [-1] * num_states
+		low = [0] * num_states
+		component_of = [-1] * num_states
+		on_stack = [False] * num_states
+		stack = []
+
+		closures = []
+		components = []
+		counter = 0
+
+		for root in range(num_states):
+			if index[root] != -1:
+				continue
+
+			index[root] = low[root] = counter
+			counter += 1
+			stack.append(root)
+			on_stack[root] = True
+
+			# Each entry is [state, position of its next successor]
+			work = [[root, 0]]
+			while work:
+				entry = work[-1]
+				vertex = entry[0]
+				vertex_successors = successors[vertex]
+
+				if entry[1] < len(vertex_successors):
+					target = vertex_successors[entry[1]]
+					entry[1] += 1
+
+					if index[target] == -1:
+						index[target] = low[target] = counter
+						counter += 1
+						stack.append(target)
+						on_stack[target] = True
+						work.append([target, 0])
+
+					elif on_stack[target] and index[target] < low[vertex]:
+						low[vertex] = index[target]
+
+					continue
+
+				work.pop()
+				if work and low[vertex] < low[work[-1][0]]:
+					low[work[-1][0]] = low[vertex]
+
+				if low[vertex] != index[vertex]:
+					continue
+
+				# "vertex" is the root of a new component
+				component = len(closures)
+				members = []
+				closure = 0
+				while True:
+					member = stack.pop()
+					on_stack[member] = False
+					component_of[member] = component
+					members.append(member)
+					closure |= 1 << member
+					if member == vertex:
+						break
+
+				for member in members:
+					for target in successors[member]:
+						if component_of[target] != component:
+							closure |= closures[component_of[target]]
+
+				closures.append(closure)
+				components.append(members)
+
+		AutomatonStats.count(closures=len(closures))
+
+		return component_of, components, closures
+
+	@staticmethod
+	def __bitsetids__(bitset):
+		# Bit i of the bitset is the character i of its reversed
+		# binary representation
+		bits = bin(bitset)[:1:-1]
+		ids = []
+		i = bits.find("1")
+		while i != -1:
+			ids.append(i)
+			i = bits.find("1", i + 1)
+
+		return ids
+
+	@AutomatonStats.instrument("blind_search")
 	def __blindsearch__(self, start_state):
 		stack = [start_state]
 		visited_states = {start_state}
@@ -243,12 +803,15 @@ class Automaton:
 			cur_state = stack.pop()
 
 			for symbol in self.alphabet:
-				adj_vertex = self.transit_matrix[cur_state][symbol]
+				adj_vertex = self.transit_matrix[cur_state].get(symbol)
 
 				if adj_vertex and adj_vertex not in visited_states:
 					visited_states.update({adj_vertex})
 					stack.append(adj_vertex)
 
+		AutomatonStats.count(
+			transitions=len(visited_states) * len(self.alphabet))
+
 		return visited_states
 
 	def __testequivalence__(self, vertex_a, vertex_b):
@@ -306,7 +869,9 @@ class Automaton:
 
 		for vertex in second_transit_mat:
 			for symbol in automaton.alphabet:
-				if type(second_transit_mat[vertex][symbol]) != type(set()):
+				if symbol not in second_transit_mat[vertex]:
+					second_transit_mat[vertex][symbol] = set()
+				elif type(second_transit_mat[vertex][symbol]) != type(set()):
 					second_transit_mat[vertex][symbol] = \
 						{second_transit_mat[vertex][symbol]}
 
@@ -371,6 +936,12 @@ class Automaton:
 		return state_id
 
 	def print(self, undefined_symbol="-", sort_state_names=False, gen_input_file=False):
+		if self.accepting_sink is not None:
+			self.__materializesink__().print(undefined_symbol=undefined_symbol,
+				sort_state_names=sort_state_names,
+				gen_input_file=gen_input_file)
+			return
+
 		if gen_input_file:
 			self.gen_input_file()
 			return
@@ -401,7 +972,7 @@ class Automaton:
 
 			for c in self.alphabet:
 				print("{vid:<{fill}}".format(\
-					vid=str(entries[c]), fill=max_id_len) if entries[c] \
+					vid=str(entries[c]), fill=max_id_len) if entries.get(c) \
 						else max_id_len * undefined_symbol, end="|")
 
 			print()
@@ -411,7 +982,14 @@ class Automaton:
 			"\n\tstart state:", self.initial_state,
 			"\n\tfinal states:", self.final_states)
 
+		if self.symbol_classes is not None:
+			print("\tsymbol classes:", self.symbol_classes)
+
 	def gen_input_file(self):
+		if self.accepting_sink is not None or self.symbol_classes is not None:
+			self.__materializesink__().expand_alphabet().gen_input_file()
+			return
+
 		print(",".join(self.alphabet))
 		print(self.initial_state)
 		for state in sorted(self.transit_matrix.keys()):
@@ -422,20 +1000,235 @@ class Automaton:
 			print(aux_label, end=",")
 
 			for symbol in self.alphabet:
-				aux_states = self.transit_matrix[state][symbol]
+				aux_states = self.transit_matrix[state].get(symbol, ())
 				if type(aux_states) != type(""):
 					aux_states = ",".join(aux_states)
 				print("{", aux_states, "}", sep="", 
 					end="," if symbol != self.alphabet[-1] else "")
 			print()
 
-	def nfa_to_dfa(self, state_prefix="DFA"):
+	def save(self, filepath, null_symbol="e"):
+		"""
+			Save the automaton in the versioned binary format of
+			CompactAutomaton.save(), which can be loaded back (memory
+			mapped) by CompactAutomaton.load() or by Automaton(filepath).
+		"""
+		self.to_compact(null_symbol=null_symbol).save(filepath)
+
+	@AutomatonStats.instrument("nfa_to_dfa")
+	def nfa_to_dfa(self, state_prefix="DFA", algorithm="hash", workers=None):
+		"""
+			Subset construction. Every DFA state is named after
+			state_prefix plus the order in which its NFA subset
+			was first reached.
+
+			algorithm	: "hash" (default) keys every subset already
+					found by its frozenset, so checking if a subset
+					is new costs a single dictionary lookup. "bitset"
+					does the same with subsets kept as int bitsets
+					(bit i set for the i-th state), with the targets
+					of every state per symbol precomputed as bitsets
+					(and memoized per block of 8 states), so unions
+					and lookups are big-int operations; it builds ex-
+					actly the same DFA, faster for NFAs with thousands
+					of states. "parallel" is the "bitset" algorithm with
+					each BFS level of subsets expanded in batches by a
+					pool of "workers" processes (default is one per
+					CPU), which share the NFA tables through shared
+					memory; the DFA is still exactly the same. "linear"
+					keeps the original implementation, which compares
+					the new subset against every subset found so far,
+					and is kept only for cross-checking/benchmarking.
+
+			Only the defined transitions are stored in the DFA rows.
+		"""
+		if self.accepting_sink is not None:
+			return self.__materializesink__().nfa_to_dfa(state_prefix=state_prefix,
+				algorithm=algorithm, 
+				workers=workers)
+
+		if algorithm == "linear":
+			return self.__nfatodfalinear__(state_prefix=state_prefix)
+
+		if algorithm == "bitset":
+			return self.__nfatodfabitset__(state_prefix=state_prefix)
+
+		if algorithm == "parallel":
+			return self.__nfatodfabitset__(state_prefix=state_prefix,
+				workers=workers or os.cpu_count() or 1)
+
+		if algorithm != "hash":
+			raise ValueError("Unknown subset construction algorithm: " + \
+				str(algorithm))
+
+		# Init DFA ("Deterministic Finite Automaton")
+		dfa_var = Automaton(alphabet=self.alphabet, frozen=self.frozen)
+		dfa_var.properties["deterministic"] = True
+		dfa_var.symbol_classes = self.symbol_classes
+
+		# Initial configuration of the resultant automaton
+		initial_state_name = state_prefix + "0"
+		dfa_var.initial_state = initial_state_name
+
+		if self.initial_state in self.final_states:
+			dfa_var.final_states.add(initial_state_name)
+
+		initial_subset = frozenset({self.initial_state})
+		mapping = {initial_subset : initial_state_name}
+		list_to_proc = deque([(initial_state_name, initial_subset)])
+
+		while list_to_proc:
+			cur_state, cur_subset = list_to_proc.popleft()
+			dfa_row = dfa_var.transit_matrix[cur_state] = {}
+			nfa_rows = [self.transit_matrix[nfa_state] \
+				for nfa_state in cur_subset]
+
+			for c in dfa_var.alphabet:
+				aux = set()
+
+				for nfa_row in nfa_rows:
+					update_aux_val = nfa_row.get(c)
+					if isinstance(update_aux_val, set):
+						aux.update(update_aux_val)
+					elif update_aux_val:
+						aux.add(update_aux_val)
+
+				if aux:
+					aux = frozenset(aux)
+					transit_name = mapping.get(aux)
+
+					if transit_name is None:
+						transit_name = state_prefix + str(len(mapping))
+						mapping[aux] = transit_name
+						list_to_proc.append((transit_name, aux))
+
+						if not self.final_states.isdisjoint(aux):
+							dfa_var.final_states.add(transit_name)
+
+					dfa_row[c] = transit_name
+
+		if AutomatonStats.active is not None:
+			AutomatonStats.count(
+				states_created=len(mapping),
+				subsets_explored=len(mapping),
+				transitions=len(self.alphabet) * \
+					sum(len(subset) for subset in mapping))
+
+		return dfa_var
+
+	def __nfatodfabitset__(self, state_prefix="DFA", workers=1, 
+		batch_size=256, min_parallel_frontier=64):
+
+		states = list(self.transit_matrix.keys())
+		state_index = {state : i for i, state in enumerate(states)}
+		alphabet_len = len(self.alphabet)
+
+		# Targets of every (state, symbol) cell, in CSR form: the
+		# targets of cell "state * alphabet_len + symbol" are
+		# targets[offsets[cell]:offsets[cell + 1]]
+		symbol_targets = [self.__targetids__(states, state_index, symbol) \
+			for symbol in self.alphabet]
+
+		offsets = array("q", [0])
+		targets = array("q")
+		for i in range(len(states)):
+			for c in range(alphabet_len):
+				targets.extend(symbol_targets[c][i])
+				offsets.append(len(targets))
+
+		expander = SubsetExpander(offsets, targets, len(states), alphabet_len)
+
+		final_bitset = 0
+		for state in self.final_states:
+			if state in state_index:
+				final_bitset |= 1 << state_index[state]
+
+		# Init DFA ("Deterministic Finite Automaton")
+		dfa_var = Automaton(alphabet=self.alphabet, frozen=self.frozen)
+		dfa_var.properties["deterministic"] = True
+		dfa_var.symbol_classes = self.symbol_classes
+
+		initial_state_name = state_prefix + "0"
+		dfa_var.initial_state = initial_state_name
+
+		initial_subset = 1 << state_index[self.initial_state]
+		if initial_subset & final_bitset:
+			dfa_var.final_states.add(initial_state_name)
+
+		mapping = {initial_subset : initial_state_name}
+
+		pool = None
+		shared_tables = None
+		try:
+			# The pool is created inside the "try", so the shared
+			# block is unlinked even if the pool can't be started
+			if workers > 1:
+				shared_tables = SubsetExpander.share(offsets, targets)
+				pool = multiprocessing.Pool(workers, 
+					initializer=SubsetExpander.attach,
+					initargs=(shared_tables.name, len(offsets), len(targets), 
+						len(states), alphabet_len))
+
+			# The frontier is expanded a whole BFS level at a time,
+			# and its results are read back in order, so subsets are
+			# numbered exactly as by the serial algorithm
+			frontier = [initial_subset]
+			while frontier:
+				if pool is None or len(frontier) < min_parallel_frontier:
+					results = map(expander.expand, frontier)
+				else:
+					batches = [frontier[i:i + batch_size] \
+						for i in range(0, len(frontier), batch_size)]
+					results = itertools.chain.from_iterable(\
+						pool.imap(SubsetExpander.expand_batch, batches))
+
+				next_frontier = []
+				for cur_subset, successors in zip(frontier, results):
+					dfa_row = dfa_var.transit_matrix[mapping[cur_subset]] = {}
+
+					for c, aux in zip(dfa_var.alphabet, successors):
+						if aux:
+							transit_name = mapping.get(aux)
+
+							if transit_name is None:
+								transit_name = state_prefix + str(len(mapping))
+								mapping[aux] = transit_name
+								next_frontier.append(aux)
+
+								if aux & final_bitset:
+									dfa_var.final_states.add(transit_name)
+
+							dfa_row[c] = transit_name
+
+				frontier = next_frontier
+
+		finally:
+			if pool is not None:
+				pool.terminate()
+				pool.join()
+			if shared_tables is not None:
+				shared_tables.close()
+				shared_tables.unlink()
+
+		if AutomatonStats.active is not None:
+			AutomatonStats.count(
+				states_created=len(mapping),
+				subsets_explored=len(mapping),
+				transitions=len(self.alphabet) * \
+					sum(bin(subset).count("1") for subset in mapping))
+
+		return dfa_var
+
+	def __nfatodfalinear__(self, state_prefix="DFA"):
 		# Init DFA ("Deterministic Finite Automaton")
 		dfa_var = Automaton(
 			alphabet=self.alphabet,
 			transit_matrix={},
 			initial_state=None, 
-			final_states=set())
+			final_states=set(),
+			frozen=self.frozen)
+		dfa_var.properties["deterministic"] = True
+		dfa_var.symbol_classes = self.symbol_classes
 
 		# Initial configuration of the resultant automaton
 		initial_state_name = state_prefix + "0"
@@ -455,7 +1248,7 @@ class Automaton:
 				aux = set()
 
 				for nfa_state in mapping[cur_state]:
-					update_aux_val = self.transit_matrix[nfa_state][c]
+					update_aux_val = self.transit_matrix[nfa_state].get(c, set())
 					if type(update_aux_val) != type(set()):
 						update_aux_val = {update_aux_val}
 					aux.update(update_aux_val)
@@ -471,71 +1264,487 @@ class Automaton:
 							dfa_var.final_states.update({transit_name})
 					else:
 						transit_name = self.__searchset__(mapping, aux)
-				else:
-					transit_name = set()
 
-				dfa_var.transit_matrix[cur_state][c] = transit_name
+					dfa_var.transit_matrix[cur_state][c] = transit_name
+
+		if AutomatonStats.active is not None:
+			AutomatonStats.count(
+				states_created=len(mapping),
+				subsets_explored=len(mapping),
+				transitions=len(self.alphabet) * \
+					sum(len(subset) for subset in mapping.values()))
 
 		return dfa_var	
 
+	@AutomatonStats.instrument("nfae_to_nfa")
 	def nfae_to_nfa(self, null_symbol="e"):
+		# Nothing to remove, so the NFA would be just a copy
+		if self.is_nullfree(null_symbol):
+			return self.copy()
+
+		if self.accepting_sink is not None:
+			return self.__materializesink__().nfae_to_nfa(null_symbol=null_symbol)
+
 		nfa = Automaton(
 			alphabet=self.alphabet,
-			initial_state=self.initial_state)
+			initial_state=self.initial_state,
+			frozen=self.frozen)
+		nfa.symbol_classes = self.symbol_classes
 
 		if null_symbol in nfa.alphabet:
 			nfa.alphabet.remove(null_symbol)
 
-		# First, calculate T_e(p) for all states p from NFAe
-		null_transitions = self.__getnulltransitions__(null_symbol=null_symbol)
+		states = list(self.transit_matrix.keys())
+		state_index = {state : i for i, state in enumerate(states)}
+
+		# First, calculate T_e(p) for all states p from NFAe. Every
+		# set of states below is a bitset (see __nullclosures__).
+		with AutomatonStats.phase("null_closures"):
+			null_successors = self.__targetids__(states, state_index, null_symbol)
+			component_of, components, closures = \
+				Automaton.__nullclosures__(null_successors)
+
+		# Check if current state is a NFA final state
+		# (by definition if, in the null transitions
+		# function, p has at least one final state (i.e.
+		# has a non null intersection) of NFAe, then
+		# p is a final state of NFA.
+		final_bitset = 0
+		for state in self.final_states:
+			if state in state_index:
+				final_bitset |= 1 << state_index[state]
+
+		for members, closure in zip(components, closures):
+			if closure & final_bitset:
+				nfa.final_states.update(states[i] for i in members)
+
+		for state in states:
+			nfa.transit_matrix[state] = {}
 
 		# Each entry of the NFA transit matrix is in the form
 		# T_NFA(p, c) = T_NFAe_e(T_NFAe(T_NFAe_e(p), c))
-		for state in self.transit_matrix:
-			nfa.transit_matrix[state] = {}
+		#
+		# All states of a component have the same T_NFAe_e(p), so
+		# they have the same entries. And, as T_NFAe_e(p) is the
+		# union of the component states with the T_NFAe_e of its
+		# successor components, the entry of a component is the
+		# union of T_NFAe_e(T_NFAe(q, c)), for all its states q,
+		# with the entries of its successor components, which
+		# were already built (see __nullclosures__).
+		for symbol in nfa.alphabet:
+			symbol_targets = self.__targetids__(states, state_index, symbol)
+			entries = []
+
+			for component, members in enumerate(components):
+				entry = 0
+				for member in members:
+					for target in symbol_targets[member]:
+						entry |= closures[component_of[target]]
+
+					for target in null_successors[member]:
+						if component_of[target] != component:
+							entry |= entries[component_of[target]]
+
+				entries.append(entry)
+
+			for members, entry in zip(components, entries):
+				target_ids = Automaton.__bitsetids__(entry)
+				for member in members:
+					nfa.transit_matrix[states[member]][symbol] = \
+						{states[i] for i in target_ids}
+
+		if AutomatonStats.active is not None:
+			AutomatonStats.count(
+				states_created=len(nfa.transit_matrix),
+				transitions=len(nfa.alphabet) * \
+					(len(states) + sum(len(targets) for targets in null_successors)))
 
-			# Check if current state is a NFA final state
-			# (by definition if, in the null transitions
-			# function, p has at least one final state (i.e.
-			# has a non null intersection) of NFAe, then
-			# p is a final state of NFA.
-			if self.final_states.intersection(null_transitions[state]):
-				nfa.final_states.update({state})
+		return nfa
 
-			for symbol in nfa.alphabet:
-				if symbol != null_symbol:
-					nfa_state_transit = set()
+	def copy(self):
+		if self.frozen:
+			# Both automatons may now be the owner of the
+			# rows, so neither can modify them in place
+			self.shared_rows.update(self.transit_matrix)
 
-					# Calculating T_NFAe(<for states>, c)
-					for nfae_null_t_state in null_transitions[state]:
-						transit_aux = self.transit_matrix[nfae_null_t_state][symbol]
+		automaton = Automaton(
+			alphabet=self.alphabet,
+			transit_matrix=self.transit_matrix,
+			initial_state=self.initial_state,
+			final_states=self.final_states,
+			frozen=self.frozen)
 
-						if type(transit_aux) != type(set()):
-							transit_aux = {transit_aux}
+		automaton.properties.update(self.properties)
+		automaton.accepting_sink = self.accepting_sink
+		automaton.symbol_classes = self.symbol_classes
 
-						nfa_state_transit.update(transit_aux)
+		return automaton
 
-					# Calculating T_NFAe_e(<for states of prev result)
-					aux = set()
-					for aux_state in nfa_state_transit:
-						aux.update(null_transitions[aux_state])
-					nfa_state_transit.update(aux)
+	def freeze(self):
+		"""
+			Switch this automaton to the copy-on-write mode (see the
+			"frozen" parameter of the constructor), so that every
+			automaton derived from it shares its unchanged rows
+			instead of deep-copying the whole transition matrix.
 
-					nfa.transit_matrix[state][symbol] = nfa_state_transit
+			Returns the automaton itself.
+		"""
+		self.frozen = True
+		self.shared_rows.update(self.transit_matrix)
+		return self
 
-		for vertex in nfa.transit_matrix:
-			if null_symbol in nfa.transit_matrix[vertex]:
-				nfa.transit_matrix[vertex].remove(null_symbol)
+	def __writablerow__(self, state):
+		# Row of "state" that may be modified in place, copying
+		# it first if it still may be shared (see "frozen")
+		row = self.transit_matrix[state]
+
+		if state in self.shared_rows:
+			row = {symbol : set(targets) if isinstance(targets, set) else targets \
+				for symbol, targets in row.items()}
+			self.transit_matrix[state] = row
+			self.shared_rows.discard(state)
+
+		return row
+
+	@staticmethod
+	def __wrap__(alphabet, transit_matrix, initial_state, final_states, 
+		frozen=False, shared_rows=()):
+		# Build an automaton directly over structures owned by
+		# the caller (temporaries), without copying them
+		wrapped = Automaton(initial_state=initial_state, frozen=frozen)
+		wrapped.alphabet = alphabet
+		wrapped.transit_matrix = transit_matrix
+		wrapped.final_states = final_states
+		wrapped.shared_rows.update(shared_rows)
+		return wrapped
+
+	def is_nullfree(self, null_symbol="e"):
+		"""
+			Check if the null symbol is not in the alphabet, so
+			nfae_to_nfa() has nothing to do.
+		"""
+		return null_symbol not in self.alphabet
 
-		return nfa
+	def is_deterministic(self, null_symbol="e"):
+		"""
+			Check if the automaton is a DFA: it has no null transitions
+			and every transition leads to at most one state (either a
+			plain state identifier or a singleton set, as in DFAs read
+			from files). complement(), minimize(), grammar(), product()
+			and equivalent() skip the conversion to a DFA if so.
+
+			This and the other structural properties (is_complete(),
+			is_trim(), is_minimal()) are cached once known, and kept by
+			copy() and by the automatons derived from this one. The cache
+			must be reset by invalidate() if the transition matrix, the
+			alphabet, the initial state or the final states are modified
+			directly.
+		"""
+		if not self.is_nullfree(null_symbol):
+			return False
 
-	def copy(self):
-		return Automaton(
-			alphabet=self.alphabet,
-			transit_matrix=self.transit_matrix,
+		if "deterministic" not in self.properties:
+			self.properties["deterministic"] = all(not isinstance(targets, set) \
+				or len(targets) <= 1 for row in self.transit_matrix.values() \
+					for targets in row.values())
+
+		return self.properties["deterministic"]
+
+	def is_complete(self):
+		"""
+			Check if every state has a transition by every symbol
+			of the alphabet, which always holds if undefined tran-
+			sitions lead to an implicit accepting sink state (see
+			"accepting_sink"). See is_deterministic().
+		"""
+		if self.accepting_sink is not None:
+			return True
+
+		if "complete" not in self.properties:
+			self.properties["complete"] = all(row.get(symbol) \
+				for row in self.transit_matrix.values() \
+					for symbol in self.alphabet)
+
+		return self.properties["complete"]
+
+	def is_trim(self):
+		"""
+			Check if every state is both reachable from the initial
+			state and able to reach a final state. See is_determi-
+			nistic().
+		"""
+		if "trim" not in self.properties:
+			successors = {state : [] for state in self.transit_matrix}
+			predecessors = {state : [] for state in self.transit_matrix}
+			for state, row in self.transit_matrix.items():
+				for targets in row.values():
+					for target in (targets if isinstance(targets, set) \
+						else (targets,) if targets else ()):
+						if target in predecessors:
+							successors[state].append(target)
+							predecessors[target].append(state)
+
+			def search(start_states, adjacency):
+				visited = set(start_states)
+				stack = list(visited)
+				while stack:
+					for state in adjacency[stack.pop()]:
+						if state not in visited:
+							visited.add(state)
+							stack.append(state)
+				return visited
+
+			reachable = search({self.initial_state} & set(successors), successors)
+			useful = set(self.final_states) & set(predecessors)
+
+			# Undefined transitions lead to the accepting sink, if any
+			if self.accepting_sink is not None:
+				useful.update(state for state, row in self.transit_matrix.items() \
+					if not all(row.get(symbol) for symbol in self.alphabet))
+
+			useful = search(useful, predecessors)
+
+			self.properties["trim"] = \
+				reachable == useful == set(self.transit_matrix)
+
+		return self.properties["trim"]
+
+	def is_minimal(self, null_symbol="e"):
+		"""
+			Check if the automaton is known to be a minimal DFA, which
+			holds for automatons returned by minimize() (and their co-
+			pies). Minimality is never computed here, so False means
+			only "not known". See is_deterministic().
+		"""
+		return self.is_deterministic(null_symbol) and \
+			self.properties.get("minimal", False)
+
+	def invalidate(self):
+		"""
+			Forget every cached structural property (see is_determi-
+			nistic()). Must be called after modifying the automaton
+			structures directly.
+		"""
+		self.properties.clear()
+		return self
+
+	def __asdfa__(self, dfa=False, null_symbol="e"):
+		# Copy of this automaton as a DFA with plain state identifiers
+		# as transitions, converted only if not known to be a DFA
+		if not dfa and not self.is_deterministic(null_symbol):
+			dfa_automaton = self.nfae_to_nfa(null_symbol=null_symbol)
+			return dfa_automaton.nfa_to_dfa()
+
+		dfa_automaton = self.copy()
+
+		# DFAs read from files keep their transitions
+		# as singleton sets
+		for state in dfa_automaton.transit_matrix:
+			for symbol, target in list(dfa_automaton.transit_matrix[state].items()):
+				if isinstance(target, set) and len(target) == 1:
+					dfa_automaton.__writablerow__(state)[symbol] = next(iter(target))
+
+		return dfa_automaton
+
+	def __materializesink__(self):
+		# Equivalent automaton with the implicit accepting sink state
+		# (see "accepting_sink") as an actual final state, for the
+		# operations that only work with the states stored
+		if self.accepting_sink is None:
+			return self
+
+		automaton = self.copy()
+		automaton.accepting_sink = None
+		automaton.__insertsinkstate__(self.accepting_sink)
+
+		if self.accepting_sink in automaton.transit_matrix:
+			automaton.final_states.add(self.accepting_sink)
+
+		return automaton
+
+	def __accepts__(self, state):
+		# Check if "state" (None for the implicit dead state) is final
+		return state in self.final_states or \
+			(state is not None and state == self.accepting_sink)
+
+	@AutomatonStats.instrument("compress_alphabet")
+	def compress_alphabet(self, null_symbol="e"):
+		"""
+			Group the symbols that behave identically in every state
+			(i.e., lead from every state to the same states, or are
+			undefined in the same states) into equivalence classes,
+			and build the equivalent automaton over a single symbol
+			per class: its first symbol, in the alphabet order, which
+			also labels the class. The null symbol is kept apart.
+
+			The label of every original symbol is kept in "symbol_
+			classes", which run() uses to translate its input. Conver-
+			sions and minimization (nfae_to_nfa(), nfa_to_dfa(), mini-
+			mize(), complement(), ...) work over the classes, so they
+			scale with the number of classes instead of the alphabet
+			size, and keep the classes. Operations over two automatons
+			with different classes, and the ones that write, print as
+			input file or compile the automaton, use the original al-
+			phabet (see expand_alphabet()).
+		"""
+		# Defined cells of every symbol, in the order of the states,
+		# which tell the symbol apart from any other
+		cells = {symbol : [] for symbol in self.alphabet}
+		for i, row in enumerate(self.transit_matrix.values()):
+			for symbol, targets in row.items():
+				if targets and symbol in cells:
+					cells[symbol].append((i, frozenset(targets) \
+						if isinstance(targets, set) else frozenset((targets,))))
+
+		signatures = {}
+		labels = {}
+		for symbol in self.alphabet:
+			labels[symbol] = symbol if symbol == null_symbol else \
+				signatures.setdefault(tuple(cells[symbol]), symbol)
+
+		alphabet = [symbol for symbol in self.alphabet if labels[symbol] == symbol]
+
+		transit_matrix = OrderedDict()
+		for state, row in self.transit_matrix.items():
+			transit_matrix[state] = {symbol : copy.copy(row[symbol]) \
+				for symbol in alphabet if symbol in row}
+
+		# Compressing once more only merges some classes. Symbols
+		# added after the first compression stand for themselves.
+		if isinstance(self.symbol_classes, SymbolIntervals):
+			labels = self.symbol_classes.relabel(labels)
+		elif self.symbol_classes is not None:
+			previous = set(self.symbol_classes.values())
+			composed = {symbol : labels[label] for symbol, label \
+				in self.symbol_classes.items() if label in labels}
+			for symbol in self.alphabet:
+				if symbol not in previous:
+					composed.setdefault(symbol, labels[symbol])
+			labels = composed
+
+		compressed = Automaton.__wrap__(
+			alphabet=alphabet,
+			transit_matrix=transit_matrix,
+			initial_state=self.initial_state,
+			final_states=set(self.final_states),
+			frozen=self.frozen)
+
+		compressed.properties.update(self.properties)
+		compressed.accepting_sink = self.accepting_sink
+		compressed.symbol_classes = labels
+		compressed.literals = self.literals
+
+		AutomatonStats.count(
+			transitions=sum(len(row) for row in self.transit_matrix.values()))
+
+		return compressed
+
+	def expand_alphabet(self):
+		"""
+			Equivalent automaton over the original alphabet of this
+			one, if it is compressed into symbol equivalence classes
+			(see compress_alphabet()). Otherwise, this automaton it-
+			self is returned. Symbol intervals (see SymbolIntervals)
+			are expanded to every character in them, so classes such
+			as "." (see load_regex()) give huge alphabets.
+		"""
+		if self.symbol_classes is None:
+			return self
+
+		current = set(self.alphabet)
+		if isinstance(self.symbol_classes, SymbolIntervals):
+			alphabet = [chr(code) for first, last, label \
+				in self.symbol_classes.intervals() if label in current \
+					for code in range(first, last + 1)]
+		else:
+			alphabet = [symbol for symbol, label \
+				in self.symbol_classes.items() if label in current]
+
+		# Symbols added after the compression (e.g. the null symbol,
+		# by kleene_star()) stand for themselves
+		alphabet += [symbol for symbol in self.alphabet \
+			if self.symbol_classes.get(symbol) is None]
+
+		return self.__relabel__(None, alphabet)
+
+	def __relabel__(self, symbol_classes, alphabet):
+		# Equivalent automaton over the symbols of "alphabet", trans-
+		# lated by "symbol_classes". Each symbol takes the cells of the
+		# symbol (or class) of this automaton it belongs to, and is left
+		# out if there is none.
+		current = self.symbol_classes or {}
+		present = set(self.alphabet)
+
+		sources = OrderedDict()
+		for symbol in alphabet:
+			source = current.get(symbol, symbol)
+			if source in present:
+				sources[symbol] = source
+
+		transit_matrix = OrderedDict()
+		for state, row in self.transit_matrix.items():
+			transit_matrix[state] = {symbol : copy.copy(row[source]) \
+				for symbol, source in sources.items() if source in row}
+
+		relabeled = Automaton.__wrap__(
+			alphabet=list(sources),
+			transit_matrix=transit_matrix,
 			initial_state=self.initial_state,
-			final_states=self.final_states)
+			final_states=set(self.final_states),
+			frozen=self.frozen)
+
+		relabeled.properties.update(self.properties)
+		relabeled.accepting_sink = self.accepting_sink
+		relabeled.symbol_classes = symbol_classes
+		relabeled.literals = self.literals
+
+		return relabeled
+
+	def __commonalphabet__(self, automaton):
+		# Both automatons over the same symbols (see __commonclasses__)
+		return tuple(Automaton.__commonclasses__([self, automaton]))
+
+	@staticmethod
+	def __commonclasses__(automatons):
+		# The given automatons over the same symbols: the same classes,
+		# if compressed alike (see compress_alphabet()), the common re-
+		# finement of their classes, if any of them has symbol intervals
+		# (see SymbolIntervals), or else their original alphabets
+		symbol_classes = automatons[0].symbol_classes
+		if all(automaton.symbol_classes == symbol_classes \
+			for automaton in automatons):
+			return list(automatons)
+
+		if not any(isinstance(automaton.symbol_classes, SymbolIntervals) \
+			for automaton in automatons):
+			return [automaton.expand_alphabet() for automaton in automatons]
+
+		# Symbols which aren't single characters stand for themselves
+		automatons = [automaton.expand_alphabet() \
+			if not isinstance(automaton.symbol_classes, SymbolIntervals) \
+				else automaton for automaton in automatons]
+
+		common = None
+		for automaton in automatons:
+			intervals = automaton.symbol_classes if automaton.symbol_classes \
+				is not None else SymbolIntervals.singletons(automaton.alphabet)
+			common = intervals if common is None else common.refine(intervals)
+
+		labels = common.class_labels()
+		return [automaton.__relabel__(common, labels + [symbol \
+			for symbol in automaton.alphabet if common.get(symbol) is None]) \
+				for automaton in automatons]
+
+	def to_compact(self, null_symbol="e"):
+		"""
+			Build the integer-indexed, array-backed representation
+			(CompactAutomaton) of this automaton. The conversion is
+			lossless, so the original dictionary form can be recovered
+			with CompactAutomaton.to_automaton().
+		"""
+		return CompactAutomaton(self, null_symbol=null_symbol)
 
+	@AutomatonStats.instrument("complement")
 	def complement(self, dfa=False, sink_id="SINK"):
 		"""
 			A complementary Automaton has all
@@ -547,29 +1756,42 @@ class Automaton:
 			added to fulfil that requeriment if
 			the current automaton has at least
 			one undefined transition.
+
+			The sink state ("sink_id") isn't stored: every undefined
+			transition of the complementary automaton leads to an im-
+			plicit accepting sink state (see "accepting_sink"). Like-
+			wise, the accepting sink of this automaton, if any, beco-
+			mes the implicit dead state.
 		"""
 
 		# First, the automaton must be an DFA
-		if not dfa:
-			dfa_automaton = self.nfae_to_nfa()
-			dfa_automaton = dfa_automaton.nfa_to_dfa()
-		else:
-			dfa_automaton = self.copy()
+		dfa_automaton = self.__asdfa__(dfa=dfa)
 
-		# Try to insert a sink state in order to keep
-		# the complementary automaton transition matrix
-		# full
-		dfa_automaton.__insertsinkstate__(sink_id)
+		# The sink state, needed to keep the complementary
+		# automaton transition matrix full, is implicit
+		if dfa_automaton.accepting_sink is None:
+			sink_id = self.__stateidsintegrity__(\
+				dfa_automaton.transit_matrix.keys(), sink_id)
+		else:
+			sink_id = None
 
 		# Get the complementary set of states
 		compl_final_states = set(dfa_automaton.transit_matrix.keys()) \
 			- dfa_automaton.final_states
 
-		complementary = Automaton(
+		# "dfa_automaton" is a temporary, so its structures
+		# are handed over instead of copied once more
+		complementary = Automaton.__wrap__(
 			alphabet=dfa_automaton.alphabet, 
 			transit_matrix=dfa_automaton.transit_matrix,
 			initial_state=dfa_automaton.initial_state, 
-			final_states=compl_final_states)
+			final_states=compl_final_states,
+			frozen=dfa_automaton.frozen,
+			shared_rows=dfa_automaton.shared_rows)
+
+		complementary.accepting_sink = sink_id
+		complementary.symbol_classes = dfa_automaton.symbol_classes
+		complementary.properties["deterministic"] = True
 
 		return complementary
 
@@ -586,6 +1808,13 @@ class Automaton:
 			- The final states of the resultant automaton is the
 				final states of the second automaton.
 		"""
+		if self.accepting_sink is not None or \
+			automaton.accepting_sink is not None or \
+			self.symbol_classes != automaton.symbol_classes:
+			first, second = self.__materializesink__().__commonalphabet__(\
+				automaton.__materializesink__())
+			return first.concatenate(second, null_symbol=null_symbol)
+
 		unified_transit_mat, unified_alphabet, \
 			second_initial_state, second_final_states = \
 				self.__buildnewautomaton__(automaton, null_symbol)
@@ -597,14 +1826,18 @@ class Automaton:
 				[null_symbol].update({second_initial_state})
 
 		# Return concatenated automaton
-		return Automaton(
+		concatenated = Automaton.__wrap__(
 			transit_matrix = unified_transit_mat,
 			alphabet = unified_alphabet,
 			final_states = second_final_states,
-			initial_state = self.initial_state)
+			initial_state = self.initial_state,
+			frozen = self.frozen)
+		concatenated.symbol_classes = self.symbol_classes
+
+		return concatenated
 
 	def union(self, automaton, initial_state_id="US", 
-		final_state_id="UF", null_symbol="e"):
+		final_state_id="UF", null_symbol="e", algorithm="nfa", dfa=False):
 
 		"""
 			The union of two automatons is pretty much
@@ -619,7 +1852,30 @@ class Automaton:
 
 			- All initial and final states of both automatons
 				are downgraded to common states.
+
+			The result is a NFAe. With algorithm="product", the
+			union is built by product() instead, so the result
+			is a DFA ("dfa" tells if both automatons are already
+			DFAs).
 		"""
+		if algorithm == "product":
+			return self.product(automaton, 
+				operation="union", 
+				dfa=dfa, 
+				null_symbol=null_symbol)
+
+		if algorithm != "nfa":
+			raise ValueError("Unknown union algorithm: " + str(algorithm))
+
+		if self.accepting_sink is not None or \
+			automaton.accepting_sink is not None or \
+			self.symbol_classes != automaton.symbol_classes:
+			first, second = self.__materializesink__().__commonalphabet__(\
+				automaton.__materializesink__())
+			return first.union(second, 
+				initial_state_id=initial_state_id, 
+				final_state_id=final_state_id, 
+				null_symbol=null_symbol)
 
 		unified_transit_mat, unified_alphabet, \
 			second_initial_state, second_final_states = \
@@ -645,42 +1901,191 @@ class Automaton:
 		unified_transit_mat[final_state_id] = {symbol : set() \
 			for symbol in unified_alphabet} 
 
-		return Automaton(
+		union = Automaton.__wrap__(
 			alphabet=unified_alphabet,
 			initial_state=initial_state_id,
 			final_states={final_state_id},
-			transit_matrix=unified_transit_mat)
+			transit_matrix=unified_transit_mat,
+			frozen=self.frozen)
+		union.symbol_classes = self.symbol_classes
 
-	def intersection(self, 
+		return union
+
+	def __dfatarget__(self, state, symbol):
+		# Target of a DFA transition, or None if undefined. DFAs
+		# read from files keep their transitions as singleton sets.
+		if state is None:
+			return None
+
+		if state == self.accepting_sink:
+			# The implicit accepting sink loops by every symbol
+			return state if symbol in self.alphabet else None
+
+		target = self.transit_matrix[state].get(symbol)
+		if isinstance(target, set):
+			target = next(iter(target)) if target else None
+
+		if not target and self.accepting_sink is not None and \
+			symbol in self.alphabet:
+			return self.accepting_sink
+
+		return target or None
+
+	@AutomatonStats.instrument("product")
+	def product(self, 
 		automaton, 
-		sink_id="SINK", 
+		operation="intersection", 
+		dfa=False, 
 		null_symbol="e", 
-		initial_state_id="US", 
-		final_state_id="UF"):
+		state_prefix="P"):
 
 		"""
-			A intersection of automatons uses the
-			DeMorgan's Law:
+			Product construction of two automatons. Both are run
+			simultaneously: each state of the resultant DFA is a
+			pair (p, q), where p is a state of this automaton and
+			q a state of the given one (either of them may be
+			"None", meaning the corresponding automaton already
+			rejected the input). Only pairs reachable from the
+			pair of initial states are ever built.
+
+			operation	: decides which pairs are final states:
+					"intersection"	: p and q final
+					"union"		: p or q final
+					"difference"	: p final, q not final
+					"symdifference" : exactly one of p and q final
+
+			dfa		: tells that both automatons are already DFAs.
+					Otherwise, each one is determinized exactly once.
+
+			The resultant states are named after "state_prefix" plus
+			the order in which each pair was reached, as nfa_to_dfa()
+			does. The alphabet is the union of both alphabets.
+		"""
+		accept_funcs = {
+			"intersection" : lambda a, b: a and b,
+			"union" : lambda a, b: a or b,
+			"difference" : lambda a, b: a and not b,
+			"symdifference" : lambda a, b: a != b,
+		}
 
-			intersection(A, B) := !(union(!A, !B))
+		# Pairs which can't be accepted anymore, whatever comes next
+		dead_funcs = {
+			"intersection" : lambda p, q: p is None or q is None,
+			"union" : lambda p, q: p is None and q is None,
+			"difference" : lambda p, q: p is None,
+			"symdifference" : lambda p, q: p is None and q is None,
+		}
 
-			Which means that
-			
-			intersection(Automaton_A, Automaton_B) :=
-				complement(
-					union(
-						complement(Automaton_A), 
-						complement(Automaton_B)
-					)
-				)
+		if operation not in accept_funcs:
+			raise ValueError("Unknown product operation: " + str(operation))
 
-			So be it.
-		"""
-		c_aut_a = self.complement(
-			dfa=False, 
-			sink_id=sink_id)
+		accept = accept_funcs[operation]
+		dead = dead_funcs[operation]
 
-		c_aut_b = automaton.complement(
+		dfa_a, dfa_b = self.__commonalphabet__(automaton)
+
+		if not dfa and not dfa_a.is_deterministic(null_symbol):
+			dfa_a = dfa_a.nfae_to_nfa(null_symbol=null_symbol).nfa_to_dfa()
+
+		if not dfa and not dfa_b.is_deterministic(null_symbol):
+			dfa_b = dfa_b.nfae_to_nfa(null_symbol=null_symbol).nfa_to_dfa()
+
+		alphabet = [symbol for symbol in dfa_a.alphabet if symbol != null_symbol]
+		for symbol in dfa_b.alphabet:
+			if symbol not in alphabet and symbol != null_symbol:
+				alphabet.append(symbol)
+
+		product_var = Automaton(alphabet=alphabet, frozen=self.frozen)
+		product_var.properties["deterministic"] = True
+		product_var.symbol_classes = dfa_a.symbol_classes
+
+		initial_pair = (dfa_a.initial_state, dfa_b.initial_state)
+		initial_state_name = state_prefix + "0"
+		product_var.initial_state = initial_state_name
+
+		mapping = {initial_pair : initial_state_name}
+		list_to_proc = deque([initial_pair])
+
+		while list_to_proc:
+			pair = list_to_proc.popleft()
+			cur_state = mapping[pair]
+			state_a, state_b = pair
+
+			if accept(dfa_a.__accepts__(state_a), dfa_b.__accepts__(state_b)):
+				product_var.final_states.add(cur_state)
+
+			row = product_var.transit_matrix[cur_state] = {}
+			for symbol in alphabet:
+				next_pair = (dfa_a.__dfatarget__(state_a, symbol), 
+					dfa_b.__dfatarget__(state_b, symbol))
+
+				if dead(*next_pair):
+					continue
+
+				transit_name = mapping.get(next_pair)
+				if transit_name is None:
+					transit_name = state_prefix + str(len(mapping))
+					mapping[next_pair] = transit_name
+					list_to_proc.append(next_pair)
+
+				row[symbol] = transit_name
+
+		AutomatonStats.count(
+			states_created=len(mapping),
+			subsets_explored=len(mapping),
+			transitions=2 * len(mapping) * len(alphabet))
+
+		return product_var
+
+	@AutomatonStats.instrument("intersection")
+	def intersection(self, 
+		automaton, 
+		sink_id="SINK", 
+		null_symbol="e", 
+		initial_state_id="US", 
+		final_state_id="UF",
+		algorithm="product",
+		dfa=False):
+
+		"""
+			By default (algorithm="product"), the intersection is
+			built directly by the product construction (see product()),
+			which determinizes each automaton only once ("dfa" tells
+			if both are DFAs already) and builds only the reachable
+			pairs of states.
+
+			With algorithm="demorgan", the intersection of automatons
+			uses the DeMorgan's Law:
+
+			intersection(A, B) := !(union(!A, !B))
+
+			Which means that
+			
+			intersection(Automaton_A, Automaton_B) :=
+				complement(
+					union(
+						complement(Automaton_A), 
+						complement(Automaton_B)
+					)
+				)
+
+			So be it.
+		"""
+		if algorithm == "product":
+			return self.product(automaton, 
+				operation="intersection", 
+				dfa=dfa, 
+				null_symbol=null_symbol)
+
+		if algorithm != "demorgan":
+			raise ValueError("Unknown intersection algorithm: " + \
+				str(algorithm))
+
+		c_aut_a = self.complement(
+			dfa=False, 
+			sink_id=sink_id)
+
+		c_aut_b = automaton.complement(
 			dfa=False, 
 			sink_id=sink_id)
 
@@ -693,21 +2098,273 @@ class Automaton:
 			dfa=False, 
 			sink_id=sink_id)
 
-	def minimize(self, dfa=False, sink_id="SINK"):
+	def difference(self, automaton, dfa=False, null_symbol="e"):
+		"""
+			Automaton accepting the strings accepted by this automa-
+			ton but not by the given one. See product().
+		"""
+		return self.product(automaton, 
+			operation="difference", 
+			dfa=dfa, 
+			null_symbol=null_symbol)
+
+	def symmetric_difference(self, automaton, dfa=False, null_symbol="e"):
+		"""
+			Automaton accepting the strings accepted by exactly one
+			of both automatons. See product().
+		"""
+		return self.product(automaton, 
+			operation="symdifference", 
+			dfa=dfa, 
+			null_symbol=null_symbol)
+
+	@AutomatonStats.instrument("equivalent")
+	def equivalent(self, automaton, dfa=False, null_symbol="e"):
+		"""
+			Check if both automatons accept the same language, with-
+			out building any new automaton. Returns a pair (result,
+			counterexample), where counterexample is None if both are
+			equivalent, or else a shortest list of symbols accepted by
+			exactly one of them.
+
+			dfa		: tells that both automatons are DFAs. Then the
+					check is Hopcroft and Karp's algorithm: pairs of
+					states reachable together are merged in a union-
+					find, and a pair is only explored if its states
+					weren't already merged (so at most n + m - 1
+					pairs are explored). It's also used if both are
+					known to be DFAs (see is_deterministic()). Other-
+					wise, both inclusions are checked (see includes()).
+		"""
+		if self.symbol_classes != automaton.symbol_classes:
+			first, second = self.__commonalphabet__(automaton)
+			return first.equivalent(second, dfa=dfa, null_symbol=null_symbol)
+
+		if not dfa and not (self.is_deterministic(null_symbol) and \
+			automaton.is_deterministic(null_symbol)):
+			result, counterexample = self.includes(automaton, 
+				null_symbol=null_symbol)
+			reverse_result, reverse_counterexample = automaton.includes(self,
+				null_symbol=null_symbol)
+
+			if result and reverse_result:
+				return True, None
+
+			if result or (not reverse_result and \
+				len(reverse_counterexample) < len(counterexample)):
+				return False, reverse_counterexample
+
+			return False, counterexample
+
+		alphabet = self.__jointalphabet__(automaton, null_symbol)
+
+		# Union-find over the states of both automatons, tagged with
+		# 0 (this automaton) or 1 (the given one). "None" is the
+		# dead state of each automaton.
+		class_of = {}
+
+		def find(state):
+			root = state
+			while class_of.get(root, root) != root:
+				root = class_of[root]
+			while state != root:
+				class_of[state], state = root, class_of[state]
+			return root
+
+		initial_pair = (self.initial_state, automaton.initial_state)
+		class_of[(1, automaton.initial_state)] = (0, self.initial_state)
+
+		# Pair from which each explored pair was first reached, and
+		# by which symbol. Pairs are explored in BFS order, so the
+		# first pair found with a single final state gives a shortest
+		# counterexample.
+		origin = {initial_pair : None}
+		list_to_proc = deque([initial_pair])
+
+		while list_to_proc:
+			pair = list_to_proc.popleft()
+			state_a, state_b = pair
+
+			if self.__accepts__(state_a) != automaton.__accepts__(state_b):
+				AutomatonStats.count(subsets_explored=len(origin))
+				return False, Automaton.__tracepath__(origin, pair)
+
+			for symbol in alphabet:
+				next_pair = (self.__dfatarget__(state_a, symbol),
+					automaton.__dfatarget__(state_b, symbol))
+
+				root_a = find((0, next_pair[0]))
+				root_b = find((1, next_pair[1]))
+				if root_a != root_b:
+					class_of[root_b] = root_a
+					origin[next_pair] = (pair, symbol)
+					list_to_proc.append(next_pair)
+
+		AutomatonStats.count(subsets_explored=len(origin))
+
+		return True, None
+
+	@AutomatonStats.instrument("includes")
+	def includes(self, automaton, null_symbol="e"):
+		"""
+			Check if the language of this automaton includes the lan-
+			guage of the given one. Returns a pair (result, counter-
+			example), where counterexample is None if it does, or else
+			a shortest list of symbols accepted by the given automaton
+			but not by this one.
+
+			Both automatons may be NFAes, and neither is determinized.
+			The check explores, on the fly and in BFS order, pairs (q,
+			S), where q is a state of the given automaton and S the
+			set of states this automaton may be in after reading the
+			same string. A pair (q, S) with q final and no final state
+			in S is a counterexample. As a pair (q, S) can't lead to a
+			counterexample that a pair (q, S'), with S' a subset of S,
+			doesn't lead to as well, only the pairs with minimal sets
+			(an antichain per state q) are kept and explored.
+		"""
+		if self.symbol_classes != automaton.symbol_classes:
+			first, second = self.__commonalphabet__(automaton)
+			return first.includes(second, null_symbol=null_symbol)
+
+		matcher_a = self.compile(null_symbol=null_symbol)
+		matcher_b = automaton.compile(null_symbol=null_symbol)
+
+		alphabet = self.__jointalphabet__(automaton, null_symbol)
+
+		def initial_set(matcher):
+			if matcher.deterministic:
+				return frozenset() if matcher.initial_state < 0 \
+					else frozenset({matcher.initial_state})
+			return matcher.initial_state
+
+		def successors(matcher, state, symbol):
+			target = matcher.transitions[state].get(symbol)
+			if target is None:
+				return frozenset()
+			return frozenset({target}) if matcher.deterministic else target
+
+		antichains = {}
+
+		def subsumed(state_b, state_set_a):
+			# Add (state_b, state_set_a) to the antichain of state_b,
+			# unless some set already there is a subset of it
+			antichain = antichains.setdefault(state_b, [])
+			for kept_set in antichain:
+				if kept_set <= state_set_a:
+					return True
+
+			antichain[:] = [kept_set for kept_set in antichain \
+				if not state_set_a <= kept_set]
+			antichain.append(state_set_a)
+			return False
+
+		initial_a = initial_set(matcher_a)
+
+		origin = {}
+		list_to_proc = deque()
+		for state_b in initial_set(matcher_b):
+			pair = (state_b, initial_a)
+			if not subsumed(*pair):
+				origin[pair] = None
+				list_to_proc.append(pair)
+
+		while list_to_proc:
+			pair = list_to_proc.popleft()
+			state_b, state_set_a = pair
+
+			if state_b in matcher_b.final_states and \
+				matcher_a.final_states.isdisjoint(state_set_a):
+				AutomatonStats.count(subsets_explored=len(origin))
+				return False, Automaton.__tracepath__(origin, pair)
+
+			for symbol in alphabet:
+				next_set_a = frozenset().union(*(successors(matcher_a, \
+					state, symbol) for state in state_set_a))
+
+				for next_b in successors(matcher_b, state_b, symbol):
+					next_pair = (next_b, next_set_a)
+					if next_pair not in origin and not subsumed(*next_pair):
+						origin[next_pair] = (pair, symbol)
+						list_to_proc.append(next_pair)
+
+		AutomatonStats.count(subsets_explored=len(origin))
+
+		return True, None
+
+	def __jointalphabet__(self, automaton, null_symbol="e"):
+		alphabet = [symbol for symbol in self.alphabet if symbol != null_symbol]
+		for symbol in automaton.alphabet:
+			if symbol not in alphabet and symbol != null_symbol:
+				alphabet.append(symbol)
+		return alphabet
+
+	@staticmethod
+	def __printcheck__(check, result, counterexample):
+		print("equivalent:" if check == "equiv" else "includes:", 
+			"yes" if result else "no")
+
+		if not result:
+			print("counterexample:", "".join(counterexample) \
+				if counterexample else "(empty string)")
+
+	@staticmethod
+	def __tracepath__(origin, node):
+		# Symbols read from the start node up to the given node,
+		# following the "origin" links back
+		path = []
+		while origin[node] is not None:
+			node, symbol = origin[node]
+			path.append(symbol)
+		path.reverse()
+		return path
+
+	@AutomatonStats.instrument("minimize")
+	def minimize(self, dfa=False, sink_id="SINK", algorithm="hopcroft", 
+		null_symbol="e"):
+		"""
+			Minimize the automaton. Equivalent states are merged into
+			a single state, labeled after the concatenation of all its
+			original labels, and states that can't lead to a final
+			state are removed at the end (including the sink state,
+			if any).
+
+			algorithm	: "hopcroft" (default) uses Hopcroft's partition
+					refinement, O(n * |alphabet| * log(n)). "table" uses
+					the original equivalence table filling, O(n^2) in
+					memory, and is kept for cross-checking.
+
+			null_symbol	: symbol of the null transitions, which are
+					removed if the automaton is not a DFA yet.
+		"""
+		if algorithm not in {"hopcroft", "table"}:
+			raise ValueError("Unknown minimization algorithm: " + \
+				str(algorithm))
+
+		# Nothing to do if already minimized
+		if self.is_minimal(null_symbol):
+			return self.copy()
+
 		# Step 0: in order to minimize a automaton,
 		# we need to verify three characteristics:
 		# 0.1: Automaton must be a DFA
-		if not dfa:
-			minimal = self.nfae_to_nfa()
-			minimal = minimal.nfa_to_dfa()
-		else:
-			minimal = self.copy()
+		minimal = self.__asdfa__(dfa=dfa, null_symbol=null_symbol)
+
+		# The implicit accepting sink state can't be left out as
+		# the dead state is, so minimize the complement (where it
+		# is the dead state) instead, and complement it back: the
+		# complement of a minimal DFA is minimal as well
+		if minimal.accepting_sink is not None:
+			return minimal.__minimizecomplement__(algorithm=algorithm, 
+				null_symbol=null_symbol)
 		
-		# 0.2: Transition matrix must be full. So, try
-		# to generate a sink state to keep the transi-
-		# tion matrix full. This state, if created, will 
-		# be removed in the last minimization step.
-		minimal.__insertsinkstate__(sink_id)
+		# 0.2: Transition matrix must be full for the table
+		# filling. So, try to generate a sink state to keep
+		# the transition matrix full. This state, if created,
+		# will be removed in the last minimization step. Hop-
+		# croft's algorithm keeps the undefined transitions.
+		if algorithm == "table":
+			minimal.__insertsinkstate__(sink_id)
 
 		# 0.3: Last subitem is to perform a blind search
 		# and remove all unreachable (for all symbols) sta-
@@ -717,10 +2374,246 @@ class Automaton:
 			visited_nodes
 
 		for node in nodes_to_remove:
-			minimal.transit_matrix.remove(node)
+			minimal.transit_matrix.pop(node)
+
+		minimal.final_states.intersection_update(visited_nodes)
+
+		# Hopcroft's algorithm needs every state to lead to a
+		# final state, so they can't be equivalent to the dead
+		# state (see __hopcroft__)
+		if algorithm == "hopcroft":
+			minimal.__trim__()
 
-		# Step 1: Fill the equivalence matrix
+		# Step 1: Find out all equivalent states, mapping each
+		# one of them to its new aglomerated label
 		key_order = list(minimal.transit_matrix.keys())
+
+		if algorithm == "hopcroft":
+			rename_struct = minimal.__hopcroft__(key_order)
+		else:
+			rename_struct = minimal.__tablefilling__(key_order)
+
+		# Step 2: Unify equivalent states. States may be 
+		# renamed freely if desired.
+		for vertex in rename_struct:
+			new_state_label = rename_struct[vertex]
+			if new_state_label not in minimal.transit_matrix:
+				minimal.transit_matrix[new_state_label] = \
+					dict(minimal.transit_matrix[vertex])
+
+		# Remove equivalent states from transit_matrix
+		for vertex in rename_struct:
+			minimal.transit_matrix.pop(vertex)
+
+		# Rename all removed states to the new aglomerated label
+		for vertex in minimal.transit_matrix:
+			for symbol, cur_transit_vertex in \
+				list(minimal.transit_matrix[vertex].items()):
+				if cur_transit_vertex and cur_transit_vertex in rename_struct:
+					minimal.__writablerow__(vertex)[symbol] = rename_struct[cur_transit_vertex]
+
+		# Don't forget to check the final state list and the initial state
+		if minimal.initial_state in rename_struct:
+			minimal.initial_state = rename_struct[minimal.initial_state]
+
+		for final_state in copy.copy(minimal.final_states):
+			if final_state in rename_struct:
+				minimal.final_states.remove(final_state)
+				minimal.final_states.update({rename_struct[final_state]})
+
+		# Step 3: Delete states that can't lead to a final
+		# state (already done for Hopcroft's algorithm)
+		if algorithm == "table":
+			minimal.__trim__()
+
+		# If no state leads to a final state, the initial one is
+		# removed as well. The empty language is accepted by the
+		# initial state alone, without any transition.
+		if minimal.initial_state not in minimal.transit_matrix:
+			minimal.transit_matrix[minimal.initial_state] = {}
+
+		AutomatonStats.count(states_created=len(minimal.transit_matrix))
+
+		minimal.invalidate()
+		minimal.properties.update(deterministic=True, trim=True, minimal=True)
+
+		# End of minimization, return minimal automaton
+		return minimal
+
+	def __minimizecomplement__(self, algorithm="hopcroft", null_symbol="e"):
+		# Minimize a DFA with an implicit accepting sink state
+		# through its complement (see minimize())
+		sink_id = self.accepting_sink
+		minimal = self.complement(dfa=True).minimize(dfa=True, 
+			algorithm=algorithm, 
+			null_symbol=null_symbol)
+
+		if not minimal.final_states:
+			# The complement accepts nothing, so every string is
+			# accepted, by a single state
+			minimal.transit_matrix = {sink_id : {symbol : sink_id \
+				for symbol in minimal.alphabet}}
+			minimal.initial_state = sink_id
+			minimal.final_states = {sink_id}
+		else:
+			minimal = minimal.complement(dfa=True, sink_id=sink_id)
+
+			# Undefined transitions can't lead to both the dead state
+			# and the accepting sink. So, if there is a dead state
+			# (i.e., a state that can't lead to a final state), it is
+			# the one left implicit
+			if not minimal.is_trim():
+				minimal = minimal.__materializesink__()
+				minimal.__trim__()
+				minimal.invalidate()
+
+				# Keep the initial state if nothing is accepted (see
+				# minimize())
+				if minimal.initial_state not in minimal.transit_matrix:
+					minimal.transit_matrix[minimal.initial_state] = {}
+
+		minimal.properties.update(deterministic=True, minimal=True)
+
+		return minimal
+
+	def __trim__(self):
+		# Delete the states of a DFA that can't lead to a final
+		# state, leaving the transitions to them undefined. A
+		# single blind search, starting from all final states
+		# and following the transitions backwards, finds out
+		# every useful state.
+		with AutomatonStats.phase("trim"):
+			predecessors = {state : [] for state in self.transit_matrix}
+			for vertex in self.transit_matrix:
+				for target in self.transit_matrix[vertex].values():
+					if target:
+						predecessors[target].append(vertex)
+
+			useful_states = set(self.final_states)
+			stack = list(useful_states)
+			while stack:
+				for vertex in predecessors[stack.pop()]:
+					if vertex not in useful_states:
+						useful_states.add(vertex)
+						stack.append(vertex)
+
+			non_useful_states = set(self.transit_matrix.keys()) - useful_states
+
+			# Remove all transitions associated with the useless states
+			for vertex in self.transit_matrix:
+				for symbol, target in list(self.transit_matrix[vertex].items()):
+					if target and target in non_useful_states:
+						del self.__writablerow__(vertex)[symbol]
+
+			# Pop useless states from minimal automaton transition matrix
+			for state in non_useful_states:
+				self.transit_matrix.pop(state)
+
+			AutomatonStats.count(
+				transitions=2 * len(predecessors) * len(self.alphabet))
+
+	@AutomatonStats.instrument("hopcroft")
+	def __hopcroft__(self, key_order):
+		"""
+			Hopcroft's partition refinement. Starts with the partition
+			{final states, non-final states} and keeps splitting blocks
+			using a worklist of (splitter block, symbol) pairs. When a
+			block is split, only the smaller half is enqueued, which
+			gives the O(n * |alphabet| * log(n)) bound.
+
+			Undefined transitions are left as they are, i.e. they go
+			to the implicit dead state, which is never used as a split-
+			ter: its block is the single block of the initial partition
+			left out of the worklist. This only holds if every state
+			can lead to a final state (see __trim__()), so no state is
+			equivalent to the dead state. Returns a dictionary mapping
+			every state of a non-trivial equivalence class to the label
+			of its class.
+		"""
+		state_index = {state : i for i, state in enumerate(key_order)}
+		num_states = len(key_order)
+		alphabet_len = len(self.alphabet)
+
+		# Inverse transition function, per symbol (only for the
+		# states with some predecessor by that symbol)
+		inverse = [{} for _ in range(alphabet_len)]
+
+		for i, state in enumerate(key_order):
+			row = self.transit_matrix[state]
+			for c, symbol in enumerate(self.alphabet):
+				target = row.get(symbol)
+				if target:
+					inverse[c].setdefault(state_index[target], []).append(i)
+
+		# Initial partition
+		block_of = [0] * num_states
+		blocks = []
+		finals = {i for i in range(num_states) \
+			if key_order[i] in self.final_states}
+		non_finals = set(range(num_states)) - finals
+
+		for members in (finals, non_finals):
+			if members:
+				for i in members:
+					block_of[i] = len(blocks)
+				blocks.append(members)
+
+		worklist = deque()
+		for block in range(len(blocks)):
+			for c in range(alphabet_len):
+				worklist.append((block, c))
+
+		while worklist:
+			splitter_block, c = worklist.popleft()
+
+			# Group all predecessors of the splitter block by
+			# their current block
+			touched = {}
+			for target in blocks[splitter_block]:
+				for source in inverse[c].get(target, ()):
+					touched.setdefault(block_of[source], set()).add(source)
+
+			for block, split_part in touched.items():
+				if len(split_part) == len(blocks[block]):
+					continue
+
+				# Split the block, keeping the bigger half with the
+				# current block id and the smaller one with a new id
+				remainder = blocks[block] - split_part
+				if len(split_part) <= len(remainder):
+					blocks[block], small_half = remainder, split_part
+				else:
+					blocks[block], small_half = split_part, remainder
+
+				new_block = len(blocks)
+				blocks.append(small_half)
+				for i in small_half:
+					block_of[i] = new_block
+
+				# If (block, symbol) is still waiting in the worklist,
+				# both halves must be processed, and the bigger one is
+				# already there under the old id. Otherwise, processing
+				# only the smaller half is enough. Either way, only the
+				# new block must be enqueued.
+				for d in range(alphabet_len):
+					worklist.append((new_block, d))
+
+		AutomatonStats.count(
+			states_created=len(blocks),
+			transitions=num_states * alphabet_len)
+
+		rename_struct = {}
+		for members in sorted(blocks, key=min):
+			if len(members) > 1:
+				members = sorted(members)
+				new_state_label = "".join(key_order[i] for i in members)
+				for i in members:
+					rename_struct[key_order[i]] = new_state_label
+
+		return rename_struct
+
+	@AutomatonStats.instrument("table_filling")
+	def __tablefilling__(self, key_order):
 		transit_mat_len = len(key_order)
 
 		# 1.1: First, fill all trivially equivalent states
@@ -733,7 +2626,7 @@ class Automaton:
 		for row in range(transit_mat_len - 1):
 			for col in range(row + 1, transit_mat_len):
 				equivalence_mat[col][row] = equivalence_mat[row][col]
-				if minimal.__testequivalence__(key_order[row], key_order[col]):
+				if self.__testequivalence__(key_order[row], key_order[col]):
 					equivalence_mat[row][col][0] = []
 
 		# 1.2: Then, run a algorithm to find out non-trivial
@@ -741,12 +2634,12 @@ class Automaton:
 		for row in range(transit_mat_len - 1):
 			for col in range(row + 1, transit_mat_len):
 				if equivalence_mat[row][col][0] is not None:
-					for symbol in minimal.alphabet:
+					for symbol in self.alphabet:
 						target_row = key_order.index(\
-							minimal.transit_matrix[key_order[row]][symbol])
+							self.transit_matrix[key_order[row]][symbol])
 
 						target_col = key_order.index(\
-							minimal.transit_matrix[key_order[col]][symbol])
+							self.transit_matrix[key_order[col]][symbol])
 
 						if target_row != target_col:
 							if equivalence_mat[target_row][target_col][0] is None:
@@ -768,75 +2661,45 @@ class Automaton:
 							else:
 								equivalence_mat[target_row][target_col][0].append({row, col})
 
-		# Step 2: Unify equivalent states. States may be 
-		# renamed freely if desired.
+		# 1.3: Group the equivalent pairs into equivalence classes
+		# (with union-find), so every class with three or more
+		# states gets a single label as well
+		parent = list(range(transit_mat_len))
+
+		def find(i):
+			while parent[i] != i:
+				parent[i] = parent[parent[i]]
+				i = parent[i]
+			return i
 
-		rename_struct = {}
 		for row in range(transit_mat_len - 1):
 			for col in range(row + 1, transit_mat_len):
 				if equivalence_mat[row][col][0] is not None:
-					# States are equivalent, aglomerate then into a single one
-					new_state_label = key_order[row] + key_order[col]
-					rename_struct[key_order[row]] = new_state_label
-					rename_struct[key_order[col]] = new_state_label
-
-					minimal.transit_matrix[new_state_label] = {}
-					for symbol in minimal.alphabet:
-						minimal.transit_matrix[new_state_label][symbol] = \
-							minimal.transit_matrix[key_order[row]][symbol]
-
-		# Remove equivalent states from transit_matrix
-		for vertex in rename_struct:
-			minimal.transit_matrix.pop(vertex)
+					root_row, root_col = find(row), find(col)
+					if root_row != root_col:
+						parent[max(root_row, root_col)] = min(root_row, root_col)
 
-		# Rename all removed states to the new aglomerated label
-		for vertex in minimal.transit_matrix:
-			for symbol in minimal.alphabet:
-				cur_transit_vertex = minimal.transit_matrix[vertex][symbol]
-				if cur_transit_vertex and cur_transit_vertex in rename_struct:
-					minimal.transit_matrix[vertex][symbol] = rename_struct[cur_transit_vertex]
-
-		# Don't forget to check the final state list and the initial state
-		if minimal.initial_state in rename_struct:
-			minimal.initial_state = rename_struct[minimal.initial_state]
-
-		for final_state in copy.copy(minimal.final_states):
-			if final_state in rename_struct:
-				minimal.final_states.remove(final_state)
-				minimal.final_states.update({rename_struct[final_state]})
+		classes = {}
+		for i in range(transit_mat_len):
+			classes.setdefault(find(i), []).append(i)
 
-		# Step 3: Delete states that can't lead to a final
-		# state. In this case, more blind search is needed.
-		# If no final state is reached, delete state and its
-		# transitions.
-		non_useful_states = []
-		for state in minimal.transit_matrix:
-			visited_nodes = minimal.__blindsearch__(state)
-			if not visited_nodes.intersection(minimal.final_states):
-				non_useful_states.append(state)
-
-		for state in non_useful_states:
-			# Remove all transitions associated with that useless state
-			for vertex in minimal.transit_matrix:
-				for symbol in minimal.alphabet:
-					if minimal.transit_matrix[vertex][symbol] == state:
-						minimal.transit_matrix[vertex][symbol] = set()
-
-			# Pop state from minimal automaton transition matrix
-			minimal.transit_matrix.pop(state)
+		# States are equivalent, aglomerate then into a single one,
+		# labeled as in __hopcroft__()
+		rename_struct = {}
+		for members in classes.values():
+			if len(members) > 1:
+				new_state_label = "".join(key_order[i] for i in members)
+				for i in members:
+					rename_struct[key_order[i]] = new_state_label
 
-		# End of minimization, return minimal automaton
-		return minimal
+		return rename_struct
 
 	def grammar(self, dfa=False, initial_symbol="S", 
 		null_symbol="e", gen_output=False):
 
 		# First, the automaton must be an DFA
-		if not dfa:
-			dfa_automaton = self.nfae_to_nfa()
-			dfa_automaton = dfa_automaton.nfa_to_dfa()
-		else:
-			dfa_automaton = self.copy()
+		dfa_automaton = self.__asdfa__(dfa=dfa).__materializesink__()\
+			.expand_alphabet()
 
 		urlg_list = OrderedDict()
 		urlg_list[initial_symbol] = ["(" + dfa_automaton.initial_state + ")"]
@@ -845,7 +2708,7 @@ class Automaton:
 			urlg_list[state] = []
 
 			for symbol in dfa_automaton.alphabet:
-				if dfa_automaton.transit_matrix[state][symbol]:
+				if dfa_automaton.transit_matrix[state].get(symbol):
 					urlg_list[state].append(symbol + \
 						"(" + dfa_automaton.transit_matrix[state][symbol] + ")")
 
@@ -892,6 +2755,8 @@ class Automaton:
 			riables and "e" is the null transition symbol (a.k.a. 
 			lambda).
 		"""
+		self.invalidate()
+		self.symbol_classes = None
 
 		with open(filepath) as f:
 			self.alphabet = f.readline().strip().split(sep)
@@ -972,289 +2837,2801 @@ class Automaton:
 				r+ := rr*
 		"""
 
-		ksaut = self.copy()
+		ksaut = self.__materializesink__().copy().invalidate()
 
 		# Check if epsilon (null transition symbol) is not 
 		# in the alphabet already
 		if null_symbol not in ksaut.alphabet:
 			ksaut.alphabet += [null_symbol]
 			for state in ksaut.transit_matrix:
-				ksaut.transit_matrix[state][null_symbol] = set()
+				ksaut.__writablerow__(state)[null_symbol] = set()
 
 		initial_state_id = ksaut.__stateidsintegrity__(\
 			ksaut.transit_matrix.keys(), initial_state_id)
 		final_state_id = ksaut.__stateidsintegrity__(\
 			ksaut.transit_matrix.keys(), final_state_id)
 
-		# Add dummy states
-		ksaut.transit_matrix[initial_state_id] = {}
-		ksaut.transit_matrix[final_state_id] = {}
-		for symbol in ksaut.alphabet:
-			ksaut.transit_matrix[final_state_id][symbol] = set()
-			ksaut.transit_matrix[initial_state_id][symbol] = set()
+		# Add dummy states
+		ksaut.transit_matrix[initial_state_id] = {}
+		ksaut.transit_matrix[final_state_id] = {}
+		for symbol in ksaut.alphabet:
+			ksaut.transit_matrix[final_state_id][symbol] = set()
+			ksaut.transit_matrix[initial_state_id][symbol] = set()
+
+		# Null transition between new start state and original
+		# automaton start state. Remembering also that the ini-
+		# tial dummy state must have a null transition to the 
+		# dummy final state
+		ksaut.transit_matrix[initial_state_id][null_symbol] = \
+			{ksaut.initial_state, final_state_id}
+
+		for final_state in ksaut.final_states:
+			# Insert null transitions between automaton original fi-
+			# nal states and new dummy final state and original st-
+			# art state
+			ksaut.__writablerow__(final_state).setdefault(null_symbol, set()).\
+				update({final_state_id, self.initial_state})
+
+		# Update new automatons start and end states list
+		ksaut.initial_state = initial_state_id
+		ksaut.final_states = {final_state_id}
+
+		return ksaut
+
+	def __shuntingyard__(self, tokens, operators_set):
+
+		# The regex is already split in tokens (see __regextokens__)
+		ans = []
+		operator_stack = []
+
+		for c in tokens:
+			if c not in operators_set and c != "(" and c != ")":
+				ans.append(c)
+
+			elif c in operators_set:
+				# Pop operator stack until the top operator has higher
+				# priority
+				while operator_stack and \
+					c in operators_set and \
+					operator_stack[-1] in operators_set and \
+					operators_set[operator_stack[-1]] > operators_set[c]:
+					ans.append(operator_stack.pop())
+
+				operator_stack.append(c)
+
+			elif c == "(":
+				operator_stack.append(c)
+
+			elif c == ")":
+				# Pop operator stack until founding a matching "("
+				while operator_stack[-1] != "(":
+					ans.append(operator_stack.pop())
+
+				# Discard ")"
+				operator_stack.pop(-1)
+
+		while operator_stack:
+			ans.append(operator_stack.pop())
+
+		return ans
+
+	def __sumtostar__(self, regex, kleene_star="*", kleene_sum="+"):
+		# Tranforms all r+ (Kleene Sum) to rr* (Kleene Star).
+		# Note that this same logic can be applied if "?" ope-
+		# rator is implemented (r? := (r|e), where "e" is the null
+		# string)
+
+		stack = []
+		i = 0
+		j = 0
+		reg_size = len(regex)
+		while i < reg_size:
+			if regex[i] == kleene_sum:
+				j = i-1
+
+				if regex[j] == ")":
+					stack.append(regex[j])
+					while stack:
+						j -= 1
+						if regex[j] == ")":
+							stack.append(")")
+						elif regex[j] == "(":
+							stack.pop()
+
+				regex = regex[:j] + ["("] + 2 * regex[j:i] + \
+					[kleene_star, ")"] + regex[i+1:]
+				reg_size = len(regex)
+			i += 1
+
+		return regex
+
+	def __fillconcatop__(self, regex, concat_symbol, operators_list):
+		# Fill regex with an artificialy made concatenation
+		# symbol
+
+		if regex is None or not regex:
+			return
+
+		# Skip possible initial parenthesis
+		i = 0
+		while regex[i] == "(":
+			i += 1
+
+		# Process input string
+		while i < len(regex) - 1:
+			cur_sym = regex[i]
+			next_sym = regex[i+1]
+			if ((cur_sym not in operators_list and next_sym not in operators_list)) or \
+				(next_sym == "(" and cur_sym not in {"(", "|"}) or \
+				(cur_sym == ")" and next_sym not in operators_list) or \
+				(next_sym not in operators_list and cur_sym == "*"):
+
+				regex = regex[:i+1] + [concat_symbol] + regex[i+1:]
+				i += 1
+			i += 1
+
+		return regex
+
+	def __regextokens__(self, regex, null_symbol="e"):
+		"""
+			Split a regex in tokens: single characters (operators and
+			symbols) and character classes. Each class is a tuple of
+			sorted and disjoint (first, last) code point ranges:
+
+				[abc], [a-z0-9]	: any of the listed characters or
+						ranges of characters
+				[^...]		: any character not listed
+				.		: any character
+				\\c		: the character c itself, even if it is an
+						operator, "[", "]", "." or "\\"
+
+			"]" is a listed character if it comes first in a class,
+			and so is "-" if it comes first or last. Classes never
+			have the null symbol, which stands for the empty string,
+			nor surrogate code points.
+		"""
+		excluded = [(0xD800, 0xDFFF)]
+		if len(null_symbol) == 1:
+			excluded.append((ord(null_symbol), ord(null_symbol)))
+
+		def invert(ranges):
+			inverted = []
+			start = 0
+			for first, last in sorted(ranges):
+				if first > start:
+					inverted.append((start, first - 1))
+				start = max(start, last + 1)
+			if start <= sys.maxunicode:
+				inverted.append((start, sys.maxunicode))
+			return inverted
+
+		def charset(ranges, negated=False):
+			if negated:
+				ranges = invert(ranges)
+			return tuple(invert(invert(ranges) + excluded))
+
+		def unescape(i):
+			# Character at position i, and the position after it
+			if regex[i] == "\\" and i + 1 < len(regex):
+				i += 1
+			return regex[i], i + 1
+
+		tokens = []
+		i = 0
+		while i < len(regex):
+			c = regex[i]
+
+			if c == "\\" and i + 1 < len(regex):
+				tokens.append(charset([(ord(regex[i+1]), ord(regex[i+1]))]))
+				i += 2
+
+			elif c == ".":
+				tokens.append(charset([], negated=True))
+				i += 1
+
+			elif c == "[":
+				i += 1
+				negated = regex[i:i+1] == "^"
+				if negated:
+					i += 1
+
+				ranges = []
+				while i >= len(regex) or regex[i] != "]" or not ranges:
+					if i >= len(regex):
+						raise ValueError("Unterminated character class in " + \
+							"regex: " + regex)
+
+					first, i = unescape(i)
+					last = first
+					if regex[i:i+1] == "-" and regex[i+1:i+2] not in {"", "]"}:
+						last, i = unescape(i + 1)
+						if last < first:
+							raise ValueError("Invalid character range in " + \
+								"regex: " + first + "-" + last)
+
+					ranges.append((ord(first), ord(last)))
+
+				tokens.append(charset(ranges, negated))
+				i += 1
+
+			else:
+				tokens.append(c)
+				i += 1
+
+		return tokens
+
+	def __regextorpn__(self, 
+		regex, 
+		null_symbol="e", 
+		or_operator="|", 
+		kleene_star="*", 
+		kleene_sum="+",
+		remove_whitespaces=False):
+
+		"""
+			Preprocess a regex and convert it to reverse polish
+			notation. Returns the RPN token list and the symbol
+			used as the (artificially made) concatenation operator.
+			Character classes are single tokens (see __regextokens__).
+		"""
+		if remove_whitespaces:
+			regex = re.sub("\s+", "", regex)
+
+		regex = self.__regextokens__(regex, null_symbol=null_symbol)
+
+		# Preprocess kleene_sum to concatenation of
+		# regex and regex with kleene star:
+		# r+ := rr*
+		regex = self.__sumtostar__(regex, 
+			kleene_star=kleene_star, 
+			kleene_sum=kleene_sum)
+
+		# Symbol made "concatenation operator" adopted as 
+		# kleene sum symbol, because I know I already ride 
+		# Kleene Sum operations off at this point, so I'm 
+		# free to reuse this now-invalid symbol.
+		concat_operator = kleene_sum
+
+		# Construct a precedence score for all operators.
+		# Note that the "concat_operator" is artificially made
+		# for the concatenation operation.
+		shunting_yard_argdict = {
+			or_operator : 2, 
+			concat_operator : 3, 
+			kleene_star : 4
+		}
+
+		# Fill regex with a artificialy made "concatenation 
+		# operator".
+		regex = self.__fillconcatop__(regex,
+			concat_symbol=concat_operator,
+			operators_list=set(shunting_yard_argdict.\
+				keys()).union({"(", ")"}))
+
+		# Transform given regex to reverse polish notation
+		# using shunting-yard algorithm
+		rpn_regex = self.__shuntingyard__(regex, 
+			operators_set = shunting_yard_argdict)
+
+		return rpn_regex, concat_operator
+
+	def __regexclasses__(self, rpn_regex, operators):
+		# Split the characters of the regex in SymbolIntervals, whose
+		# classes no character class and no symbol of the RPN regex
+		# splits, and replace each character class by the tuple of
+		# labels of the classes it is made of. Symbols are classes of
+		# their own, labeled by themselves. "operators" are the tokens
+		# which aren't symbols (including the null symbol). Returns the
+		# new RPN regex and the SymbolIntervals, or None if there is no
+		# character class at all.
+		if not any(isinstance(token, tuple) for token in rpn_regex):
+			return rpn_regex, None
+
+		charsets = [token if isinstance(token, tuple) \
+			else [(ord(token), ord(token))] for token in rpn_regex \
+				if isinstance(token, tuple) or token not in operators]
+
+		intervals, charset_labels = SymbolIntervals.partition(charsets)
+		charset_labels = iter(charset_labels)
+
+		tokens = []
+		for token in rpn_regex:
+			if isinstance(token, tuple) or token not in operators:
+				labels = next(charset_labels)
+				if isinstance(token, tuple):
+					token = tuple(labels)
+			tokens.append(token)
+
+		return tokens, intervals
+
+	def __thompson__(self, 
+		rpn_regex, 
+		null_symbol="e", 
+		or_operator="|", 
+		kleene_star="*", 
+		concat_operator="+"):
+
+		"""
+			Thompson's construction, in a single pass over the RPN
+			regex. Every operand/operator only appends a constant
+			number of states and transitions to one shared NFAe,
+			whose states are plain integers, and the stack keeps
+			only (start state, end state) pairs of the fragments
+			built so far. The dictionary form is materialized only
+			once, at the end.
+
+			States are labeled as the atomic automatons (S, F), the
+			union (US, UF) and the Kleene Star (KS, KE) dummy states,
+			followed by their integer id.
+
+			The alphabet has the same order the operator-by-operator
+			construction gives: symbols in order of first appearance,
+			with the null symbol first appearing right after the ope-
+			rands of the first operator.
+		"""
+		labels = []
+		transitions = []
+
+		def new_state(prefix):
+			labels.append(prefix + str(len(labels)))
+			transitions.append({})
+			return len(labels) - 1
+
+		def add_transition(source, symbol, target):
+			transitions[source].setdefault(symbol, []).append(target)
+
+		# Ordered set (dict keys) of the alphabet symbols
+		alphabet = {}
+		fragments = []
+
+		for token in rpn_regex:
+			if token == kleene_star:
+				start, end = fragments.pop()
+				ks_state = new_state("KS")
+				ke_state = new_state("KE")
+				add_transition(ks_state, null_symbol, start)
+				add_transition(ks_state, null_symbol, ke_state)
+				add_transition(end, null_symbol, ke_state)
+				add_transition(end, null_symbol, start)
+				fragments.append((ks_state, ke_state))
+				alphabet[null_symbol] = None
+
+			elif token == or_operator:
+				start_b, end_b = fragments.pop()
+				start_a, end_a = fragments.pop()
+				us_state = new_state("US")
+				uf_state = new_state("UF")
+				add_transition(us_state, null_symbol, start_a)
+				add_transition(us_state, null_symbol, start_b)
+				add_transition(end_a, null_symbol, uf_state)
+				add_transition(end_b, null_symbol, uf_state)
+				fragments.append((us_state, uf_state))
+				alphabet[null_symbol] = None
+
+			elif token == concat_operator:
+				start_b, end_b = fragments.pop()
+				start_a, end_a = fragments.pop()
+				add_transition(end_a, null_symbol, start_b)
+				fragments.append((start_a, end_b))
+				alphabet[null_symbol] = None
+
+			else:
+				# Character classes are tuples of symbols (see
+				# __regexclasses__)
+				start = new_state("S")
+				end = new_state("F")
+				for symbol in (token if isinstance(token, tuple) else (token,)):
+					add_transition(start, symbol, end)
+					alphabet[symbol] = None
+				fragments.append((start, end))
+
+		start, end = fragments.pop()
+
+		self.alphabet = list(alphabet)
+		self.transit_matrix = OrderedDict()
+		for state, label in enumerate(labels):
+			row = transitions[state]
+			self.transit_matrix[label] = {symbol : \
+				{labels[target] for target in row.get(symbol, ())} \
+				for symbol in self.alphabet}
+
+		self.initial_state = labels[start]
+		self.final_states = {labels[end]}
+
+		return self
+
+	def __brzozowski__(self, 
+		rpn_regex, 
+		null_symbol="e", 
+		or_operator="|", 
+		kleene_star="*", 
+		concat_operator="+",
+		state_prefix="DFA"):
+
+		"""
+			Build a DFA directly from the RPN regex, using Brzozowski's
+			derivatives. The derivative of a regex r by a symbol c is
+			a regex for every string w such that cw is in L(r), so each
+			DFA state is a regex and its transition by c is its deriva-
+			tive by c:
+
+				d(empty) = d(e) = empty
+				d(c) = e, d(a) = empty (a != c)
+				d([...]) = e if c is in the class, else empty
+				d(rs) = d(r)s + d(s) (only if r is nullable)
+				d(r + s) = d(r) + d(s)
+				d(r*) = d(r)r*
+
+			Each regex is normalized on creation ("similarity"): unions
+			are flattened, sorted and have duplicates and "empty" remo-
+			ved, concatenations are right associative with "e" and "empty"
+			simplified, and (r*)* = r*. This guarantees a finite number
+			of distinct derivatives, and also gives DFAs close to the mi-
+			nimal one. Every regex is interned to an integer id (children
+			are referred by their ids), so each derivative is memoized
+			by (regex id, symbol) and each DFA state by its regex id.
+
+			The null symbol in the regex stands for the empty string. The
+			resultant states are named as nfa_to_dfa() does, and the "empty"
+			regex is left as undefined transitions.
+		"""
+		nodes = []
+		node_ids = {}
+		nullable = []
+
+		def intern(node):
+			node_id = node_ids.get(node)
+			if node_id is None:
+				node_id = len(nodes)
+				node_ids[node] = node_id
+				nodes.append(node)
+
+				kind = node[0]
+				if kind in {"eps", "star"}:
+					nullable.append(True)
+				elif kind in {"empty", "sym", "set"}:
+					nullable.append(False)
+				elif kind == "cat":
+					nullable.append(nullable[node[1]] and nullable[node[2]])
+				else:
+					nullable.append(any(nullable[member] for member in node[1]))
+
+			return node_id
+
+		empty = intern(("empty",))
+		eps = intern(("eps",))
+
+		def cat(node_a, node_b):
+			if node_a == empty or node_b == empty:
+				return empty
+			if node_a == eps:
+				return node_b
+			if node_b == eps:
+				return node_a
+			if nodes[node_a][0] == "cat":
+				return cat(nodes[node_a][1], cat(nodes[node_a][2], node_b))
+			return intern(("cat", node_a, node_b))
+
+		def alt(*alternatives):
+			members = set()
+			for node in alternatives:
+				if nodes[node][0] == "or":
+					members.update(nodes[node][1])
+				elif node != empty:
+					members.add(node)
+
+			if not members:
+				return empty
+			if len(members) == 1:
+				return members.pop()
+			return intern(("or", tuple(sorted(members))))
+
+		def star(node):
+			if node == empty or node == eps:
+				return eps
+			if nodes[node][0] == "star":
+				return node
+			return intern(("star", node))
+
+		# Build the normalized regex from its RPN form
+		alphabet = {}
+		stack = []
+		for token in rpn_regex:
+			if token == kleene_star:
+				stack.append(star(stack.pop()))
+			elif token == or_operator or token == concat_operator:
+				node_b = stack.pop()
+				node_a = stack.pop()
+				stack.append(alt(node_a, node_b) \
+					if token == or_operator else cat(node_a, node_b))
+			elif token == null_symbol:
+				stack.append(eps)
+			elif isinstance(token, tuple):
+				# Character class (see __regexclasses__)
+				stack.append(intern(("set", token)))
+				alphabet.update(dict.fromkeys(token))
+			else:
+				stack.append(intern(("sym", token)))
+				alphabet[token] = None
+
+		root = stack.pop()
+		alphabet = list(alphabet)
+
+		derivatives = {}
+
+		def derive(node, symbol):
+			key = (node, symbol)
+			if key not in derivatives:
+				kind = nodes[node][0]
+
+				if kind == "sym":
+					result = eps if nodes[node][1] == symbol else empty
+				elif kind == "set":
+					result = eps if symbol in nodes[node][1] else empty
+				elif kind == "cat":
+					result = cat(derive(nodes[node][1], symbol), nodes[node][2])
+					if nullable[nodes[node][1]]:
+						result = alt(result, derive(nodes[node][2], symbol))
+				elif kind == "or":
+					result = alt(*(derive(member, symbol) \
+						for member in nodes[node][1]))
+				elif kind == "star":
+					result = cat(derive(nodes[node][1], symbol), node)
+				else:
+					result = empty
+
+				derivatives[key] = result
+
+			return derivatives[key]
+
+		self.alphabet = alphabet
+		self.transit_matrix = OrderedDict()
+		self.final_states = set()
+		self.initial_state = state_prefix + "0"
+
+		mapping = {root : self.initial_state}
+		list_to_proc = deque([root])
+
+		while list_to_proc:
+			node = list_to_proc.popleft()
+			cur_state = mapping[node]
+
+			if nullable[node]:
+				self.final_states.add(cur_state)
+
+			row = self.transit_matrix[cur_state] = {}
+			for symbol in alphabet:
+				target = derive(node, symbol)
+
+				if target == empty:
+					continue
+
+				transit_name = mapping.get(target)
+				if transit_name is None:
+					transit_name = state_prefix + str(len(mapping))
+					mapping[target] = transit_name
+					list_to_proc.append(target)
+
+				row[symbol] = transit_name
+
+		self.properties["deterministic"] = True
+
+		return self
+
+	def __regexliterals__(self, 
+		rpn_regex, 
+		null_symbol="e", 
+		or_operator="|", 
+		kleene_star="*", 
+		concat_operator="+"):
+
+		"""
+			Literals required by a RPN regex, found by a single pass
+			over it, keeping for every subexpression:
+
+				exact		: the only string it matches, or None
+				prefix		: literal every match starts with
+				suffix		: literal every match ends with
+				required	: longest literal every match contains
+						(among the ones found)
+				max_length	: length of its longest match, or None
+						if unbounded
+
+			Returns a dictionary with the "prefix", "required" and
+			"max_length" of the whole regex. Literals are strings of
+			the regex symbols.
+		"""
+		def longest(*literals):
+			return max(literals, key=len)
+
+		def common_prefix(a, b):
+			i = 0
+			while i < min(len(a), len(b)) and a[i] == b[i]:
+				i += 1
+			return a[:i]
+
+		def common_suffix(a, b):
+			return common_prefix(a[::-1], b[::-1])[::-1]
+
+		def max_length(a, b, join):
+			if a is None or b is None:
+				return None
+			return join(a, b)
+
+		stack = []
+		for token in rpn_regex:
+			if token == kleene_star:
+				node = stack.pop()
+				empty = node["exact"] == ""
+				stack.append({
+					"exact" : "" if empty else None,
+					"prefix" : "",
+					"suffix" : "",
+					"required" : "",
+					"max_length" : 0 if node["max_length"] == 0 else None,
+				})
+
+			elif token == or_operator:
+				node_b = stack.pop()
+				node_a = stack.pop()
+				exact = node_a["exact"] if node_a["exact"] is not None and \
+					node_a["exact"] == node_b["exact"] else None
+				prefix = common_prefix(node_a["prefix"], node_b["prefix"])
+				suffix = common_suffix(node_a["suffix"], node_b["suffix"])
+				stack.append({
+					"exact" : exact,
+					"prefix" : prefix,
+					"suffix" : suffix,
+					"required" : exact if exact is not None \
+						else longest(prefix, suffix),
+					"max_length" : max_length(node_a["max_length"], 
+						node_b["max_length"], max),
+				})
+
+			elif token == concat_operator:
+				node_b = stack.pop()
+				node_a = stack.pop()
+				exact = node_a["exact"] + node_b["exact"] \
+					if node_a["exact"] is not None and \
+						node_b["exact"] is not None else None
+				prefix = node_a["exact"] + node_b["prefix"] \
+					if node_a["exact"] is not None else node_a["prefix"]
+				suffix = node_a["suffix"] + node_b["exact"] \
+					if node_b["exact"] is not None else node_b["suffix"]
+				stack.append({
+					"exact" : exact,
+					"prefix" : prefix,
+					"suffix" : suffix,
+					"required" : longest(node_a["required"], node_b["required"], 
+						node_a["suffix"] + node_b["prefix"], prefix, suffix),
+					"max_length" : max_length(node_a["max_length"], 
+						node_b["max_length"], lambda a, b: a + b),
+				})
+
+			elif isinstance(token, tuple):
+				# Character classes match a single, unknown, symbol
+				stack.append({
+					"exact" : None,
+					"prefix" : "",
+					"suffix" : "",
+					"required" : "",
+					"max_length" : 1,
+				})
+
+			else:
+				literal = "" if token == null_symbol else token
+				stack.append({
+					"exact" : literal,
+					"prefix" : literal,
+					"suffix" : literal,
+					"required" : literal,
+					"max_length" : len(literal),
+				})
+
+		if not stack:
+			return {"prefix" : "", "required" : "", "max_length" : 0}
+
+		node = stack.pop()
+		return {
+			"prefix" : node["prefix"],
+			"required" : node["required"],
+			"max_length" : node["max_length"],
+		}
+
+	@AutomatonStats.instrument("load_regex")
+	def load_regex(self, 
+		regex, 
+		null_symbol="e", 
+		or_operator="|", 
+		kleene_star="*", 
+		kleene_sum="+",
+		remove_whitespaces=False,
+		engine="thompson"):
+
+		"""
+			Build a automaton for the given regex. Besides symbols,
+			the null symbol (the empty string), "|", "*", "+" and pa-
+			rentheses, it may have character classes ("[a-z]", "[^0-9]",
+			"." and escaped characters, see __regextokens__). Then the
+			alphabet is made of symbol classes: the coarsest sets of
+			character ranges that no class and no symbol of the regex
+			splits, kept in "symbol_classes" (see SymbolIntervals) and
+			searched by run() and by every matcher (see compile()).
+			So a class is a single atomic automaton, with a transition
+			per symbol class it is made of.
+
+			Classes never match the null symbol, and input strings with
+			it are rejected by every engine and matcher. So, in order to
+			match the character "e" itself, pick another "null_symbol"
+			(and give it to run() and compile() as well).
+
+			engine		: "thompson" (default) builds a NFAe ("Non-deter-
+					ministic Finite Automaton with null transitions")
+					using Thompson's construction (see __thompson__).
+					"derivatives" builds a DFA directly, without any
+					intermediate NFAe, using Brzozowski's derivatives
+					(see __brzozowski__).
+		"""
+		if engine not in {"thompson", "derivatives"}:
+			raise ValueError("Unknown regex engine: " + str(engine))
+
+		self.invalidate()
+		self.symbol_classes = None
+
+		rpn_regex, concat_operator = self.__regextorpn__(regex,
+			null_symbol=null_symbol,
+			or_operator=or_operator,
+			kleene_star=kleene_star,
+			kleene_sum=kleene_sum,
+			remove_whitespaces=remove_whitespaces)
+
+		rpn_regex, self.symbol_classes = self.__regexclasses__(rpn_regex, 
+			operators={null_symbol, or_operator, kleene_star, concat_operator})
+
+		self.literals = self.__regexliterals__(rpn_regex,
+			null_symbol=null_symbol,
+			or_operator=or_operator,
+			kleene_star=kleene_star,
+			concat_operator=concat_operator)
+
+		if engine == "derivatives":
+			return self.__brzozowski__(rpn_regex,
+				null_symbol=null_symbol,
+				or_operator=or_operator,
+				kleene_star=kleene_star,
+				concat_operator=concat_operator)
+
+		return self.__thompson__(rpn_regex,
+			null_symbol=null_symbol,
+			or_operator=or_operator,
+			kleene_star=kleene_star,
+			concat_operator=concat_operator)
+
+	def run(self, string, null_symbol="e"):
+		"""
+			Check if the automaton accepts the given string. Each
+			null transition set is computed at most once per call;
+			if the same automaton is run many times, prefer compile(),
+			which precomputes all of them only once.
+		"""
+		if self.transit_matrix is None:
+			return False
+
+		null_transitions = {}
+
+		def get_null_transitions(state):
+			if state not in null_transitions:
+				null_transitions[state] = self.__getnulltransitions__(\
+					target=state, 
+					null_symbol=null_symbol)
+			return null_transitions[state]
+
+		# Initial state + expand null transitions
+		cur_state_set = set(get_null_transitions(self.initial_state))
+
+		# Whether the implicit accepting sink state (see
+		# "accepting_sink") is one of the current states
+		in_sink = False
+		sink_alphabet = set(self.alphabet) \
+			if self.accepting_sink is not None else ()
+
+		# Class label of every symbol, if the alphabet is compressed
+		# (see compress_alphabet())
+		symbol_classes = self.symbol_classes or {}
+
+		for symbol in string:
+			# The null symbol stands for the empty string, so no
+			# transition consumes it (nor character classes match
+			# it, see load_regex())
+			if symbol == null_symbol:
+				return False
+
+			symbol = symbol_classes.get(symbol, symbol)
+
+			# No remaining current states
+			if not cur_state_set and not in_sink:
+				return False
+
+			# The sink state only loops by symbols of the alphabet
+			in_sink = in_sink and symbol in sink_alphabet
+
+			# Expand cur symbol transitions
+			new_states_set = set()
+			for cur_state in cur_state_set:
+				cur_symbol_set = self.transit_matrix[cur_state].get(symbol)
+				if cur_symbol_set:
+					if type(cur_symbol_set) != type(set()):
+						cur_symbol_set = {cur_symbol_set}
+					new_states_set.update(cur_symbol_set)
+				elif symbol in sink_alphabet:
+					in_sink = True
+
+			cur_state_set = copy.copy(new_states_set)
+
+			# Expand null transitions
+			for state in new_states_set:
+				cur_state_set.update(get_null_transitions(state))
+
+		if in_sink or cur_state_set.intersection(self.final_states):
+			return True
+
+		return False
+
+	def compile(self, null_symbol="e"):
+		"""
+			Build an immutable AutomatonMatcher for this automaton,
+			with all null transition sets and transition tables pre-
+			computed, so matching a string costs a single table lookup
+			(DFAs) or set union (NFAs) per input symbol. Later changes
+			to this automaton are not seen by the matcher.
+		"""
+		return AutomatonMatcher(self.to_compact(null_symbol=null_symbol))
+
+	def run_many(self, strings, null_symbol="e", batch_size=65536):
+		"""
+			Run every string of the given iterable, returning a NumPy
+			boolean array with the result of each one (or a list of
+			booleans, if NumPy is not available). The automaton is
+			compiled only once for all strings; see AutomatonMatcher.
+			run_many() for details.
+		"""
+		return self.compile(null_symbol=null_symbol).run_many(strings,
+			batch_size=batch_size)
+
+	def stream(self, null_symbol="e"):
+		"""
+			Build a StreamMatcher for this automaton, which reads its
+			input in chunks. See StreamMatcher for details.
+		"""
+		return self.compile(null_symbol=null_symbol).stream()
+
+	def run_file(self, filepath, null_symbol="e", encoding="utf-8", 
+		chunk_size=1 << 20, use_mmap=False):
+		"""
+			Check if the automaton accepts the whole content of the
+			given file, reading it in chunks of "chunk_size" bytes
+			(memory usage doesn't depend on the file size).
+		"""
+		return self.stream(null_symbol=null_symbol).feed_file(filepath,
+			encoding=encoding,
+			chunk_size=chunk_size,
+			use_mmap=use_mmap)
+
+	def compile_lazy(self, cache_size=4096, min_symbols_per_state=10, 
+		null_symbol="e"):
+		"""
+			Build a LazyDFAMatcher for this automaton, which determi-
+			nizes it on the fly, only for the subsets actually reached
+			by the input strings, keeping at most "cache_size" DFA sta-
+			tes in memory. See LazyDFAMatcher for details.
+		"""
+		return LazyDFAMatcher(self.compile(null_symbol=null_symbol),
+			cache_size=cache_size,
+			min_symbols_per_state=min_symbols_per_state)
+
+	def search(self, text, start=0, null_symbol="e"):
+		"""
+			Find the leftmost-longest non-empty substring of "text"
+			(from position "start" on) accepted by this automaton.
+			Returns its (start, end) span, or None. See SearchMatcher,
+			which should be built only once (with compile_search())
+			if the same automaton is searched many times.
+		"""
+		return self.compile_search(null_symbol=null_symbol).search(text, 
+			start=start)
+
+	def finditer(self, text, null_symbol="e"):
+		"""
+			Iterate over the (start, end) spans of all non-overlapping
+			leftmost-longest matches of this automaton in "text". See
+			SearchMatcher.
+		"""
+		return self.compile_search(null_symbol=null_symbol).finditer(text)
+
+	def compile_search(self, cache_size=4096, min_symbols_per_state=10,
+		null_symbol="e"):
+		"""
+			Build a SearchMatcher for this automaton, to search it in-
+			side larger texts, keeping at most "cache_size" DFA states
+			in memory (see LazyDFAMatcher).
+		"""
+		return SearchMatcher(self, null_symbol=null_symbol,
+			cache_size=cache_size,
+			min_symbols_per_state=min_symbols_per_state)
+
+	def compile_bitset(self, cache_size=65536, null_symbol="e"):
+		"""
+			Build a BitsetMatcher for this automaton, which simulates
+			it keeping sets of states as int bitsets, memoizing at most
+			"cache_size" unions of transitions. See BitsetMatcher for
+			details.
+		"""
+		return BitsetMatcher(self.compile(null_symbol=null_symbol),
+			cache_size=cache_size)
+
+class SubsetExpander:
+	# Expander of the worker process, set by attach()
+	instance = None
+
+	def __init__(self, offsets, targets, num_states, alphabet_len):
+		"""
+			Computes, for a subset of NFA states (an int bitset), the
+			subset reached by each symbol. The NFA is given in the CSR
+			form built by Automaton.__nfatodfabitset__ (any sequences
+			of ints, such as arrays or memoryviews), and is converted
+			to a bitset of targets per state and symbol. The union of
+			the targets of each block of 8 states (a byte of the sub-
+			sets) is memoized for each value of that byte.
+		"""
+		self.alphabet_len = alphabet_len
+		self.num_bytes = (num_states + 7) // 8
+
+		self.symbol_targets = [[0] * num_states for _ in range(alphabet_len)]
+		for state in range(num_states):
+			for c in range(alphabet_len):
+				cell = state * alphabet_len + c
+				bits = 0
+				for target in targets[offsets[cell]:offsets[cell + 1]]:
+					bits |= 1 << target
+				self.symbol_targets[c][state] = bits
+
+		self.symbol_blocks = [[{} for _ in range(self.num_bytes)] \
+			for _ in range(alphabet_len)]
+
+	def expand(self, subset):
+		subset_bytes = [(block, value) for block, value in \
+			enumerate(subset.to_bytes(self.num_bytes, "little")) if value]
+
+		successors = []
+		for targets, blocks in zip(self.symbol_targets, self.symbol_blocks):
+			aux = 0
+			for block, value in subset_bytes:
+				block_targets = blocks[block].get(value)
+				if block_targets is None:
+					block_targets = 0
+					for i in range(8):
+						if value >> i & 1:
+							block_targets |= targets[8 * block + i]
+					blocks[block][value] = block_targets
+				aux |= block_targets
+			successors.append(aux)
+
+		return successors
+
+	@staticmethod
+	def share(offsets, targets):
+		"""
+			Copy both CSR arrays (of 8-byte ints) into a new shared
+			memory block, "offsets" first.
+		"""
+		size = max(8 * (len(offsets) + len(targets)), 8)
+		shared = shared_memory.SharedMemory(create=True, size=size)
+
+		view = shared.buf.cast("q")
+		view[:len(offsets)] = offsets
+		view[len(offsets):len(offsets) + len(targets)] = targets
+		view.release()
+
+		return shared
+
+	@staticmethod
+	def attach(name, offsets_len, targets_len, num_states, alphabet_len):
+		# Worker process initializer. The tables are only read once,
+		# to build the bitsets, so the block is closed right after.
+		shared = shared_memory.SharedMemory(name=name)
+		view = shared.buf.cast("q")
+
+		try:
+			SubsetExpander.instance = SubsetExpander(
+				view[:offsets_len],
+				view[offsets_len:offsets_len + targets_len],
+				num_states,
+				alphabet_len)
+		finally:
+			view.release()
+			shared.close()
+
+	@staticmethod
+	def expand_batch(subsets):
+		expander = SubsetExpander.instance
+		return [expander.expand(subset) for subset in subsets]
+
+class CompactAutomaton:
+	def __init__(self, automaton=None, null_symbol="e"):
+		"""
+			Compact representation of a Finite Automaton. States and
+			symbols are interned to dense integers, in the same order
+			they show up in the dictionary form (transit_matrix keys
+			and alphabet list), and the transition function is kept
+			in flat integer arrays:
+
+			DFA (every cell is either a single state or undefined):
+				table[state * m + symbol] = target state, or -1 if the
+				transition is undefined (m is the alphabet size).
+
+			NFA (at least one cell is a set of states):
+				CSR ("Compressed Sparse Row") layout. The targets of
+				cell (state, symbol) are
+
+				targets[offsets[state * m + symbol] : offsets[state * m + symbol + 1]]
+
+			final_states is a bitmap with one byte per state. States
+			referenced by some transition (or as initial state) but
+			without a row of their own in the transition matrix are
+			interned after the declared ones, so they can be told
+			apart when converting back.
+
+			automaton	: Automaton instance to be converted. If None,
+					an empty structure is created, to be filled by
+					the caller. Its implicit accepting sink state,
+					if any, is stored as an ordinary final state.
+
+			null_symbol	: Null transition symbol. It is kept as an ordi-
+					nary column of the tables, but its index is re-
+					membered so null transitions can be followed by
+					run().
+
+			Symbol intervals of the automaton (see SymbolIntervals) are
+			kept in "symbol_classes", and the tables are over their la-
+			bels. Other symbol classes (see Automaton.compress_alphabet())
+			are expanded.
+		"""
+		self.states = []
+		self.state_index = {}
+		self.alphabet = []
+		self.symbol_index = {}
+		self.declared_states = 0
+		self.initial_state = -1
+		self.final_states = bytearray()
+		self.deterministic = True
+		self.table = array("i")
+		self.offsets = array("i")
+		self.targets = array("i")
+		self.null_symbol = null_symbol
+		self.symbol_classes = None
+
+		if automaton is not None:
+			automaton = automaton.__materializesink__()
+			if not isinstance(automaton.symbol_classes, SymbolIntervals):
+				automaton = automaton.expand_alphabet()
+			self.__intern__(automaton)
+
+	def __internstate__(self, state):
+		index = self.state_index.get(state)
+		if index is None:
+			index = len(self.states)
+			self.state_index[state] = index
+			self.states.append(state)
+		return index
+
+	def __intern__(self, automaton):
+		self.alphabet = list(automaton.alphabet)
+		self.symbol_classes = automaton.symbol_classes
+		self.symbol_index = {symbol : i \
+			for i, symbol in enumerate(self.alphabet)}
+
+		# Declared states always get the lowest ids
+		for state in automaton.transit_matrix:
+			self.__internstate__(state)
+		self.declared_states = len(self.states)
+
+		# The dense table can only be used if no cell holds a
+		# set of states (even a singleton, so the conversion
+		# back to the dictionary form stays lossless). Matchers
+		# don't rely on this flag (see AutomatonMatcher)
+		for state in automaton.transit_matrix:
+			row = automaton.transit_matrix[state]
+			for symbol in self.alphabet:
+				if isinstance(row.get(symbol), set) and row[symbol]:
+					self.deterministic = False
+					break
+			if not self.deterministic:
+				break
+
+		if self.deterministic:
+			for state in automaton.transit_matrix:
+				row = automaton.transit_matrix[state]
+				for symbol in self.alphabet:
+					target = row.get(symbol)
+					self.table.append(self.__internstate__(target) \
+						if target else -1)
+		else:
+			self.offsets.append(0)
+			for state in automaton.transit_matrix:
+				row = automaton.transit_matrix[state]
+				for symbol in self.alphabet:
+					cell = row.get(symbol)
+					if cell:
+						if not isinstance(cell, set):
+							cell = {cell}
+						self.targets.extend(sorted(\
+							self.__internstate__(target) for target in cell))
+					self.offsets.append(len(self.targets))
+
+		if automaton.initial_state is not None:
+			self.initial_state = self.__internstate__(automaton.initial_state)
+
+		for state in automaton.final_states:
+			self.__internstate__(state)
+
+		self.final_states = bytearray(len(self.states))
+		for state in automaton.final_states:
+			self.final_states[self.state_index[state]] = 1
+
+		# Undeclared states have no transitions at all
+		undeclared_cells = (len(self.states) - self.declared_states) \
+			* len(self.alphabet)
+
+		if self.deterministic:
+			self.table.extend([-1] * undeclared_cells)
+		else:
+			self.offsets.extend([len(self.targets)] * undeclared_cells)
+
+	def __len__(self):
+		return len(self.states)
+
+	# Binary format: little or big endian (the native one of the
+	# machine which saved it), all integers are 32 bits.
+	#
+	#	header		: magic, version, byte order, flags (bit 0:
+	#			deterministic), number of states, declared
+	#			states, alphabet size, initial state, length
+	#			of the table (DFA) or offsets (NFA) array and
+	#			length of the targets array.
+	#	alphabet	: string table with every symbol, plus the null
+	#			symbol as the last entry.
+	#	states		: string table with every state name.
+	#	final states	: one byte per state.
+	#	table		: DFA transition table, or
+	#	offsets, targets: NFA transition function, in CSR layout.
+	#	intervals	: only if flags bit 1 is set, the symbol inter-
+	#			vals (see SymbolIntervals): their number, their
+	#			starts, the index of their labels in the following
+	#			string table (-1 if in no class), the number of
+	#			labels and the labels string table.
+	#
+	# String tables are two sections: an array of (count + 1) offsets
+	# and the UTF-8 encoded strings. Every section starts aligned to
+	# 8 bytes.
+	BINARY_MAGIC = b"AUTOMATA"
+	BINARY_VERSION = 1
+	BINARY_HEADER = struct.Struct("=8sIBBxxIIIiII")
+
+	@staticmethod
+	def is_binary(filepath):
+		with open(filepath, "rb") as f:
+			return f.read(len(CompactAutomaton.BINARY_MAGIC)) == \
+				CompactAutomaton.BINARY_MAGIC
+
+	def save(self, filepath):
+		def string_table(strings):
+			encoded = [string.encode("utf-8") for string in strings]
+			offsets = array("i", [0])
+			for string in encoded:
+				offsets.append(offsets[-1] + len(string))
+			return [offsets.tobytes(), b"".join(encoded)]
+
+		def padding(size):
+			return b"\x00" * (-size % 8)
+
+		if self.deterministic:
+			arrays = [self.table]
+		else:
+			arrays = [self.offsets, self.targets]
+
+		sections = string_table(list(self.alphabet) + [self.null_symbol]) + \
+			string_table(self.states) + \
+			[bytes(self.final_states)] + \
+			[array("i", values).tobytes() for values in arrays]
+
+		flags = 1 if self.deterministic else 0
+
+		if self.symbol_classes is not None:
+			flags |= 2
+			labels = self.symbol_classes.class_labels()
+			label_index = {label : i for i, label in enumerate(labels)}
+
+			sections += [array("i", [len(self.symbol_classes.starts)]).tobytes(),
+				array("i", self.symbol_classes.starts).tobytes(),
+				array("i", [label_index.get(label, -1) \
+					for label in self.symbol_classes.labels]).tobytes(),
+				array("i", [len(labels)]).tobytes()] + string_table(labels)
+
+		header = self.BINARY_HEADER.pack(
+			self.BINARY_MAGIC,
+			self.BINARY_VERSION,
+			sys.byteorder == "little",
+			flags,
+			len(self.states),
+			self.declared_states,
+			len(self.alphabet),
+			self.initial_state,
+			len(arrays[0]),
+			len(self.targets) if not self.deterministic else 0)
+
+		with open(filepath, "wb") as f:
+			f.write(header + padding(len(header)))
+			for section in sections:
+				f.write(section + padding(len(section)))
+
+	@staticmethod
+	def load(filepath):
+		"""
+			Load a automaton saved by save(). The file is memory map-
+			ped (read only, so the pages are shared by every process
+			which loads the same file) and all tables are kept as
+			memoryviews over the map, with no per-state Python object
+			being created. State names are decoded only when reques-
+			ted, and "state_index" is None.
+		"""
+		compact = CompactAutomaton()
+
+		with open(filepath, "rb") as f:
+			data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+		header = CompactAutomaton.BINARY_HEADER
+		magic, version, little_endian, flags, num_states, \
+			declared_states, alphabet_len, initial_state, \
+			table_len, targets_len = header.unpack_from(data)
+
+		if magic != CompactAutomaton.BINARY_MAGIC:
+			data.close()
+			raise ValueError(filepath + ": not a binary automaton file")
+
+		if version != CompactAutomaton.BINARY_VERSION or \
+			bool(little_endian) != (sys.byteorder == "little"):
+			data.close()
+			raise ValueError(filepath + ": unsupported binary automaton " + \
+				"version or byte order")
+
+		view = memoryview(data)
+		position = header.size + (-header.size % 8)
+
+		def section(size):
+			nonlocal position
+			start = position
+			position += size + (-size % 8)
+			return view[start:start + size]
+
+		def int_section(length):
+			return section(4 * length).cast("i")
+
+		def string_table(count):
+			offsets = int_section(count + 1)
+			return MappedStrings(offsets, section(offsets[count]))
+
+		alphabet = string_table(alphabet_len + 1)
+
+		compact.alphabet = [alphabet[i] for i in range(alphabet_len)]
+		compact.symbol_index = {symbol : i \
+			for i, symbol in enumerate(compact.alphabet)}
+		compact.null_symbol = alphabet[alphabet_len]
+		compact.states = string_table(num_states)
+		compact.state_index = None
+		compact.declared_states = declared_states
+		compact.initial_state = initial_state
+		compact.final_states = section(num_states)
+		compact.deterministic = bool(flags & 1)
+
+		if compact.deterministic:
+			compact.table = int_section(table_len)
+		else:
+			compact.offsets = int_section(table_len)
+			compact.targets = int_section(targets_len)
+
+		if flags & 2:
+			num_intervals = int_section(1)[0]
+			starts = list(int_section(num_intervals))
+			label_indexes = list(int_section(num_intervals))
+			labels = list(string_table(int_section(1)[0]))
+
+			compact.symbol_classes = SymbolIntervals(starts, 
+				[labels[i] if i >= 0 else None for i in label_indexes])
+
+		compact.mapped_file = data
+
+		return compact
+
+	def close(self):
+		"""
+			Release the memory map of a automaton loaded by load().
+			No table of this automaton may be used afterwards.
+		"""
+		data = getattr(self, "mapped_file", None)
+		if data is None:
+			return
+
+		for name in ("table", "offsets", "targets", "final_states"):
+			if isinstance(getattr(self, name), memoryview):
+				getattr(self, name).release()
+				setattr(self, name, array("i"))
+
+		self.states.release()
+		self.mapped_file = None
+		data.close()
+
+	def successors(self, state, symbol):
+		"""
+			Return a tuple with the integer ids of all states reached
+			from the given state id with the given symbol id.
+		"""
+		cell = state * len(self.alphabet) + symbol
+
+		if self.deterministic:
+			target = self.table[cell]
+			return (target,) if target >= 0 else ()
+
+		return tuple(self.targets[self.offsets[cell]:self.offsets[cell + 1]])
+
+	def null_closure(self, state_set):
+		"""
+			Expand a set of state ids with every state reachable
+			from them through null transitions only.
+		"""
+		null_index = self.symbol_index.get(self.null_symbol)
+		if null_index is None:
+			return set(state_set)
+
+		closure = set(state_set)
+		stack = list(state_set)
+		while stack:
+			for target in self.successors(stack.pop(), null_index):
+				if target not in closure:
+					closure.add(target)
+					stack.append(target)
+
+		return closure
+
+	def null_closures(self):
+		"""
+			Return a list with the null transitions set (a frozenset
+			of state ids) of every state id, computed once per strong-
+			ly connected component (see Automaton.__nullclosures__).
+			States in the same component share the same frozenset.
+		"""
+		num_states = len(self)
+		null_index = self.symbol_index.get(self.null_symbol)
+		if null_index is None:
+			return [frozenset({state}) for state in range(num_states)]
+
+		successors = [self.successors(state, null_index) \
+			for state in range(num_states)]
+
+		_, components, component_closures = \
+			Automaton.__nullclosures__(successors)
+
+		closures = [None] * num_states
+		for members, closure in zip(components, component_closures):
+			closure = frozenset(Automaton.__bitsetids__(closure))
+			for state in members:
+				closures[state] = closure
+
+		return closures
+
+	def run(self, string):
+		if self.initial_state < 0:
+			return False
+
+		symbol_index = self.symbol_index
+
+		# The null symbol is never consumed (see Automaton.run())
+		null_index = symbol_index.get(self.null_symbol)
+
+		# Input symbols translated to the labels of their intervals
+		if self.symbol_classes is not None:
+			string = [self.symbol_classes.get(symbol, symbol) \
+				for symbol in string]
+
+		if self.deterministic:
+			table = self.table
+			alphabet_len = len(self.alphabet)
+			cur_state = self.initial_state
+
+			for symbol in string:
+				index = symbol_index.get(symbol)
+				if index is None or index == null_index:
+					return False
+
+				cur_state = table[cur_state * alphabet_len + index]
+				if cur_state < 0:
+					return False
+
+			return self.final_states[cur_state] == 1
+
+		cur_state_set = self.null_closure({self.initial_state})
+		for symbol in string:
+			index = symbol_index.get(symbol)
+			if index is None or index == null_index or not cur_state_set:
+				return False
+
+			new_states_set = set()
+			for state in cur_state_set:
+				new_states_set.update(self.successors(state, index))
+
+			cur_state_set = self.null_closure(new_states_set)
+
+		for state in cur_state_set:
+			if self.final_states[state]:
+				return True
+
+		return False
+
+	def to_automaton(self):
+		"""
+			Convert back to the dictionary-based Automaton form.
+		"""
+		transit_matrix = OrderedDict()
+		for state in range(self.declared_states):
+			row = {}
+			for index, symbol in enumerate(self.alphabet):
+				targets = self.successors(state, index)
+				if self.deterministic:
+					row[symbol] = self.states[targets[0]] \
+						if targets else set()
+				else:
+					row[symbol] = {self.states[target] \
+						for target in targets}
+			transit_matrix[self.states[state]] = row
+
+		aut = Automaton()
+		aut.alphabet = list(self.alphabet)
+		aut.symbol_classes = self.symbol_classes
+		aut.transit_matrix = transit_matrix
+		aut.initial_state = self.states[self.initial_state] \
+			if self.initial_state >= 0 else None
+		aut.final_states = {self.states[state] \
+			for state in range(len(self.states)) if self.final_states[state]}
+
+		return aut
+
+class MappedStrings:
+	def __init__(self, offsets, blob):
+		"""
+			Read-only sequence of strings stored as a string table
+			(see CompactAutomaton.save), decoding each string only
+			when it is accessed.
+		"""
+		self.offsets = offsets
+		self.blob = blob
+
+	def __len__(self):
+		return len(self.offsets) - 1
+
+	def __getitem__(self, index):
+		if index < 0:
+			index += len(self)
+		if not 0 <= index < len(self):
+			raise IndexError("string table index out of range")
+
+		return str(self.blob[self.offsets[index]:self.offsets[index + 1]], "utf-8")
+
+	def __iter__(self):
+		for index in range(len(self)):
+			yield self[index]
+
+	def release(self):
+		self.offsets.release()
+		self.blob.release()
+
+class AutomatonMatcher:
+	__slots__ = ("alphabet", "deterministic", "initial_state",
+		"final_states", "transitions", "symbol_classes")
+
+	def __init__(self, compact):
+		"""
+			Immutable matcher built by Automaton.compile() from a
+			CompactAutomaton. States are the integer ids of the com-
+			pact form.
+
+			deterministic	: True if the automaton has no null transi-
+					tions and every transition leads to a single
+					state. Then "transitions" holds, per state, a
+					dictionary mapping each symbol to the next state
+					and run() is a single lookup per symbol.
+
+					Otherwise, "transitions" maps each symbol to the
+					null transitions set of all states it leads to
+					(T_e(T(p, c)), a frozenset), and initial_state is
+					already the null transitions set of the initial
+					state.
+
+			symbol_classes	: symbol intervals of the compact form (see
+					SymbolIntervals), or None. Transitions are over
+					their labels, and every matcher translates its
+					input symbols with labels().
+		"""
+		null_index = compact.symbol_index.get(compact.null_symbol)
+		num_states = len(compact)
+
+		# The compact form keeps any set-valued cell (even the single-
+		# tons of automata read from text files) in its CSR layout,
+		# so every cell is checked here
+		deterministic = all(len(compact.successors(state, index)) <= \
+				(0 if index == null_index else 1) \
+			for state in range(num_states) \
+			for index in range(len(compact.alphabet)))
+
+		transitions = []
+		if deterministic:
+			for state in range(num_states):
+				row = {}
+				for index, symbol in enumerate(compact.alphabet):
+					targets = compact.successors(state, index)
+					if targets:
+						row[symbol] = targets[0]
+				transitions.append(row)
+
+			initial_state = compact.initial_state
+
+		else:
+			closures = compact.null_closures()
+
+			# The null symbol gets no column, so an input symbol
+			# equal to it is rejected as by Automaton.run()
+			for state in range(num_states):
+				row = {}
+				for index, symbol in enumerate(compact.alphabet):
+					targets = compact.successors(state, index)
+					if targets and index != null_index:
+						row[symbol] = frozenset().union(\
+							*(closures[target] for target in targets))
+				transitions.append(row)
+
+			initial_state = closures[compact.initial_state] \
+				if compact.initial_state >= 0 else frozenset()
+
+		final_states = frozenset(state for state in range(num_states) \
+			if compact.final_states[state])
+
+		object.__setattr__(self, "alphabet", tuple(compact.alphabet))
+		object.__setattr__(self, "deterministic", deterministic)
+		object.__setattr__(self, "initial_state", initial_state)
+		object.__setattr__(self, "final_states", final_states)
+		object.__setattr__(self, "transitions", tuple(transitions))
+		object.__setattr__(self, "symbol_classes", compact.symbol_classes)
+
+	def __setattr__(self, name, value):
+		raise AttributeError("AutomatonMatcher is immutable")
+
+	def __delattr__(self, name):
+		raise AttributeError("AutomatonMatcher is immutable")
+
+	def labels(self, string):
+		"""
+			The symbols of the transitions for the given input sym-
+			bols: the labels of their intervals, if there are symbol
+			intervals, or else the input itself.
+		"""
+		if self.symbol_classes is None:
+			return string
+		return [self.symbol_classes.get(symbol, symbol) for symbol in string]
+
+	def run(self, string):
+		transitions = self.transitions
+		string = self.labels(string)
+
+		if self.deterministic:
+			cur_state = self.initial_state
+			if cur_state < 0:
+				return False
+
+			for symbol in string:
+				cur_state = transitions[cur_state].get(symbol)
+				if cur_state is None:
+					return False
+
+			return cur_state in self.final_states
+
+		cur_state_set = self.initial_state
+		for symbol in string:
+			new_states_set = set()
+			for state in cur_state_set:
+				targets = transitions[state].get(symbol)
+				if targets:
+					new_states_set |= targets
+
+			if not new_states_set:
+				return False
+
+			cur_state_set = new_states_set
+
+		return not self.final_states.isdisjoint(cur_state_set)
+
+	def run_many(self, strings, batch_size=65536):
+		"""
+			Run every string of the given iterable, returning a NumPy
+			boolean array (or a list, if NumPy is not installed).
+
+			DFAs step all strings of a batch together: the batch is
+			encoded as a padded matrix of symbol indexes and each in-
+			put position costs a single vectorized gather over the
+			transition table. NFAs run each string through the shared
+			precomputed null transitions sets of this matcher.
+
+			batch_size	: number of strings encoded at a time, which
+					bounds the memory used by huge inputs.
+		"""
+		if np is None or not self.deterministic:
+			results = [self.run(string) for string in strings]
+			return np.array(results, dtype=bool) if np is not None \
+				else results
+
+		num_states = len(self.transitions)
+		alphabet_len = len(self.alphabet)
+		symbol_index = {symbol : i for i, symbol in enumerate(self.alphabet)}
+
+		# Full transition table, with two extra columns and one extra
+		# row: column "alphabet_len" is used by symbols not in the
+		# alphabet, column "alphabet_len + 1" pads shorter strings
+		# (keeping the current state) and row "num_states" is a dead
+		# state that can't be left.
+		dead_state = num_states
+		unknown_symbol = alphabet_len
+		pad_symbol = alphabet_len + 1
+
+		row_len = alphabet_len + 2
+		table = np.full((num_states + 1, row_len), dead_state, dtype=np.int64)
+		table[:, pad_symbol] = np.arange(num_states + 1)
+		for state, row in enumerate(self.transitions):
+			for symbol, target in row.items():
+				table[state, symbol_index[symbol]] = target
+
+		# Flattened, so each step is a single gather over
+		# "state * row_len + symbol"
+		table = table.ravel()
+
+		accepting = np.zeros(num_states + 1, dtype=bool)
+		accepting[list(self.final_states)] = True
+
+		# Single character symbols allow encoding a whole batch of
+		# Python strings at once, through their code points. NumPy
+		# pads shorter strings with code point 0, so this only works
+		# if the NUL character is neither a symbol nor in the input.
+		single_char = "\x00" not in symbol_index and \
+			all(isinstance(symbol, str) and len(symbol) == 1 \
+				for symbol in self.alphabet)
+
+		results = []
+		strings = iter(strings)
+		while True:
+			batch = list(itertools.islice(strings, batch_size))
+			if not batch:
+				break
+
+			if self.initial_state < 0:
+				results.append(np.zeros(len(batch), dtype=bool))
+				continue
+
+			try:
+				vectorized_encoding = single_char and \
+					"\x00" not in "".join(batch)
+			except TypeError:
+				# Not all inputs are Python strings
+				vectorized_encoding = False
+
+			# Encoded batch is transposed (input position x string),
+			# so each step reads a contiguous row
+			if vectorized_encoding:
+				codes = np.array(batch, dtype=str)
+				max_len = codes.itemsize // 4
+				codes = codes.view(np.uint32).reshape(len(batch), max_len)
+
+				max_code = max([int(codes.max())] + \
+					[ord(symbol) for symbol in self.alphabet])
+				code_index = np.full(max_code + 1, unknown_symbol, dtype=np.int64)
+				for symbol, i in symbol_index.items():
+					code_index[ord(symbol)] = i
+
+				# Every code point of an interval gets the index
+				# of its label
+				if self.symbol_classes is not None:
+					for first, last, label in self.symbol_classes.intervals():
+						if label in symbol_index and first <= max_code:
+							code_index[first:min(last, max_code) + 1] = \
+								symbol_index[label]
+
+				code_index[0] = pad_symbol
+
+				encoded = np.ascontiguousarray(code_index[codes].T)
+
+			else:
+				max_len = max(len(string) for string in batch)
+				encoded = np.full((max_len, len(batch)), pad_symbol, dtype=np.int64)
+				for i, string in enumerate(batch):
+					encoded[:len(string), i] = [symbol_index.get(symbol, \
+						unknown_symbol) for symbol in self.labels(string)]
+
+			cur_states = np.full(len(batch), self.initial_state, dtype=np.int64)
+			for position in range(max_len):
+				cur_states = table[cur_states * row_len + encoded[position]]
+
+			results.append(accepting[cur_states])
+
+		if not results:
+			return np.zeros(0, dtype=bool)
+
+		return np.concatenate(results)
+
+	def stream(self):
+		return StreamMatcher(self)
+
+class StreamMatcher:
+	def __init__(self, matcher):
+		"""
+			Stateful matcher for inputs given in pieces, built by
+			AutomatonMatcher.stream(). Only the current state (or set
+			of states, for NFAs) is kept between calls, so memory us-
+			age is constant regardless of the input size.
+
+			feed(chunk)	: consume the next chunk of input symbols.
+			accepting()	: True if the input fed so far is accepted.
+			reset()		: go back to the initial state.
+			feed_file(...)	: feed the whole content of a file.
+		"""
+		self.matcher = matcher
+		self.reset()
+
+	def reset(self):
+		self.cur_state = self.matcher.initial_state
+		self.consumed = 0
+
+	def dead(self):
+		"""
+			True if no continuation of the input fed so far can be
+			accepted anymore.
+		"""
+		if self.matcher.deterministic:
+			return self.cur_state is None or self.cur_state < 0
+		return not self.cur_state
+
+	def feed(self, chunk):
+		self.consumed += len(chunk)
+
+		if self.dead():
+			return self
+
+		transitions = self.matcher.transitions
+		cur_state = self.cur_state
+		chunk = self.matcher.labels(chunk)
+
+		if self.matcher.deterministic:
+			for symbol in chunk:
+				cur_state = transitions[cur_state].get(symbol)
+				if cur_state is None:
+					break
+		else:
+			for symbol in chunk:
+				new_states_set = set()
+				for state in cur_state:
+					targets = transitions[state].get(symbol)
+					if targets:
+						new_states_set |= targets
+
+				cur_state = new_states_set
+				if not cur_state:
+					break
+
+		self.cur_state = cur_state
+		return self
+
+	def accepting(self):
+		if self.dead():
+			return False
+
+		if self.matcher.deterministic:
+			return self.cur_state in self.matcher.final_states
+
+		return not self.matcher.final_states.isdisjoint(self.cur_state)
+
+	def feed_file(self, filepath, encoding="utf-8", chunk_size=1 << 20, 
+		use_mmap=False):
+		"""
+			Feed the content of a file, read in chunks of "chunk_size"
+			bytes, either from buffered reads or from a memory map of
+			the file (use_mmap=True). Bytes are decoded incrementally,
+			so multibyte characters split between two chunks are han-
+			dled correctly. Reading stops as soon as the matcher gets
+			into a dead state. Returns accepting().
+		"""
+		decoder = codecs.getincrementaldecoder(encoding)()
+
+		with open(filepath, "rb") as f:
+			if use_mmap:
+				try:
+					data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+				except ValueError:
+					# Empty files can't be mapped
+					data = b""
+
+				for start in range(0, len(data), chunk_size):
+					self.feed(decoder.decode(data[start:start + chunk_size]))
+					if self.dead():
+						break
+
+				if isinstance(data, mmap.mmap):
+					data.close()
+			else:
+				while not self.dead():
+					data = f.read(chunk_size)
+					if not data:
+						break
+					self.feed(decoder.decode(data))
+
+		if not self.dead():
+			self.feed(decoder.decode(b"", final=True))
+
+		return self.accepting()
+
+class LazyDFAMatcher:
+	def __init__(self, matcher, cache_size=4096, min_symbols_per_state=10):
+		"""
+			Matcher that determinizes an AutomatonMatcher lazily,
+			similar to RE2's DFA cache. Each DFA state is a subset of
+			NFA states, built only when some input reaches it, and its
+			transitions are filled in as they are used.
+
+			matcher		: AutomatonMatcher to be determinized. If it is
+					already deterministic, it is used directly.
+
+			cache_size	: maximum number of DFA states kept in memory.
+					When the cache is full, it is flushed entirely
+					(every cached transition points to another cached
+					state, so states can't be evicted one at a time)
+					and rebuilt from the current state.
+
+			min_symbols_per_state : if, since the last flush, fewer than
+					"min_symbols_per_state" input symbols were read per
+					cached state, the cache is considered thrashing and
+					the remaining input of that string is matched by
+					plain NFA simulation instead.
+		"""
+		self.matcher = matcher
+		self.cache_size = max(cache_size, 2)
+		self.min_symbols_per_state = min_symbols_per_state
+		self.cache = {}
+
+		self.hits = 0
+		self.misses = 0
+		self.flushes = 0
+		self.fallbacks = 0
+		self.symbols_since_flush = 0
+
+	def __getentry__(self, subset):
+		# Each cache entry is a list [subset, is final, transitions],
+		# where transitions maps symbols to other cache entries
+		entry = self.cache.get(subset)
+		if entry is None:
+			entry = [subset, 
+				not self.matcher.final_states.isdisjoint(subset), 
+				{}]
+			self.cache[subset] = entry
+		return entry
+
+	def __flush__(self):
+		thrashing = self.symbols_since_flush < \
+			self.min_symbols_per_state * len(self.cache)
+
+		self.cache = {}
+		self.flushes += 1
+		self.symbols_since_flush = 0
+
+		return thrashing
+
+	def __nfarun__(self, cur_state_set, string):
+		transitions = self.matcher.transitions
+
+		for symbol in string:
+			new_states_set = set()
+			for state in cur_state_set:
+				targets = transitions[state].get(symbol)
+				if targets:
+					new_states_set |= targets
+
+			if not new_states_set:
+				return False
+
+			cur_state_set = new_states_set
+
+		return not self.matcher.final_states.isdisjoint(cur_state_set)
+
+	def run(self, string):
+		if self.matcher.deterministic:
+			return self.matcher.run(string)
+
+		transitions = self.matcher.transitions
+		entry = self.__getentry__(self.matcher.initial_state)
+		string = self.matcher.labels(string)
+
+		for i, symbol in enumerate(string):
+			self.symbols_since_flush += 1
+			next_entry = entry[2].get(symbol)
+
+			if next_entry is not None:
+				self.hits += 1
+			else:
+				self.misses += 1
+
+				subset = set()
+				for state in entry[0]:
+					targets = transitions[state].get(symbol)
+					if targets:
+						subset |= targets
+				subset = frozenset(subset)
+
+				if subset not in self.cache and \
+					len(self.cache) >= self.cache_size:
+					if self.__flush__():
+						self.fallbacks += 1
+						return self.__nfarun__(subset, string[i+1:]) \
+							if subset else False
+
+				next_entry = self.__getentry__(subset)
+				entry[2][symbol] = next_entry
+
+			entry = next_entry
+
+			# Dead state, no way to get accepted anymore
+			if not entry[0]:
+				return False
+
+		return entry[1]
+
+	def stats(self):
+		"""
+			Return a dictionary with the cache statistics.
+		"""
+		lookups = self.hits + self.misses
+		return {
+			"cache_size" : self.cache_size,
+			"cached_states" : len(self.cache),
+			"hits" : self.hits,
+			"misses" : self.misses,
+			"hit_rate" : self.hits / lookups if lookups else 0.0,
+			"flushes" : self.flushes,
+			"fallbacks" : self.fallbacks,
+		}
+
+class BitsetMatcher:
+	__slots__ = ("matcher", "alphabet", "deterministic", "initial_state",
+		"final_states", "transitions", "symbol_bases", "memo",
+		"cache_size", "num_bytes")
+
+	def __init__(self, matcher, cache_size=65536):
+		"""
+			Immutable NFA matcher built by Automaton.compile_bitset()
+			from an AutomatonMatcher, whose sets of states are arbi-
+			trary-precision ints (bit i set for state id i). So the
+			union of the successors of a set of states, checking if
+			it has a final state and hashing it are each a single
+			big-int operation, instead of a set operation per state.
+
+			"transitions" maps each symbol to a list with, for each
+			state id, the bitset of T_e(T(p, c)). "initial_state"
+			and "final_states" are bitsets as well.
+
+			The states are also grouped in blocks of 8 (a byte of the
+			bitsets). "memo" maps each (symbol, block, byte value) that
+			has shown up to the union of the rows of the states in that
+			byte, so each input symbol costs one union per non-empty
+			byte of the current set, instead of one per state in it.
+
+			The memo is the only mutable part of the matcher. Its en-
+			tries only depend on the transitions, so runs sharing the
+			matcher (even from several threads) may fill it in any or-
+			der, at worst computing an entry twice. It stops growing
+			after "cache_size" entries, and the remaining unions are
+			computed as needed.
+
+			If the matcher is deterministic, it is used directly.
+		"""
+		object.__setattr__(self, "matcher", matcher)
+		object.__setattr__(self, "alphabet", matcher.alphabet)
+		object.__setattr__(self, "deterministic", matcher.deterministic)
+
+		if matcher.deterministic:
+			for name in ("initial_state", "final_states", "transitions",
+				"symbol_bases", "memo", "cache_size", "num_bytes"):
+				object.__setattr__(self, name, None)
+			return
+
+		def bitset(state_set):
+			bits = 0
+			for state in state_set:
+				bits |= 1 << state
+			return bits
+
+		# Each distinct frozenset is converted only once, as rows
+		# built from the same null transitions set share it
+		bitsets = {}
+		transitions = {symbol : [0] * len(matcher.transitions) \
+			for symbol in matcher.alphabet}
+
+		for state, row in enumerate(matcher.transitions):
+			for symbol, targets in row.items():
+				bits = bitsets.get(targets)
+				if bits is None:
+					bits = bitsets[targets] = bitset(targets)
+				transitions[symbol][state] = bits
+
+		object.__setattr__(self, "initial_state", bitset(matcher.initial_state))
+		object.__setattr__(self, "final_states", bitset(matcher.final_states))
+		object.__setattr__(self, "transitions", transitions)
+
+		num_bytes = (len(matcher.transitions) + 7) // 8
+		object.__setattr__(self, "num_bytes", num_bytes)
+
+		# Memo keys are "(base + block) << 8 | value", where each
+		# symbol has its own range of blocks
+		object.__setattr__(self, "symbol_bases", {symbol : i * num_bytes \
+			for i, symbol in enumerate(matcher.alphabet)})
+		object.__setattr__(self, "memo", {})
+		object.__setattr__(self, "cache_size", cache_size)
+
+	def __setattr__(self, name, value):
+		raise AttributeError("BitsetMatcher is immutable")
+
+	def __delattr__(self, name):
+		raise AttributeError("BitsetMatcher is immutable")
+
+	def run(self, string):
+		if self.deterministic:
+			return self.matcher.run(string)
+
+		transitions = self.transitions
+		symbol_bases = self.symbol_bases
+		memo = self.memo
+		num_bytes = self.num_bytes
+		cur_state_set = self.initial_state
+
+		for symbol in self.matcher.labels(string):
+			row = transitions.get(symbol)
+			if row is None or not cur_state_set:
+				return False
+
+			base = symbol_bases[symbol]
+			new_states_set = 0
+			for block, value in enumerate(cur_state_set.to_bytes(num_bytes, "little")):
+				if not value:
+					continue
+
+				key = (base + block) << 8 | value
+				targets = memo.get(key)
+				if targets is None:
+					targets = 0
+					for i in range(8):
+						if value >> i & 1:
+							targets |= row[8 * block + i]
+					if len(memo) < self.cache_size:
+						memo[key] = targets
+
+				new_states_set |= targets
+
+			cur_state_set = new_states_set
 
-		# Null transition between new start state and original
-		# automaton start state. Remembering also that the ini-
-		# tial dummy state must have a null transition to the 
-		# dummy final state
-		ksaut.transit_matrix[initial_state_id][null_symbol] = \
-			{ksaut.initial_state, final_state_id}
+		return bool(cur_state_set & self.final_states)
 
-		for final_state in ksaut.final_states:
-			# Insert null transitions between automaton original fi-
-			# nal states and new dummy final state and original st-
-			# art state
-			ksaut.transit_matrix[final_state][null_symbol].\
-				update({final_state_id, self.initial_state})
+	def run_many(self, strings):
+		"""
+			Run every string of the given iterable, returning a NumPy
+			boolean array (or a list, if NumPy is not installed).
+		"""
+		if self.deterministic:
+			return self.matcher.run_many(strings)
 
-		# Update new automatons start and end states list
-		ksaut.initial_state = initial_state_id
-		ksaut.final_states = {final_state_id}
+		results = [self.run(string) for string in strings]
+		return np.array(results, dtype=bool) if np is not None else results
 
-		return ksaut
+class MultiPatternMatcher(LazyDFAMatcher):
+	def __init__(self, patterns, null_symbol="e", start_state_id="MP",
+		cache_size=4096, min_symbols_per_state=10):
+		"""
+			Matcher for many patterns at once. Every pattern (a regex,
+			in the syntax of Automaton.load_regex(), or an Automaton)
+			is put in a single NFAe, whose initial state has a null
+			transition to the initial state of each pattern, and whose
+			final states are tagged with the id (position in the list)
+			of the pattern they come from. The NFAe is determinized
+			lazily, as in LazyDFAMatcher, and each DFA state keeps the
+			set of ids of the patterns it accepts, so a single pass
+			over the input finds every matching pattern.
+
+			The cache of DFA states is bounded as in LazyDFAMatcher
+			("cache_size" and "min_symbols_per_state"): it is flushed
+			when full and, if thrashing, the rest of the current pass
+			(the string of match() or the token of tokenize()) goes on
+			by plain NFA simulation, without caching any state.
+
+			match(string)	: set of ids of the patterns matching the
+					whole string.
+			tokenize(string): split the string in tokens, by longest
+					match (see tokenize()).
+
+			Pattern states are renamed to "p<id>:<state>", and the new
+			initial state is "start_state_id".
+		"""
+		if not patterns:
+			raise ValueError("MultiPatternMatcher needs at least one pattern")
+
+		self.patterns = list(patterns)
+
+		transit_matrix = OrderedDict()
+		transit_matrix[start_state_id] = {null_symbol : set()}
+		alphabet = []
+		pattern_of = {}
+
+		def rename(prefix, targets):
+			if not targets:
+				return set()
+			if isinstance(targets, set):
+				return {prefix + target for target in targets}
+			return {prefix + targets}
+
+		# Every pattern over the same symbols (see Automaton.__commonclasses__)
+		automatons = Automaton.__commonclasses__([(pattern \
+			if isinstance(pattern, Automaton) else Automaton(regex=pattern, 
+				null_symbol=null_symbol)).__materializesink__() \
+					for pattern in self.patterns])
+
+		for pattern_id, pattern in enumerate(automatons):
+			prefix = "p" + str(pattern_id) + ":"
+			for state, row in pattern.transit_matrix.items():
+				transit_matrix[prefix + state] = {symbol : rename(prefix, \
+					targets) for symbol, targets in row.items()}
+
+			for symbol in pattern.alphabet:
+				if symbol not in alphabet:
+					alphabet.append(symbol)
+
+			for state in pattern.final_states:
+				pattern_of[prefix + state] = pattern_id
+
+			if pattern.initial_state is not None:
+				transit_matrix[start_state_id][null_symbol].add(\
+					prefix + pattern.initial_state)
+
+		if null_symbol not in alphabet:
+			alphabet.append(null_symbol)
+
+		for row in transit_matrix.values():
+			for symbol in alphabet:
+				row.setdefault(symbol, set())
+
+		automaton = Automaton.__wrap__(
+			alphabet=alphabet,
+			transit_matrix=transit_matrix,
+			initial_state=start_state_id,
+			final_states=set(pattern_of))
+		automaton.symbol_classes = automatons[0].symbol_classes
+
+		compact = automaton.to_compact(null_symbol=null_symbol)
+		self.tags = [pattern_of.get(state) for state in compact.states]
+		LazyDFAMatcher.__init__(self, AutomatonMatcher(compact),
+			cache_size=cache_size,
+			min_symbols_per_state=min_symbols_per_state)
+
+		matcher = self.matcher
+		if matcher.deterministic:
+			self.initial_entry = self.__getentry__(frozenset() \
+				if matcher.initial_state < 0 else \
+					frozenset({matcher.initial_state}))
+		else:
+			self.initial_entry = self.__getentry__(matcher.initial_state)
+
+	def __getentry__(self, subset, cached=True):
+		# Each cache entry is a list [subset, ids of the patterns
+		# accepted, transitions], where transitions maps symbols to
+		# other cache entries. Entries left out of the cache have
+		# no transitions (None)
+		entry = self.cache.get(subset)
+		if entry is None:
+			entry = [subset, 
+				frozenset(self.tags[state] for state in subset \
+					if self.tags[state] is not None), 
+				{} if cached else None]
+			if cached:
+				self.cache[subset] = entry
+		return entry
+
+	def __step__(self, entry, symbol):
+		# Input symbols are translated to the labels of their
+		# intervals (see SymbolIntervals), if any
+		if self.matcher.symbol_classes is not None:
+			symbol = self.matcher.symbol_classes.get(symbol, symbol)
+
+		self.symbols_since_flush += 1
+		next_entry = entry[2].get(symbol) if entry[2] is not None else None
+		if next_entry is not None:
+			self.hits += 1
+			return next_entry
+
+		self.misses += 1
+
+		transitions = self.matcher.transitions
+		subset = set()
+		for state in entry[0]:
+			targets = transitions[state].get(symbol)
+			if targets is None:
+				continue
+			if self.matcher.deterministic:
+				subset.add(targets)
+			else:
+				subset |= targets
+		subset = frozenset(subset)
 
-	def __shuntingyard__(self, string, operators_set):
+		# Plain NFA simulation, after the cache thrashed
+		if entry[2] is None:
+			return self.__getentry__(subset, cached=False)
 
-		# Preprocessing the input string
-		pattern = list(operators_set.keys()) + ["(", ")"]
-		if "-" in pattern:
-			pattern.remove("-")
-			pattern.insert(0, "-")
-		pattern = "\\" + "\\".join(pattern)
-		pattern = "([" + pattern + "]|[^" + pattern + "]+)"
-		input_array = re.findall(pattern, string)
-		
-		ans = []
-		operator_stack = []
+		if subset not in self.cache and len(self.cache) >= self.cache_size:
+			thrashing = self.__flush__()
+			self.initial_entry = self.__getentry__(self.initial_entry[0])
 
-		for c in input_array:
-			if c not in operators_set and c != "(" and c != ")":
-				ans.append(c)
+			if thrashing:
+				self.fallbacks += 1
+				return self.__getentry__(subset, cached=False)
 
-			elif c in operators_set:
-				# Pop operator stack until the top operator has higher
-				# priority
-				while operator_stack and \
-					c in operators_set and \
-					operator_stack[-1] in operators_set and \
-					operators_set[operator_stack[-1]] > operators_set[c]:
-					ans.append(operator_stack.pop())
+		next_entry = entry[2][symbol] = self.__getentry__(subset)
+		return next_entry
 
-				operator_stack.append(c)
+	def run(self, string):
+		return bool(self.match(string))
 
-			elif c == "(":
-				operator_stack.append(c)
+	def match(self, string):
+		"""
+			Return the set of ids of all patterns matching the whole
+			string.
+		"""
+		entry = self.initial_entry
+		for symbol in string:
+			entry = self.__step__(entry, symbol)
 
-			elif c == ")":
-				# Pop operator stack until founding a matching "("
-				while operator_stack[-1] != "(":
-					ans.append(operator_stack.pop())
+			# Dead state, no way to get accepted anymore
+			if not entry[0]:
+				return frozenset()
 
-				# Discard ")"
-				operator_stack.pop(-1)
+		return entry[1]
 
-		while operator_stack:
-			ans.append(operator_stack.pop())
+	def tokenize(self, string):
+		"""
+			Split the string in tokens, from left to right. Each token
+			is the longest non-empty prefix of the remaining input
+			matched by some pattern; if more than one pattern matches
+			it, the first one in the list wins (so patterns are given
+			by priority). Returns a list of (pattern id, token) pairs.
+
+			Raises ValueError if no pattern matches a non-empty prefix
+			of the remaining input.
+		"""
+		tokens = []
+		start = 0
 
-		return ans
+		while start < len(string):
+			entry = self.initial_entry
+			match_end = None
+			match_id = None
 
-	def __sumtostar__(self, regex, kleene_star="*", kleene_sum="+"):
-		# Tranforms all r+ (Kleene Sum) to rr* (Kleene Star).
-		# Note that this same logic can be applied if "?" ope-
-		# rator is implemented (r? := (r|e), where "e" is the null
-		# string)
+			for position in range(start, len(string)):
+				entry = self.__step__(entry, string[position])
+				if not entry[0]:
+					break
 
-		stack = []
-		i = 0
-		j = 0
-		reg_size = len(regex)
-		while i < reg_size:
-			if regex[i] == kleene_sum:
-				j = i-1
+				if entry[1]:
+					match_end = position + 1
+					match_id = min(entry[1])
 
-				if regex[j] == ")":
-					stack.append(regex[j])
-					while stack:
-						j -= 1
-						if regex[j] == ")":
-							stack.append(")")
-						elif regex[j] == "(":
-							stack.pop()
+			if match_end is None:
+				raise ValueError("No pattern matches the input at position " + \
+					str(start))
 
-				regex = regex[:j] + "(" + 2 * regex[j:i] + "*)" + regex[i+1:]
-				reg_size = len(regex)
-			i += 1
+			tokens.append((match_id, string[start:match_end]))
+			start = match_end
 
-		return regex
+		return tokens
 
-	def __fillconcatop__(self, regex, concat_symbol, operators_list):
-		# Fill regex with an artificialy made concatenation
-		# symbol
+class SearchMatcher:
+	def __init__(self, automaton, null_symbol="e", cache_size=4096, 
+		min_symbols_per_state=10):
+		"""
+			Unanchored search of an automaton inside larger texts
+			(strings, lists of symbols or bytes, whose bytes are read
+			as the symbols chr(byte)). Matches are the leftmost-longest
+			non-empty substrings accepted by the automaton, each one
+			found by running the lazily determinized automaton (see
+			MultiPatternMatcher) from a candidate start position.
+
+			If the automaton was built by load_regex(), its required
+			literals (see Automaton.__regexliterals__) are used with
+			str.find/bytes.find to skip positions where no match can
+			start, before the automaton runs:
+
+			-	If every match starts with a literal, only its
+				occurrences are tried.
+
+			-	Otherwise, if every match contains a literal, no
+				match can start after its last occurrence (nor at
+				all, if it doesn't occur). If matches also have a
+				bounded length, only positions at most that length
+				before an occurrence are tried.
+
+			The cache of DFA states is bounded by "cache_size", as in
+			MultiPatternMatcher, so scanning long texts can't keep
+			adding states to it.
+		"""
+		self.matcher = MultiPatternMatcher([automaton], 
+			null_symbol=null_symbol,
+			cache_size=cache_size,
+			min_symbols_per_state=min_symbols_per_state)
+
+		literals = automaton.literals or {}
+		self.prefix = literals.get("prefix", "")
+		self.required = literals.get("required", "")
+		self.max_length = literals.get("max_length")
+
+	def __longestmatch__(self, text, start, to_symbol):
+		# End of the longest non-empty match starting at "start",
+		# or None
+		matcher = self.matcher
+		entry = matcher.initial_entry
+		match_end = None
+
+		for position in range(start, len(text)):
+			entry = matcher.__step__(entry, to_symbol(text[position]))
+			if not entry[0]:
+				break
+			if entry[1]:
+				match_end = position + 1
+
+		return match_end
+
+	def __literal__(self, text, literal):
+		# The literal in the same type as the text, or None if the
+		# text can't be searched by find()
+		if isinstance(text, str):
+			return literal
+		if isinstance(text, (bytes, bytearray)):
+			try:
+				return literal.encode("latin-1")
+			except UnicodeEncodeError:
+				return None
+		return None
 
-		if regex is None or not regex:
-			return
+	def search(self, text, start=0):
+		to_symbol = chr if isinstance(text, (bytes, bytearray)) \
+			else lambda symbol: symbol
+
+		prefix = self.__literal__(text, self.prefix) if self.prefix else None
+		required = self.__literal__(text, self.required) \
+			if self.required else None
+
+		if prefix is not None:
+			position = text.find(prefix, start)
+			while position != -1:
+				match_end = self.__longestmatch__(text, position, to_symbol)
+				if match_end is not None:
+					return position, match_end
+				position = text.find(prefix, position + 1)
+			return None
+
+		end = len(text)
+		if required is not None:
+			last = text.rfind(required, start)
+			if last == -1:
+				return None
+			end = last + 1
+
+		position = start
+		while position < end:
+			if required is not None and self.max_length is not None:
+				# Skip to the first position from which the next
+				# occurrence of the literal is still reachable
+				occurrence = text.find(required, position)
+				if occurrence == -1:
+					return None
+				position = max(position, 
+					occurrence + len(required) - self.max_length)
+
+			match_end = self.__longestmatch__(text, position, to_symbol)
+			if match_end is not None:
+				return position, match_end
+			position += 1
 
-		# Skip possible initial parenthesis
-		i = 0
-		while regex[i] == "(":
-			i += 1
+		return None
 
-		# Process input string
-		while i < len(regex) - 1:
-			cur_sym = regex[i]
-			next_sym = regex[i+1]
-			if ((cur_sym not in operators_list and next_sym not in operators_list)) or \
-				(next_sym == "(" and cur_sym not in {"(", "|"}) or \
-				(cur_sym == ")" and next_sym not in {"(", "|"}) or \
-				(next_sym not in operators_list and cur_sym == "*"):
+	def finditer(self, text):
+		start = 0
+		while start < len(text):
+			span = self.search(text, start=start)
+			if span is None:
+				return
+			yield span
+			start = span[1]
+
+class Pipeline:
+	# Step flags (no value) and options (followed by a value), with
+	# the same meaning they have in the command line interface
+	FLAGS = {"-dfa", "-nfa", "-min", "-simpleout", "-lazy", "-mmap",
+		"-nosinknull", "-demorgan", "-product", "-bitset"}
+
+	OPTIONS = {"-nullsymbol" : "e", "-sinkid" : "SINK", "-startid" : None,
+		"-finalid" : None, "-stateprefix" : "DFA", "-initialstate" : "S",
+		"-sep" : ",", "-engine" : "thompson",
+		"-workers" : None}
+
+	# Operations, with their number of mandatory arguments
+	OPERATIONS = {"load" : 1, "loadregex" : 1, "loadgrammar" : 1, "use" : 1,
+		"print" : 0, "convnfa" : 0, "convdfa" : 0, "compress" : 0,
+		"grammar" : 0, "compl" : 0, "min" : 0, "kleenestar" : 0,
+		"intersec" : 1, "union" : 1, "concat" : 1, "diff" : 1, "symdiff" : 1,
+		"equiv" : 1, "includes" : 1, "run" : 1, "runfile" : 1, "save" : 1}
+
+	# Operations which load a new automaton, instead of working on
+	# the current one
+	LOADERS = {"load", "loadregex", "loadgrammar", "use"}
+
+	def __init__(self):
+		"""
+			Apply a sequence of operations to automatons kept in me-
+			mory, in a single process. Each step is a dictionary with
+			the operation name ("op"), its positional arguments ("args"),
+			its flags and options ("options") and, optionally, a name
+			("as") to keep its result under.
+
+			Every operation is applied to the current automaton (the
+			result of the previous step) and its result becomes the
+			new current automaton. Arguments which are automatons
+			(second operand of intersec, union, ...) may be either
+			a filepath or "@name", a result kept by a previous step.
+
+			Operations (see the command line interface help for their
+			descriptions, flags and options):
+
+				load <filepath>, loadregex <regex>, loadgrammar <filepath>,
+				print, convnfa, convdfa, compress, grammar, compl, min,
+				intersec <automaton>, union <automaton>,
+				concat <automaton>, diff <automaton>, symdiff <automaton>,
+				kleenestar, equiv <automaton>, includes <automaton>,
+				run <string>, runfile <filepath>,
+				save <filepath> (binary format), use <@name>
+
+			Loaded automatons are frozen (see Automaton.freeze()), so
+			the results kept in memory share their unchanged rows.
+		"""
+		self.automaton = None
+		self.named = {}
+
+	@staticmethod
+	def parse_step(tokens):
+		"""
+			Build a step from its tokens, in the form
+
+				<operation> [arguments] [flags and options] [as <name>]
 
-				regex = regex[:i+1] + concat_symbol + regex[i+1:]
+			Any other token starting with "-" raises ValueError, so
+			misspelled flags aren't taken as arguments, as do unknown
+			operations and missing arguments (see check_step()).
+		"""
+		step = {"op" : tokens[0].lower(), "args" : [], "options" : {}}
+
+		i = 1
+		while i < len(tokens):
+			token = tokens[i]
+			if token in Pipeline.FLAGS:
+				step["options"][token] = True
+			elif token in Pipeline.OPTIONS and i + 1 < len(tokens):
+				step["options"][token] = tokens[i + 1]
+				i += 1
+			elif token == "as" and i + 1 < len(tokens):
+				step["as"] = tokens[i + 1]
 				i += 1
+			elif token in Pipeline.OPTIONS:
+				raise ValueError("Pipeline option \"" + token + \
+					"\" needs a value")
+			elif token.startswith("-"):
+				raise ValueError("Unknown pipeline flag \"" + token + \
+					"\" in operation \"" + step["op"] + "\"")
+			else:
+				step["args"].append(token)
 			i += 1
 
-		return regex
-
-	def __atomicautomaton__(self, symbol, start_state_id, end_state_id):
-		return Automaton(
-			alphabet=[symbol],
-			initial_state = start_state_id,
-			final_states = {end_state_id},
-			transit_matrix = {
-				start_state_id : {symbol : {end_state_id} },
-				end_state_id : {symbol : set()}
-			})
+		return Pipeline.check_step(step)
 
-	def load_regex(self, 
-		regex, 
-		null_symbol="e", 
-		or_operator="|", 
-		kleene_star="*", 
-		kleene_sum="+",
-		remove_whitespaces=False):
+	@staticmethod
+	def check_step(step):
+		"""
+			Raise ValueError if the step has an unknown operation, an
+			unknown flag or option, or fewer arguments than its oper-
+			ation needs. Returns the step itself.
+		"""
+		op = step["op"]
+		if op not in Pipeline.OPERATIONS:
+			raise ValueError("Unknown pipeline operation \"" + op + "\"")
 
-		if remove_whitespaces:
-			regex = re.sub("\s+", "", regex)
+		for option in step.get("options", {}):
+			if option not in Pipeline.FLAGS and option not in Pipeline.OPTIONS:
+				raise ValueError("Unknown pipeline flag \"" + option + \
+					"\" in operation \"" + op + "\"")
 
-		# Preprocess kleene_sum to concatenation of
-		# regex and regex with kleene star:
-		# r+ := rr*
-		regex = self.__sumtostar__(regex, 
-			kleene_star=kleene_star, 
-			kleene_sum=kleene_sum)
+		if len(step.get("args", [])) < Pipeline.OPERATIONS[op]:
+			raise ValueError("Pipeline operation \"" + op + \
+				"\" needs an argument")
 
-		# Symbol made "concatenation operator" adopted as 
-		# kleene sum symbol, because I know I already ride 
-		# Kleene Sum operations off at this point, so I'm 
-		# free to reuse this now-invalid symbol.
-		concat_operator = kleene_sum
+		return step
 
-		# Construct a precedence score for all operators.
-		# Note that the "concat_operator" is artificially made
-		# for the concatenation operation.
-		shunting_yard_argdict = {
-			or_operator : 2, 
-			concat_operator : 3, 
-			kleene_star : 4
-		}
+	@staticmethod
+	def check(steps):
+		"""
+			Check a whole pipeline before running any step: every step
+			(see check_step()), the first one loading an automaton, and
+			every "@name" argument kept by an earlier step.
+		"""
+		names = set()
+		for i, step in enumerate(steps):
+			Pipeline.check_step(step)
+
+			if i == 0 and step["op"] not in Pipeline.LOADERS:
+				raise ValueError("Pipeline operation \"" + step["op"] + \
+					"\" has no automaton to work on")
+
+			# Operations whose argument is an automaton
+			if step["op"] in {"load", "use", "intersec", "union", "concat",
+				"diff", "symdiff", "equiv", "includes"}:
+				reference = step["args"][0]
+				if reference.startswith("@") and reference[1:] not in names:
+					raise ValueError("Unknown pipeline result \"" + \
+						reference + "\"")
+
+			if step.get("as"):
+				names.add(step["as"])
+
+	@staticmethod
+	def parse(text):
+		"""
+			Parse a plain text pipeline: steps are separated by new
+			lines or ";", and tokens are split as in a shell (so quo-
+			tes may be used). "#" starts a comment.
+		"""
+		steps = []
+		for line in text.splitlines():
+			lexer = shlex.shlex(line, posix=True, punctuation_chars=";")
+			lexer.whitespace_split = True
+
+			tokens = []
+			for token in list(lexer) + [";"]:
+				if token == ";":
+					if tokens:
+						steps.append(Pipeline.parse_step(tokens))
+					tokens = []
+				else:
+					tokens.append(token)
 
-		# Fill regex with a artificialy made "concatenation 
-		# operator".
-		regex = self.__fillconcatop__(regex,
-			concat_symbol=concat_operator,
-			operators_list=set(shunting_yard_argdict.\
-				keys()).union({"(", ")"}))
+		return steps
 
-		print(regex)
+	@staticmethod
+	def parse_file(filepath):
+		"""
+			Parse a pipeline script. JSON scripts (".json" files) are
+			a list of steps, each being either a string (in the plain
+			text format) or a dictionary with "op", "args", "options"
+			and "as" keys. Any other file is in the plain text format.
+		"""
+		with open(filepath) as f:
+			text = f.read()
 
-		# Transform given regex to reverse polish notation
-		# using shunting-yard algorithm
-		rpn_regex = self.__shuntingyard__(regex, 
-			operators_set = shunting_yard_argdict)
+		if not filepath.lower().endswith(".json"):
+			return Pipeline.parse(text)
 
-		print(rpn_regex)
-		# Now, we only need to solve
-		automatons_stack = []
-		counter = 0
-		while rpn_regex:
-			cur_state = rpn_regex.pop(0)
-			if cur_state in shunting_yard_argdict:
-				# Operator, check if it is unary ("kleene star")
-				# or binary ("or" or "concatenation").
-				if cur_state == kleene_star:
-					# Unary, pop a single operand from the
-					# automaton stack
-					automatons_stack.append(\
-						automatons_stack.pop().kleene_star(null_symbol=null_symbol))
-				else:
-					# Binary, pop two operands from the au-
-					# tomaton stack
-					automaton_b = automatons_stack.pop()
-					automaton_a = automatons_stack.pop()
-					if cur_state == or_operator:
-						# Or operator
-						automatons_stack.append(\
-							automaton_a.union(\
-								automaton_b, 
-								null_symbol=null_symbol))
-					else:
-						# Concatenation operator, for sure
-						automatons_stack.append(\
-							automaton_a.concatenate(\
-								automaton_b, 
-								null_symbol=null_symbol))
+		steps = []
+		for step in json.loads(text):
+			if isinstance(step, str):
+				steps.extend(Pipeline.parse(step))
 			else:
-				# Operand, create automaton and
-				# stack it
-				automatons_stack.append(self.__atomicautomaton__(
-					symbol=cur_state, 
-					start_state_id = "S" + str(counter),
-					end_state_id = "F" + str(counter)))
-
-		result = automatons_stack.pop()
-		self.alphabet = result.alphabet
-		self.transit_matrix = result.transit_matrix
-		self.initial_state = result.initial_state
-		self.final_states = result.final_states
-
-		return self
+				steps.append(Pipeline.check_step({
+					"op" : step["op"].lower(),
+					"args" : [str(arg) for arg in step.get("args", [])],
+					"options" : dict(step.get("options", {})),
+					"as" : step.get("as"),
+				}))
+
+		return steps
+
+	def __resolve__(self, reference):
+		if reference.startswith("@"):
+			if reference[1:] not in self.named:
+				raise ValueError("Unknown pipeline result \"" + reference + "\"")
+			return self.named[reference[1:]]
+		return Automaton(reference).freeze()
+
+	def run_step(self, step):
+		op = step["op"]
+		args = step.get("args", [])
+		options = dict(Pipeline.OPTIONS)
+		options.update(step.get("options", {}))
+
+		aut = self.automaton
+		null_symbol = options["-nullsymbol"]
+		isdfa = bool(options.get("-dfa"))
+
+		if op in {"load", "loadregex", "loadgrammar", "use"}:
+			if not args:
+				raise ValueError("Pipeline operation \"" + op + \
+					"\" needs an argument")
+
+			if op == "load" or op == "use":
+				aut = self.__resolve__(args[0])
+
+			elif op == "loadregex":
+				aut = Automaton(regex=args[0], 
+					null_symbol=null_symbol, 
+					regex_engine=options["-engine"])
 
-	def run(self, string, null_symbol="e"):
-		if self.transit_matrix is None:
-			return False
+			else:
+				aut = Automaton()
+				aut.load_grammar(
+					filepath=args[0], 
+					sep=options["-sep"], 
+					null_symbol=null_symbol, 
+					final_sink_id=options["-sinkid"],
+					sink_null_transitions=bool(options.get("-nosinknull")))
+
+			# No step modifies its operands in place, so every
+			# result may share the unchanged rows of its operands
+			aut.freeze()
+
+		elif aut is None:
+			raise ValueError("Pipeline operation \"" + op + \
+				"\" has no automaton to work on")
+
+		elif op == "print":
+			aut.print(gen_input_file=bool(options.get("-simpleout")))
+
+		elif op == "convnfa":
+			aut = aut.nfae_to_nfa(null_symbol=null_symbol)
 
-		# Initial state + expand null transitions
-		cur_state_set = {self.initial_state}.union(\
-			self.__getnulltransitions__(\
-				target=self.initial_state, 
-				null_symbol=null_symbol))
+		elif op == "compress":
+			aut = aut.compress_alphabet(null_symbol=null_symbol)
 
-		for symbol in string:
+		elif op == "convdfa":
+			if not options.get("-nfa"):
+				aut = aut.nfae_to_nfa(null_symbol=null_symbol)
+			if options["-workers"] is not None:
+				aut = aut.nfa_to_dfa(state_prefix=options["-stateprefix"],
+					algorithm="parallel",
+					workers=int(options["-workers"]))
+			else:
+				aut = aut.nfa_to_dfa(state_prefix=options["-stateprefix"],
+					algorithm="bitset" if options.get("-bitset") else "hash")
+
+		elif op == "grammar":
+			aut.grammar(dfa=isdfa, 
+				initial_symbol=options["-initialstate"], 
+				null_symbol=null_symbol, 
+				gen_output=True)
+
+		elif op == "compl":
+			aut = aut.complement(dfa=isdfa, sink_id=options["-sinkid"])
+
+		elif op == "min":
+			aut = aut.minimize(dfa=isdfa, sink_id=options["-sinkid"], 
+				null_symbol=null_symbol)
+
+		elif op == "kleenestar":
+			aut = aut.kleene_star(
+				initial_state_id=options["-startid"] or "KS",
+				final_state_id=options["-finalid"] or "KE",
+				null_symbol=null_symbol)
+
+		elif op in {"intersec", "union", "concat", "diff", "symdiff"}:
+			if not args:
+				raise ValueError("Pipeline operation \"" + op + \
+					"\" needs a second automaton")
+
+			aut_b = self.__resolve__(args[0])
+
+			if op == "intersec":
+				aut = aut.intersection(aut_b,
+					sink_id=options["-sinkid"],
+					null_symbol=null_symbol,
+					initial_state_id=options["-startid"] or "US",
+					final_state_id=options["-finalid"] or "UE",
+					algorithm="demorgan" if options.get("-demorgan") else "product",
+					dfa=isdfa)
+			elif op == "union":
+				aut = aut.union(aut_b,
+					null_symbol=null_symbol,
+					initial_state_id=options["-startid"] or "US",
+					final_state_id=options["-finalid"] or "UE",
+					algorithm="product" if options.get("-product") else "nfa",
+					dfa=isdfa)
+			elif op == "concat":
+				aut = aut.concatenate(aut_b, null_symbol=null_symbol)
+			elif op == "diff":
+				aut = aut.difference(aut_b, dfa=isdfa, null_symbol=null_symbol)
+			else:
+				aut = aut.symmetric_difference(aut_b, dfa=isdfa, 
+					null_symbol=null_symbol)
+
+		elif op == "equiv" or op == "includes":
+			if not args:
+				raise ValueError("Pipeline operation \"" + op + \
+					"\" needs a second automaton")
+
+			aut_b = self.__resolve__(args[0])
+			if op == "equiv":
+				res, counterexample = aut.equivalent(aut_b, 
+					dfa=isdfa, 
+					null_symbol=null_symbol)
+			else:
+				res, counterexample = aut.includes(aut_b, 
+					null_symbol=null_symbol)
+
+			Automaton.__printcheck__(op, res, counterexample)
+
+		elif op == "run" or op == "runfile":
+			if not args:
+				raise ValueError("Pipeline operation \"" + op + \
+					"\" needs an argument")
+
+			if op == "runfile":
+				res = aut.run_file(args[0], 
+					null_symbol=null_symbol, 
+					use_mmap=bool(options.get("-mmap")))
+			elif options.get("-lazy"):
+				res = aut.compile_lazy(null_symbol=null_symbol).run(args[0])
+			elif options.get("-bitset"):
+				res = aut.compile_bitset(null_symbol=null_symbol).run(args[0])
+			else:
+				res = aut.run(args[0], null_symbol=null_symbol)
 
-			# No remaining current states
-			if not cur_state_set:
-				return False
+			print("RUNNING TEST:\nInput" + \
+				(" file:" if op == "runfile" else " string:"),
+				args[0],
+				"\nstatus:",
+				"accepted" if res else "rejected")
 
-			# Expand cur symbol transitions
-			new_states_set = set()
-			for cur_state in cur_state_set:
-				if symbol in self.transit_matrix[cur_state]:
-					cur_symbol_set = self.transit_matrix[cur_state][symbol]
-					if type(cur_symbol_set) != type(set()):
-						cur_symbol_set = {cur_symbol_set}
-					new_states_set.update(cur_symbol_set)
+		elif op == "save":
+			if not args:
+				raise ValueError("Pipeline operation \"save\" needs a filepath")
+			aut.save(args[0], null_symbol=null_symbol)
 
-			cur_state_set = copy.copy(new_states_set)
+		else:
+			raise ValueError("Unknown pipeline operation \"" + op + "\"")
 
-			# Expand null transitions
-			for state in new_states_set:
-				cur_state_set.update(self.__getnulltransitions__(\
-					target=state, 
-					null_symbol=null_symbol))
+		self.automaton = aut
+		if step.get("as"):
+			self.named[step["as"]] = aut
 
-		if cur_state_set.intersection(self.final_states):
-			return True
+		return aut
 
-		return False
+	def run(self, steps):
+		"""
+			Run every step, in order, after checking the whole pipe-
+			line (see check()), so no step runs if a later one is
+			wrong.
+		"""
+		Pipeline.check(steps)
+		for step in steps:
+			self.run_step(step)
+		return self.automaton
 
 if __name__ == "__main__":
 	import sys
@@ -1265,17 +5642,63 @@ if __name__ == "__main__":
 			stricly the formal definitions from theoretical com-
 			puter science and formal languages.""".replace("\t\t\t", ""), 
 			"\n-----------------------------------------",
-			"\nusage:", sys.argv[0], "<filepath or regular expression*> <operation> [...] [-simpleout] [-run string]",
+			"\nusage:", sys.argv[0], "<filepath or regular expression*> <operation> [...] [-simpleout] [-run string [-lazy | -bitset]] [-runfile filepath [-mmap]] [-save filepath] [-stats [-nomemory]] [-compress]",
 			"\n(*Regular expression accepted only when <operation>=loadregex, otherwise give always filepath)",
 			"""
 			-----------------------------------------
 			The "-run" parameter can be used to pass a input string to the pro-
 			duced automaton, in order to check if it accepts or rejects it.
+			With "-lazy", the automaton is determinized on the fly while the
+			string is read (only the reached DFA states are built, and kept
+			in a bounded cache) instead of being simulated as a NFA. The
+			cache statistics are printed after the result. With "-bitset",
+			the automaton is simulated keeping its sets of states as int
+			bitsets (see BitsetMatcher), faster for large NFAs.
+			-----------------------------------------
+			The "-runfile" parameter does the same for the whole content of
+			a file, which is read in fixed-size chunks (or through a memory
+			map of the file, with "-mmap"), so it can be arbitrarily large.
 			-----------------------------------------
 			If "-simpleout" is enabled, the produced automaton will be printed
 			as this program input format, so it can be feed again with another
 			operation easily.
 			-----------------------------------------
+			If "-save filepath" is given, the produced automaton is also saved
+			in a compact binary format. Binary files can be given to any ope-
+			ration in place of the text input files.
+			-----------------------------------------
+			With "-stats", the wall time, peak memory and work counters (sta-
+			tes created, subsets explored, null closures and transitions) of
+			each internal phase of the operation (nfae_to_nfa, nfa_to_dfa,
+			sink state insertion, equivalence finding, trimming, ...) are
+			printed to stderr at the end (see AutomatonStats). Tracing the
+			memory slows everything down, so it can be disabled with
+			"-nomemory".
+			-----------------------------------------
+			With "-compress", the symbols of the input automaton which behave
+			identically in every state are grouped into classes, and the op-
+			eration works over a single symbol per class (see Automaton.com-
+			press_alphabet()), which is faster for large alphabets. The print-
+			ed automaton keeps the classes, unless "-simpleout" is given.
+			-----------------------------------------
+			Pipeline mode: if <operation> is "pipeline", the first argument is
+			either a sequence of operations, separated by ";", or the path
+			of a script file with one operation per line (or a JSON list of
+			them, for ".json" files). All operations run in this same pro-
+			cess, each one over the result of the previous one, with no
+			re-parsing between them. Each operation is written as
+			
+				<operation> [arguments] [flags and options] [as <name>]
+
+			where "as <name>" keeps the result, which may be given later as
+			"@name" wherever a second automaton filepath is expected, or
+			be made current again with "use @name". Extra operations are
+			"load <filepath>", "run <string>", "runfile <filepath>",
+			"compress" (see "-compress") and "save <filepath>". Example:
+
+				"loadregex (a|b)*abb; convnfa; convdfa -nfa; min -dfa as m;
+				intersec ../test-cases/7.in; run aabb"
+			-----------------------------------------
 			Operation list: <operation> can be (case insensitive):
 
 			0. print: 
@@ -1300,6 +5723,10 @@ if __name__ == "__main__":
 				[-nfa]: tells program that the input file is already a NFA 
 				(Non-Deterministic Finite Automaton), in order to speed up
 				the conversion process.
+				[-bitset]: keep the subsets of NFA states as int bitsets
+				while converting, which is faster for large NFAs.
+				[-workers n]: same as "-bitset", but with the subsets
+				expanded in parallel by n worker processes.
 
 				2.1. Description:
 				Transform a given NFAe (Non-Deterministic Finite Automaton with
@@ -1371,12 +5798,20 @@ if __name__ == "__main__":
 				parameter above, but this time for the final states. The de-
 				fault name stants for "Union End".
 
+				[-dfa, disabled by default]: tells program that both input
+				files are already DFAs (Deterministic Finite Automatons).
+				[-demorgan, disabled by default]: use the DeMorgan's law
+				construction described below instead of the product one.
+
 				7.2. Description:
-				Promote a intersection between two given automatons. This
-				is equivalent to the regular expression ~(~r1 + ~r2), where
-				r1 and r2 are the generic regular expressions represented
-				by the given automatons. This uses the DeMorgan's law, whi-
-				ch tells that 
+				Promote a intersection between two given automatons. By de-
+				fault, a DFA is built by product construction: each state
+				is a pair of states, one of each automaton, and only the
+				pairs reachable from the pair of initial states are built.
+				With "-demorgan", this is equivalent to the regular expres-
+				sion ~(~r1 + ~r2), where r1 and r2 are the generic regular
+				expressions represented by the given automatons. This uses
+				the DeMorgan's law, which tells that 
 			
 					intersection := complement(
 					    union(
@@ -1405,6 +5840,10 @@ if __name__ == "__main__":
 				[-finalid final_state_name, default is "UF"]: same as the
 				parameter above, but this time for the final states. The de-
 				fault name stants for "Union End".
+				[-product, disabled by default]: build the union by product
+				construction (see intersec), so the result is a DFA.
+				[-dfa, disabled by default]: with "-product", tells program
+				that both input files are already DFAs.
 
 				8.2. Description:
 				Promote a union between two given automatons. This
@@ -1461,6 +5900,10 @@ if __name__ == "__main__":
 				[-min]: should output automaton be minimized? Please note
 				that this argument imply in -dfa also, so giving both is
 				redundant.
+				[-engine name, default is "thompson"]: how the regular expres-
+				sion is converted. "thompson" builds a NFAe by Thompson's con-
+				struction. "derivatives" builds a (nearly minimal) DFA direct-
+				ly, by Brzozowski's derivatives, so "-dfa" is implied.
 
 				11.2: Description:
 				Transform a given regular expression pattern into a Finite
@@ -1474,6 +5917,46 @@ if __name__ == "__main__":
 					Concatenation 	<no symbol needed>
 
 				Parenthesis (and also nested parenthesis) are allowed.
+				Character classes match a single symbol each:
+
+					CLASS		MATCHES
+					[abc], [a-z]	any listed symbol or range
+					[^abc]		any symbol not listed
+					.		any symbol
+					\\c		the symbol c itself
+
+				The null symbol is never matched by a class, and input
+				strings with it are always rejected (use -nullsymbol to
+				match the character "e").
+
+			12. diff / symdiff
+				12.0. Mandatory arguments:
+				<filepath2>: path of the second automaton.
+
+				12.1. Extra arguments:
+				[-nullsymbol symbol, default is "e"]
+				[-dfa, disabled by default]: tells program that both input
+				files are already DFAs.
+
+				12.2. Description:
+				Build, by product construction (see intersec), a DFA accep-
+				ting the strings accepted by the first automaton but not by
+				the second one (diff), or by exactly one of them (symdiff).
+
+			13. equiv / includes
+				13.0. Mandatory arguments:
+				<filepath2>: path of the second automaton.
+
+				13.1. Extra arguments:
+				[-nullsymbol symbol, default is "e"]
+				[-dfa, disabled by default]: tells program that both input
+				files are already DFAs (equiv only).
+
+				13.2. Description:
+				Check, without building any automaton, if both automatons
+				accept the same language (equiv) or if the language of the
+				first one includes the language of the second one (includes).
+				If not, a shortest counterexample string is printed.
 			-----------------------------------------
 			""".replace("\t\t\t", ""))
 		exit(1)
@@ -1481,15 +5964,46 @@ if __name__ == "__main__":
 	# Load up some program arguments
 	filepath = sys.argv[1]
 	operation = sys.argv[2].lower()
+
+	stats = None
+	if "-stats" in sys.argv:
+		stats = AutomatonStats(memory=("-nomemory" not in sys.argv)).start()
+
+	if operation == "pipeline":
+		try:
+			if os.path.isfile(filepath):
+				steps = Pipeline.parse_file(filepath)
+			else:
+				steps = Pipeline.parse(filepath)
+
+			Pipeline().run(steps)
+		except ValueError as error:
+			print("Error:", error)
+			exit(1)
+
+		if stats is not None:
+			stats.stop().print(file=sys.stderr)
+		exit(0)
 	simpleout = ("-simpleout" in sys.argv)
 	isdfa = ("-dfa" in sys.argv)
 	isnfa = ("-nfa" in sys.argv)
+	lazyrun = ("-lazy" in sys.argv)
+
+	try:
+		savepath = sys.argv[1 + sys.argv.index("-save")]
+	except:
+		savepath = None
 
 	try:
 		input_string = sys.argv[1 + sys.argv.index("-run")]
 	except:
 		input_string = None
 
+	try:
+		input_filepath = sys.argv[1 + sys.argv.index("-runfile")]
+	except:
+		input_filepath = None
+
 	try:
 		null_symbol = sys.argv[1 + sys.argv.index("-nullsymbol")]
 	except:
@@ -1514,6 +6028,9 @@ if __name__ == "__main__":
 	if operation not in {"loadregex", "loadgrammar"}:
 		aut = Automaton(filepath)
 
+		if "-compress" in sys.argv:
+			aut = aut.compress_alphabet(null_symbol=null_symbol)
+
 	# Check selected operation
 	if operation == "print":
 		aut.print(gen_input_file=simpleout)
@@ -1529,11 +6046,20 @@ if __name__ == "__main__":
 			state_prefix = "DFA"
 
 		if not isnfa:
-			aut = aux.nfae_to_nfa(null_symbol=null_symbol)
+			aut = aut.nfae_to_nfa(null_symbol=null_symbol)
 
-		aut = aut.nfa_to_dfa(
-			null_symbol=null_symbol, 
-			state_prefix=state_prefix)
+		try:
+			workers = int(sys.argv[1 + sys.argv.index("-workers")])
+		except:
+			workers = None
+
+		if workers is not None:
+			aut = aut.nfa_to_dfa(state_prefix=state_prefix, 
+				algorithm="parallel", 
+				workers=workers)
+		else:
+			aut = aut.nfa_to_dfa(state_prefix=state_prefix,
+				algorithm="bitset" if "-bitset" in sys.argv else "hash")
 
 		aut.print(gen_input_file=simpleout)
 
@@ -1572,7 +6098,7 @@ if __name__ == "__main__":
 		aut.print(gen_input_file=simpleout)
 
 	elif operation == "min":
-		aut = aut.minimize(dfa=isdfa, sink_id=sinkid)
+		aut = aut.minimize(dfa=isdfa, sink_id=sinkid, null_symbol=null_symbol)
 		aut.print(gen_input_file=simpleout)
 
 	elif operation == "intersec":
@@ -1589,7 +6115,9 @@ if __name__ == "__main__":
 			sink_id=sinkid,
 			null_symbol=null_symbol,
 			initial_state_id=startid,
-			final_state_id=finalid)
+			final_state_id=finalid,
+			algorithm="demorgan" if "-demorgan" in sys.argv else "product",
+			dfa=isdfa)
 
 		aut.print(gen_input_file=simpleout)
 
@@ -1606,7 +6134,36 @@ if __name__ == "__main__":
 			automaton=aut_b,
 			null_symbol=null_symbol,
 			initial_state_id=startid,
-			final_state_id=finalid)
+			final_state_id=finalid,
+			algorithm="product" if "-product" in sys.argv else "nfa",
+			dfa=isdfa)
+
+		aut.print(gen_input_file=simpleout)
+
+	elif operation in {"equiv", "includes"}:
+		aut_b = Automaton(sys.argv[3])
+
+		if operation == "equiv":
+			res, counterexample = aut.equivalent(aut_b, 
+				dfa=isdfa, 
+				null_symbol=null_symbol)
+		else:
+			res, counterexample = aut.includes(aut_b, 
+				null_symbol=null_symbol)
+
+		Automaton.__printcheck__(operation, res, counterexample)
+
+	elif operation in {"diff", "symdiff"}:
+		aut_b = Automaton(sys.argv[3])
+
+		if operation == "diff":
+			aut = aut.difference(aut_b, 
+				dfa=isdfa, 
+				null_symbol=null_symbol)
+		else:
+			aut = aut.symmetric_difference(aut_b, 
+				dfa=isdfa, 
+				null_symbol=null_symbol)
 
 		aut.print(gen_input_file=simpleout)
 
@@ -1634,25 +6191,62 @@ if __name__ == "__main__":
 		aut.print(gen_input_file=simpleout)
 
 	elif operation == "loadregex":
-		aut = Automaton(regex=sys.argv[1])
+		try:
+			regex_engine = sys.argv[1 + sys.argv.index("-engine")].lower()
+		except:
+			regex_engine = "thompson"
+
+		aut = Automaton(regex=sys.argv[1], 
+			null_symbol=null_symbol, 
+			regex_engine=regex_engine)
 
 		minarg = ("-min" in sys.argv)
 		
-		if minarg or isdfa:
+		if (minarg or isdfa) and not aut.is_deterministic(null_symbol):
 			aut = aut.nfae_to_nfa(null_symbol=null_symbol)
 			aut = aut.nfa_to_dfa()
 
+		# The automaton is known to be a DFA by now, so
+		# minimize() won't determinize it once more
 		if minarg:
-			aut = aut.minimize(sink_id=sinkid)
+			aut = aut.minimize(sink_id=sinkid, null_symbol=null_symbol)
 		
 		aut.print(gen_input_file=simpleout)
 	else:
 		print("Error: unknown operation \"" + operation + "\"")
 		input_string = None
+		input_filepath = None
+		savepath = None
+
+	if savepath is not None:
+		aut.save(savepath, null_symbol=null_symbol)
 
 	if input_string is not None:
-		res = aut.run(input_string)
+		if lazyrun:
+			lazy_matcher = aut.compile_lazy(null_symbol=null_symbol)
+			res = lazy_matcher.run(input_string)
+		elif "-bitset" in sys.argv:
+			res = aut.compile_bitset(null_symbol=null_symbol).run(input_string)
+		else:
+			res = aut.run(input_string, null_symbol=null_symbol)
+
 		print("\nRUNNING TEST:\nInput string:", 
 			input_string, 
 			"\nstatus:", 
 			"accepted" if res else "rejected")
+
+		if lazyrun:
+			print("lazy DFA cache:", lazy_matcher.stats())
+
+	if input_filepath is not None:
+		res = aut.run_file(input_filepath, 
+			null_symbol=null_symbol, 
+			use_mmap=("-mmap" in sys.argv))
+
+		print("\nRUNNING TEST:\nInput file:", 
+			input_filepath, 
+			"\nstatus:", 
+			"accepted" if res else "rejected")
+
+	if stats is not None:
+		stats.stop().print(file=sys.stderr)
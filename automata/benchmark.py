@@ -0,0 +1,642 @@
+from Automata.automata import Automaton, MultiPatternMatcher
+from collections import OrderedDict
+import itertools
+import platform
+import random
+import json
+import time
+import sys
+import re
+
+"""
+	Benchmark suite for the Automaton operations. Random
+	automata and regular expressions are generated with a
+	fixed seed, so every run measures exactly the same
+	inputs, and each operation is timed over a sweep of
+	sizes. Results can be saved as JSON and compared with
+	a previous run, in order to catch performance regres-
+	sions between releases.
+
+	There's also the subset construction benchmark (the
+	"-subset" mode), which compares the hash-keyed subset
+	lookup against the original linear scan lookup, and
+	cross-checks both results, and the "-check" mode, which
+	only cross-checks the algorithms that must agree with
+	each other (see cross_check).
+"""
+
+# Symbols used by the random automata and regexes. The null
+# symbol ("e") and the regex operators are left out.
+REGEX_SYMBOLS = "abcdfghijklmnopqrstuvwxyz"
+
+def random_automaton(num_states, alphabet_size, density=1.0,
+	deterministic=False, final_ratio=0.1, null_ratio=0.0,
+	locality=None, backbone=False, null_symbol="e", seed=0):
+	"""
+		Generate a random automaton with "num_states" states
+		(named q0, q1, ...) over an alphabet of "alphabet_size"
+		symbols (named s0, s1, ...).
+
+		density		: probability of a transition being defined
+				in each cell of the transition matrix. For NFAs,
+				each defined cell gets between 1 and 3 target
+				states.
+
+		deterministic	: generate a DFA (cells are a single state
+				or undefined) instead of a NFA.
+
+		final_ratio	: probability of each state being final.
+
+		null_ratio	: probability of each state having null tran-
+				sitions (to 1 up to 3 states). If greater than
+				zero, "null_symbol" is added to the alphabet and
+				the result is a NFAe.
+
+		locality	: if given, the targets of state "qi" are chosen
+				only among "qi" up to "q(i + locality)" (wrapping
+				around). This keeps the subsets reached by the
+				subset construction small, so random NFAs can be
+				determinized without exponential blowup.
+
+		backbone	: add a transition from each "qi" to "q(i + 1)",
+				by a random symbol, so every state is reachable
+				from the initial one.
+	"""
+	rng = random.Random(seed)
+
+	states = ["q" + str(i) for i in range(num_states)]
+	alphabet = ["s" + str(i) for i in range(alphabet_size)]
+
+	def pick_targets(i, count):
+		if locality is None:
+			return rng.sample(states, min(count, num_states))
+		return {states[(i + rng.randint(0, locality)) % num_states] \
+			for _ in range(count)}
+
+	transit_matrix = OrderedDict()
+	for i, state in enumerate(states):
+		transit_matrix[state] = {}
+		for symbol in alphabet:
+			if rng.random() < density:
+				if deterministic:
+					transit_matrix[state][symbol] = pick_targets(i, 1).pop()
+				else:
+					transit_matrix[state][symbol] = \
+						set(pick_targets(i, rng.randint(1, 3)))
+			else:
+				transit_matrix[state][symbol] = set()
+
+		if backbone and i + 1 < num_states:
+			symbol = rng.choice(alphabet)
+			if deterministic:
+				transit_matrix[state][symbol] = states[i + 1]
+			else:
+				transit_matrix[state][symbol].add(states[i + 1])
+
+		if null_ratio > 0:
+			transit_matrix[state][null_symbol] = \
+				set(pick_targets(i, rng.randint(1, 3))) \
+				if rng.random() < null_ratio else set()
+
+	if null_ratio > 0:
+		alphabet.append(null_symbol)
+
+	final_states = {state for state in states if rng.random() < final_ratio}
+
+	return Automaton(
+		alphabet=alphabet,
+		transit_matrix=transit_matrix,
+		initial_state=states[0],
+		final_states=final_states)
+
+def random_regex(num_leaves, alphabet_size, or_ratio=0.3, star_ratio=0.2,
+	class_ratio=0.0, seed=0):
+	"""
+		Generate a random regex (in the syntax of Automaton.load_regex)
+		with "num_leaves" symbol occurrences, over the first "alphabet_
+		size" symbols of REGEX_SYMBOLS. Adjacent subexpressions are com-
+		bined at random, by union with probability "or_ratio" or by
+		concatenation otherwise, and each combination gets a Kleene
+		Star with probability "star_ratio". Each symbol occurrence is
+		replaced by a character class (a range, a negated symbol or
+		".") with probability "class_ratio".
+	"""
+	rng = random.Random(seed)
+	symbols = REGEX_SYMBOLS[:max(1, min(alphabet_size, len(REGEX_SYMBOLS)))]
+
+	def leaf():
+		symbol = rng.choice(symbols)
+		if class_ratio <= 0 or rng.random() >= class_ratio:
+			return symbol
+
+		kind = rng.randrange(3)
+		if kind == 0:
+			return "[" + symbol + "-" + max(symbol, rng.choice(symbols)) + "]"
+		if kind == 1:
+			return "[^" + symbol + "]"
+		return "."
+
+	items = [leaf() for _ in range(num_leaves)]
+	while len(items) > 1:
+		i = rng.randrange(len(items) - 1)
+
+		if rng.random() < or_ratio:
+			combined = "(" + items[i] + "|" + items[i + 1] + ")"
+		else:
+			combined = "(" + items[i] + items[i + 1] + ")"
+
+		if rng.random() < star_ratio:
+			combined = combined + "*"
+
+		items[i:i + 2] = [combined]
+
+	return items[0]
+
+def random_strings(alphabet, count, length, seed=0):
+	rng = random.Random(seed)
+	return [[rng.choice(alphabet) for _ in range(length)] for _ in range(count)]
+
+def all_strings(alphabet, max_length):
+	# Every string (as a list of symbols) of up to "max_length"
+	# symbols, shortest first
+	return [list(string) for length in range(max_length + 1) \
+		for string in itertools.product(alphabet, repeat=length)]
+
+def timeit(func, *args, **kwargs):
+	start = time.perf_counter()
+	result = func(*args, **kwargs)
+	return result, time.perf_counter() - start
+
+def best_of(repeat, func, *args, **kwargs):
+	result, best = timeit(func, *args, **kwargs)
+	for _ in range(repeat - 1):
+		result, elapsed = timeit(func, *args, **kwargs)
+		best = min(best, elapsed)
+	return result, best
+
+def run_suite(sizes, alphabet_size=2, density=0.5, null_ratio=0.2,
+	locality=4, repeat=1, run_count=100, run_length=20, seed=0):
+	"""
+		Time every benchmarked operation for each size in "sizes".
+		Returns a list of dictionaries with the operation name, the
+		input size, the best time of "repeat" runs (in seconds) and
+		the number of states of the result, if any.
+
+		Inputs per size n:
+			- a NFAe with n states ("density", "null_ratio" and
+			"locality" as in random_automaton, with a backbone),
+			for nfae_to_nfa, nfa_to_dfa (of its NFA) and run;
+			- a complete DFA with n states, for minimize, comple-
+			ment, intersection (with a fixed 16 state DFA, so the
+			product has at most 16n states) and run;
+			- a regex with n symbol occurrences, for load_regex.
+	"""
+	results = []
+
+	def record(operation, size, elapsed, result=None):
+		entry = {
+			"operation" : operation,
+			"size" : size,
+			"seconds" : elapsed,
+		}
+		if isinstance(result, Automaton):
+			entry["result_states"] = len(result.transit_matrix)
+
+		results.append(entry)
+		print("{:<24} {:>8} {:>12.4f} {:>10}".format(
+			operation, size, elapsed, entry.get("result_states", "")),
+			file=sys.stderr)
+
+	print("{:<24} {:>8} {:>12} {:>10}".format(
+		"operation", "size", "seconds", "states"), file=sys.stderr)
+
+	small_dfa = random_automaton(16, alphabet_size,
+		deterministic=True, final_ratio=0.5, seed=seed + 1)
+
+	for num_states in sizes:
+		nfae = random_automaton(num_states, alphabet_size,
+			density=density,
+			null_ratio=null_ratio,
+			locality=locality,
+			backbone=True,
+			seed=seed)
+
+		dfa = random_automaton(num_states, alphabet_size,
+			deterministic=True,
+			final_ratio=0.3,
+			seed=seed)
+
+		nfa, elapsed = best_of(repeat, nfae.nfae_to_nfa)
+		record("nfae_to_nfa", num_states, elapsed, nfa)
+
+		result, elapsed = best_of(repeat, nfa.nfa_to_dfa)
+		record("nfa_to_dfa", num_states, elapsed, result)
+
+		result, elapsed = best_of(repeat, dfa.minimize, dfa=True)
+		record("minimize", num_states, elapsed, result)
+
+		result, elapsed = best_of(repeat, dfa.complement, dfa=True)
+		record("complement", num_states, elapsed, result)
+
+		result, elapsed = best_of(repeat, dfa.intersection, small_dfa, dfa=True)
+		record("intersection", num_states, elapsed, result)
+
+		regex = random_regex(num_states, alphabet_size, seed=seed)
+		result, elapsed = best_of(repeat, Automaton, regex=regex)
+		record("load_regex", num_states, elapsed, result)
+
+		alphabet = [symbol for symbol in dfa.alphabet]
+		strings = random_strings(alphabet, run_count, run_length, seed=seed)
+
+		def run_all(aut):
+			return [aut.run(string) for string in strings]
+
+		_, elapsed = best_of(repeat, run_all, dfa)
+		record("run[dfa]", num_states, elapsed)
+
+		_, elapsed = best_of(repeat, run_all, nfae)
+		record("run[nfae]", num_states, elapsed)
+
+	return results
+
+def compare(results, baseline, tolerance=1.5, min_seconds=0.01):
+	"""
+		Compare results against a baseline (both as returned by
+		run_suite). Returns the list of (operation, size, baseline
+		seconds, current seconds) which got slower by more than
+		"tolerance" times. Timings below "min_seconds" are ignored,
+		as they are mostly noise.
+	"""
+	baseline_times = {(entry["operation"], entry["size"]) : entry["seconds"] \
+		for entry in baseline}
+
+	regressions = []
+	for entry in results:
+		key = (entry["operation"], entry["size"])
+		if key not in baseline_times:
+			continue
+
+		old_time = baseline_times[key]
+		if entry["seconds"] >= min_seconds and \
+			entry["seconds"] > tolerance * max(old_time, min_seconds):
+			regressions.append(key + (old_time, entry["seconds"]))
+
+	return regressions
+
+def cross_check(sizes, alphabet_size=2, count=20, density=0.5,
+	null_ratio=0.2, locality=4, max_length=6, seed=0):
+	"""
+		Cross-check the algorithms that must agree with each other,
+		on "count" random inputs (seeds "seed", "seed + 1", ...) per
+		size n in "sizes". Languages are compared over every string
+		of up to "max_length" symbols:
+
+			- subset construction: "hash", "linear" and "bitset" on
+			the NFA (from nfae_to_nfa) of a random NFAe with n sta-
+			tes. They number the subsets in the same order, so their
+			results must be identical, and accept the language of the
+			NFAe, as must the matchers of compile(), compile_lazy(),
+			compile_bitset(), to_compact() and run_many();
+			- minimization: "hopcroft" and "table" on a random DFA
+			with n states, on its complement, on the DFA of the NFAe
+			and on the complement of a NFAe with mostly final states,
+			which must keep their language and agree on the number of
+			states;
+			- regular expressions: the "thompson" and "derivatives"
+			engines on a random regex with n symbol occurrences (some
+			of them character classes), against Python's re module,
+			and the number of states of their minimal DFAs. Strings
+			with the null symbol ("e") must be rejected by both. A
+			MultiPatternMatcher of two regexes, with a tiny cache and
+			with the default one, must agree with re as well, and
+			finditer() must find the same matches in a random text
+			with both caches.
+
+		Every failure is printed as it shows up, and the list of all
+		of them is returned, as (check, size, seed) tuples.
+	"""
+	failures = []
+
+	def language(aut, strings):
+		return [bool(aut.run(string)) for string in strings]
+
+	def states(aut):
+		return len(aut.__materializesink__().transit_matrix)
+
+	# Character classes never match the null symbol, so every
+	# engine and matcher must reject "hello" (and accept "hllo")
+	for regex in ("[a-z]+", ".*"):
+		aut = Automaton()
+		aut.load_regex(regex)
+		derivatives = Automaton()
+		derivatives.load_regex(regex, engine="derivatives")
+
+		matchers = [aut, derivatives, aut.minimize(), derivatives.minimize(),
+			aut.nfae_to_nfa().nfa_to_dfa(), aut.compile(), aut.compile_lazy(),
+			aut.compile_bitset(), aut.to_compact()]
+
+		strings = ["hello", "hllo"]
+		results = [language(matcher, strings) for matcher in matchers] + \
+			[[bool(res) for res in aut.compile().run_many(strings)]]
+
+		if any(result != [False, True] for result in results):
+			failures.append(("null symbol in " + regex, None, None))
+			print("Error: null symbol results differ for", regex)
+
+	# Minimizing the empty language must keep the initial state,
+	# either directly or through the complement of an automaton
+	# accepting everything (i.e. with an implicit accepting sink)
+	everything = Automaton(alphabet=["a", "b"],
+		transit_matrix={"q0" : {"a" : "q0", "b" : "q0"}},
+		initial_state="q0",
+		final_states={"q0"})
+
+	for algorithm in ("hopcroft", "table"):
+		for name, aut in (
+			("empty language", everything.complement(dfa=True)),
+			("frozen empty language", everything.copy().freeze().complement()),
+			("complete language", everything.complement().complement())):
+			try:
+				passed = language(aut.minimize(algorithm=algorithm), 
+					[[], ["a", "b"]]) == language(aut, [[], ["a", "b"]])
+			except KeyError:
+				passed = False
+
+			if not passed:
+				failures.append(("minimize[" + algorithm + "] of " + name, 
+					None, None))
+				print("Error: minimize[" + algorithm + "] of", name, 
+					"results differ")
+
+	for num_states in sizes:
+		for case_seed in range(seed, seed + count):
+			def check(name, passed):
+				if not passed:
+					failures.append((name, num_states, case_seed))
+					print("Error:", name, "results differ (size " + \
+						str(num_states) + ", seed " + str(case_seed) + ")")
+
+			# Subset construction and matchers
+			nfae = random_automaton(num_states, alphabet_size,
+				density=density,
+				null_ratio=null_ratio,
+				locality=locality,
+				backbone=True,
+				seed=case_seed)
+
+			symbols = [symbol for symbol in nfae.alphabet if symbol != "e"]
+			strings = all_strings(symbols, max_length)
+			expected = language(nfae, strings)
+
+			nfa = nfae.nfae_to_nfa()
+			check("nfae_to_nfa", language(nfa, strings) == expected)
+
+			dfa_hash = nfa.nfa_to_dfa(algorithm="hash")
+			dfa_linear = nfa.nfa_to_dfa(algorithm="linear")
+			dfa_bitset = nfa.nfa_to_dfa(algorithm="bitset")
+
+			check("nfa_to_dfa[hash]", language(dfa_hash, strings) == expected)
+			for name, result in (("linear", dfa_linear), ("bitset", dfa_bitset)):
+				check("nfa_to_dfa[" + name + "]",
+					result.transit_matrix == dfa_hash.transit_matrix and \
+					result.final_states == dfa_hash.final_states)
+
+			for name, matcher in (
+				("compile", nfae.compile()),
+				("compile_lazy", nfae.compile_lazy(cache_size=8)),
+				("compile_bitset", nfae.compile_bitset()),
+				("to_compact", nfae.to_compact())):
+				check(name, language(matcher, strings) == expected)
+
+			check("run_many[nfa]", 
+				[bool(res) for res in nfae.compile().run_many(strings)] == expected)
+			check("run_many[dfa]", 
+				[bool(res) for res in dfa_hash.compile().run_many(strings)] == expected)
+
+			# Minimization
+			dfa = random_automaton(num_states, alphabet_size,
+				density=density if case_seed % 2 else 1.0,
+				deterministic=True,
+				final_ratio=0.3,
+				seed=case_seed)
+
+			# Mostly final states, so its complement often accepts
+			# nothing at all
+			dense_nfae = random_automaton(num_states, alphabet_size,
+				density=density,
+				null_ratio=null_ratio,
+				final_ratio=0.8,
+				seed=case_seed)
+
+			for name, aut in (
+				("dfa", dfa),
+				("complement", dfa.complement(dfa=True)),
+				("subset", dfa_hash),
+				("complement of nfae", dense_nfae.complement())):
+				expected = language(aut, strings)
+				hopcroft = aut.minimize(dfa=True, algorithm="hopcroft")
+				table = aut.minimize(dfa=True, algorithm="table")
+
+				check("minimize[hopcroft] of " + name, 
+					language(hopcroft, strings) == expected)
+				check("minimize[table] of " + name, 
+					language(table, strings) == expected)
+				check("minimize states of " + name, 
+					states(hopcroft) == states(table))
+
+			# Regular expressions. The input strings also have a
+			# symbol out of the regex and the null symbol, so ne-
+			# gated classes and "." are checked as well
+			regex = random_regex(num_states, alphabet_size, 
+				class_ratio=0.2, 
+				seed=case_seed)
+
+			symbols = sorted(set(REGEX_SYMBOLS[:alphabet_size])) + ["0", "e"]
+			strings = ["".join(string) for string in \
+				all_strings(symbols, max_length)]
+
+			pattern = re.compile(regex, re.DOTALL)
+			expected = ["e" not in string and \
+				pattern.fullmatch(string) is not None for string in strings]
+
+			minimal_states = []
+			for engine in ("thompson", "derivatives"):
+				aut = Automaton()
+				aut.load_regex(regex, engine=engine)
+				check("load_regex[" + engine + "] " + regex, 
+					language(aut, strings) == expected)
+
+				minimal = aut.minimize()
+				check("minimize of load_regex[" + engine + "] " + regex, 
+					language(minimal, strings) == expected)
+				minimal_states.append(states(minimal))
+
+			check("minimal states of " + regex, 
+				minimal_states[0] == minimal_states[1])
+
+			# Multiple patterns at once, with a cache small enough
+			# to be flushed all the time (thrashing or not)
+			other_regex = random_regex(num_states, alphabet_size, 
+				class_ratio=0.2, 
+				seed=case_seed + count)
+			other_pattern = re.compile(other_regex, re.DOTALL)
+			other_expected = ["e" not in string and \
+				other_pattern.fullmatch(string) is not None \
+				for string in strings]
+
+			for cache_size, min_symbols_per_state in ((2, 0), (2, 10), (4096, 10)):
+				matcher = MultiPatternMatcher([regex, other_regex], 
+					cache_size=cache_size, 
+					min_symbols_per_state=min_symbols_per_state)
+				check("MultiPatternMatcher[" + str(cache_size) + ", " + \
+					str(min_symbols_per_state) + "] " + regex + ", " + other_regex,
+					[matcher.match(string) for string in strings] == \
+					[frozenset(pattern_id for pattern_id, matched in \
+						enumerate((first, second)) if matched) \
+						for first, second in zip(expected, other_expected)])
+
+			# Search over a long text, whose matches must not depend
+			# on the cache size either
+			aut = Automaton()
+			aut.load_regex(regex)
+			text = "".join(random.Random(case_seed).choice(symbols) \
+				for _ in range(2000))
+
+			check("finditer " + regex, 
+				list(aut.compile_search(cache_size=2).finditer(text)) == \
+				list(aut.compile_search().finditer(text)))
+
+	return failures
+
+def bench_nfa_to_dfa(sizes, alphabet_size=2, deterministic=True,
+	max_linear=2000, seed=0):
+
+	print("{:>8} {:>10} {:>12} {:>12}".format(
+		"states", "dfa states", "hash (s)", "linear (s)"))
+
+	for num_states in sizes:
+		aut = random_automaton(num_states, alphabet_size,
+			density=1.0 if deterministic else 0.5,
+			deterministic=deterministic,
+			seed=seed)
+
+		dfa_hash, time_hash = timeit(aut.nfa_to_dfa, algorithm="hash")
+
+		# The linear scan is quadratic in the number of DFA
+		# states, so it is skipped for large automata
+		time_linear = None
+		if len(dfa_hash.transit_matrix) <= max_linear:
+			dfa_linear, time_linear = timeit(aut.nfa_to_dfa, algorithm="linear")
+
+			if dfa_linear.transit_matrix != dfa_hash.transit_matrix or \
+				dfa_linear.final_states != dfa_hash.final_states:
+				print("Error: subset construction results differ for",
+					num_states, "states")
+				exit(2)
+
+		print("{:>8} {:>10} {:>12.4f} {:>12}".format(
+			num_states,
+			len(dfa_hash.transit_matrix),
+			time_hash,
+			"{:.4f}".format(time_linear) if time_linear is not None else "skipped"))
+
+if __name__ == "__main__":
+	if len(sys.argv) < 2:
+		print("usage:", sys.argv[0],
+			"<state count list, e.g. 100,1000,50000> [-alphabet size] [-seed seed]",
+			"\n\t[-density d] [-nullratio r] [-locality w] [-repeat k]",
+			"\n\t[-json output filepath] [-compare baseline filepath [-tolerance t]]",
+			"\n\t[-subset [-nfa] [-maxlinear dfa_state_count]]",
+			"\n\t[-check [-count n] [-maxlength l]]",
+			"""
+			-----------------------------------------
+			By default, runs the whole benchmark suite (see run_suite) for
+			each given size, printing a table to stderr. With "-json", the
+			results are also saved to the given file and, with "-compare",
+			checked against a previous JSON output: any operation slower
+			than "tolerance" (default 1.5) times its baseline is reported
+			and the program exits with status 3.
+
+			With "-subset", only the subset construction benchmark is run,
+			comparing the hash-keyed subset lookup with the original linear
+			scan (random DFAs are used as input, or NFAs with "-nfa").
+
+			With "-check", nothing is timed: subset construction, minimiza-
+			tion and the regex engines are cross-checked on "count" (default
+			20) random inputs per size, comparing their languages over every
+			string of up to "maxlength" (default 6) symbols (see cross_check).
+			The program exits with status 2 if any check fails.
+			-----------------------------------------
+			""".replace("\t\t\t", ""))
+		exit(1)
+
+	sizes = [int(size) for size in sys.argv[1].split(",")]
+
+	def get_arg(name, default, cast):
+		try:
+			return cast(sys.argv[1 + sys.argv.index(name)])
+		except:
+			return default
+
+	alphabet_size = get_arg("-alphabet", 2, int)
+	seed = get_arg("-seed", 0, int)
+
+	if "-check" in sys.argv:
+		failures = cross_check(sizes,
+			alphabet_size=alphabet_size,
+			count=get_arg("-count", 20, int),
+			density=get_arg("-density", 0.5, float),
+			null_ratio=get_arg("-nullratio", 0.2, float),
+			locality=get_arg("-locality", 4, int),
+			max_length=get_arg("-maxlength", 6, int),
+			seed=seed)
+
+		if failures:
+			exit(2)
+
+		print("All checks passed")
+		exit(0)
+
+	if "-subset" in sys.argv:
+		bench_nfa_to_dfa(sizes,
+			alphabet_size=alphabet_size,
+			deterministic=("-nfa" not in sys.argv),
+			max_linear=get_arg("-maxlinear", 2000, int),
+			seed=seed)
+		exit(0)
+
+	params = {
+		"alphabet_size" : alphabet_size,
+		"density" : get_arg("-density", 0.5, float),
+		"null_ratio" : get_arg("-nullratio", 0.2, float),
+		"locality" : get_arg("-locality", 4, int),
+		"repeat" : get_arg("-repeat", 1, int),
+		"seed" : seed,
+	}
+
+	results = run_suite(sizes, **params)
+
+	output_path = get_arg("-json", None, str)
+	if output_path is not None:
+		with open(output_path, "w") as f:
+			json.dump({
+				"meta" : dict(params,
+					sizes=sizes,
+					python=platform.python_version()),
+				"results" : results,
+			}, f, indent=1)
+
+	baseline_path = get_arg("-compare", None, str)
+	if baseline_path is not None:
+		with open(baseline_path) as f:
+			baseline = json.load(f)["results"]
+
+		regressions = compare(results, baseline,
+			tolerance=get_arg("-tolerance", 1.5, float))
+
+		for operation, size, old_time, new_time in regressions:
+			print("Regression:", operation, "(size " + str(size) + "):",
+				"{:.4f}s -> {:.4f}s".format(old_time, new_time))
+
+		if regressions:
+			exit(3)
@@ -58,31 +58,11 @@ import copy
 
 """
 
-def get_null_transitions(nfae_t_mat, null_symbol="e"):
-	null_transitions = {}
-
-	for state in nfae.transit_matrix:
-		# Promote a blind search starting in every possible
-		# state of the transition matrix. DFS was choosen 
-		# because it uses less memory than the BFS.
-
-		null_transitions[state] = {state}
-		active_vertexes = [state]
-		predecessor_track = {state : None}
-
-		while active_vertexes:
-			cur_vertex = active_vertexes.pop()
-
-			for null_t_vertex in nfae_t_mat[cur_vertex][null_symbol]:
-				if null_t_vertex not in predecessor_track:
-					predecessor_track[null_t_vertex] = cur_vertex
-					active_vertexes.append(null_t_vertex)
-
-					# Each reached state is a null_transition for
-					# the current state.
-					null_transitions[state].update({null_t_vertex})
-
-	return null_transitions
+def get_null_transitions(nfae, null_symbol="e"):
+	# T_e(p) for all states p, computed once per strongly connected
+	# component of the null transitions graph (see the Automaton
+	# class). States of the same component share the same set.
+	return nfae.__getnulltransitions__(null_symbol=null_symbol)
 
 def build_nfa(nfae, invalid_symbol="----", null_symbol="e"):
 	nfa = Automaton(
@@ -92,9 +72,7 @@ def build_nfa(nfae, invalid_symbol="----", null_symbol="e"):
 	nfa.alphabet.remove(null_symbol)
 
 	# First, calculate T_e(p) for all states p from NFAe
-	null_transitions = get_null_transitions(
-		nfae.transit_matrix, 
-		null_symbol)
+	null_transitions = get_null_transitions(nfae, null_symbol)
 
 	# Each entry of the NFA transit matrix is in the form
 	# T_NFA(p, c) = T_NFAe_e(T_NFAe(T_NFAe_e(p), c))
@@ -106,8 +84,8 @@ def build_nfa(nfae, invalid_symbol="----", null_symbol="e"):
 		# function, p has at least one final state (i.e.
 		# has a non null intersection) of NFAe, then
 		# p is a final state of NFA.
-		if nfae.final_state.intersection(null_transitions[state]):
-			nfa.final_state.update({state})
+		if nfae.final_states.intersection(null_transitions[state]):
+			nfa.final_states.update({state})
 
 		for symbol in nfa.alphabet:
 			if symbol != null_symbol: